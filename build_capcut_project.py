@@ -1,26 +1,42 @@
-import json, os, glob
+import csv, io, os
+from dataclasses import dataclass
 from pathlib import Path
-from natsort import natsorted
 import argparse
 
-def parse_args():
+from makeshorts.asset_index import shared_index
+from makeshorts.image_post import proxy_path
+from makeshorts.media_probe import MediaIndex
+from makeshorts.project_store import ProjectStore
+from makeshorts.run_journal import write_atomic, write_json_atomic
+from makeshorts.timeline import frame2sec, prefix_offsets, sec2frame, split_frames, validate_track
+
+@dataclass
+class BuildConfig:
+    """入出力パス一式。make_all などからはこれを渡してインプロセスで呼び出す"""
+    scripts_dir: str = "zap1/outputs/scripts"
+    images_root: str = "zap1/images"
+    voice_root:  str = "zap1/voice"
+    bgm_root:    str = "zap1/bgm"
+    out_ccproj:  str = "zap1/output/walt_capcut.ccproj"
+    out_csv:     str = "zap1/output/shotlist.csv"
+    image_variant: str = "master"  # "proxy" なら編集用プロキシ（<章>/proxy/*.jpg）があればそちらを参照
+    slug: str = ""  # プロジェクトストア上のパッケージ（空なら最後に更新したもの）
+
+def parse_args(argv=None) -> BuildConfig:
+    d = BuildConfig()
     p = argparse.ArgumentParser()
-    p.add_argument("--scripts-dir", default="zap1/outputs/scripts")
-    p.add_argument("--images-root", default="zap1/images")
-    p.add_argument("--voice-root",  default="zap1/voice")
-    p.add_argument("--bgm-root",    default="zap1/bgm")
-    p.add_argument("--out-ccproj",  default="zap1/output/walt_capcut.ccproj")
-    p.add_argument("--out-csv",     default="zap1/output/shotlist.csv")
-    return p.parse_args()
-
-# 既存の定数を引数で上書き
-args = parse_args()
-SCRIPTS_DIR = args.scripts_dir
-IMAGES_ROOT = args.images_root
-VOICE_ROOT  = args.voice_root
-BGM_ROOT    = args.bgm_root
-OUT_CCPROJ  = args.out_ccproj
-OUT_CSV     = args.out_csv
+    p.add_argument("--scripts-dir", default=d.scripts_dir)
+    p.add_argument("--images-root", default=d.images_root)
+    p.add_argument("--voice-root",  default=d.voice_root)
+    p.add_argument("--bgm-root",    default=d.bgm_root)
+    p.add_argument("--out-ccproj",  default=d.out_ccproj)
+    p.add_argument("--out-csv",     default=d.out_csv)
+    p.add_argument("--image-variant", default=d.image_variant, choices=["master", "proxy"],
+                   help="画像クリップが参照する版（proxy は縮小版でスクラブが軽い。書き出し時はマスターに戻す）")
+    p.add_argument("--slug", default=d.slug, help="プロジェクトストアのパッケージ（省略時は最後にビルドしたもの）")
+    a = p.parse_args(argv)
+    return BuildConfig(a.scripts_dir, a.images_root, a.voice_root, a.bgm_root, a.out_ccproj, a.out_csv,
+                       a.image_variant, a.slug)
 
 FPS = 30
 IMG_FIT = "cover"      # "cover" or "contain"（レターボックス回避推奨は"cover"）
@@ -28,23 +44,22 @@ IMG_XFADE_SEC = 0.5     # 画像クリップ間の微フェード
 AUDIO_FADE_SEC = 1.5    # BGMの曲間クロスフェード
 DUCKING_DB = -12        # ボイス下でBGMを-12dB
 PADDING_LEAD = 0.0      # 先頭余白(秒)
+BGM_FALLBACK_SEC = 190.0  # 曲長を読めなかったBGMの仮の長さ
 # ============================================================
 
-def read_chapter_batches():
-    files = natsorted(glob.glob(os.path.join(SCRIPTS_DIR, "chapter_*.json")))
-    chapters = []
-    for f in files:
-        with open(f, "r", encoding="utf-8") as rf:
-            data = json.load(rf)
-            chapters.append(data)
-    # chapter_indexでソート（安全策）
-    chapters = sorted(chapters, key=lambda x: x.get("chapter_index", 0))
-    return chapters
-
-def sec2frame(s): return int(round(s * FPS))
+def read_chapter_batches(scripts_dir: str, slug: str = ""):
+    """章バッチを chapter_index 順に返す（他の工程が足したキー込み）。
+    ストアの無い従来のワークスペースは chapter_*.json をストアに取り込んでから読む"""
+    store = ProjectStore.open_or_import(scripts_dir)
+    if store is None:
+        return []
+    with store:
+        package = slug or store.latest_package()
+        return store.chapters(package) if package else []
 
-def ensure_dirs():
-    Path(os.path.dirname(OUT_CCPROJ)).mkdir(parents=True, exist_ok=True)
+def ensure_dirs(config: BuildConfig):
+    Path(os.path.dirname(config.out_ccproj) or ".").mkdir(parents=True, exist_ok=True)
+    Path(os.path.dirname(config.out_csv) or ".").mkdir(parents=True, exist_ok=True)
 
 def motion_by_emotion(level:int, index:int):
     """emotion_levelに応じたKen Burnsプリセットを返す"""
@@ -63,20 +78,31 @@ def motion_by_emotion(level:int, index:int):
         base += "-slow"
     return base
 
-def make_timeline(chapters):
+def make_timeline(chapters, config: BuildConfig, subtitle_clips=None, media=None, assets=None):
     """
     内部的な『汎用CapCut風プロジェクトJSON』を構築。
     ※CapCutはバージョンでスキーマが変わる可能性があるため、
       「パス・開始秒・長さ・トラック構造」を素直に持つ最小構成を出力。
       読み込み時にズレたら、このJSONを基にCapCutで手修正しやすい。
+    subtitle_clips を渡すと字幕トラックに入れた状態で返す（ファイルへの後書き不要）。
+    ボイス・BGMの長さは media（MediaIndex）でファイルヘッダから読む。
+    章の画像・BGM の一覧は assets（AssetIndex、省略時はプロセス共有のもの）から引く。
     """
+    own_index = media is None
+    if own_index:
+        media = MediaIndex()
+    own_assets = assets is None
+    if own_assets:
+        assets = shared_index()
+    assets.scan(config.images_root)  # 全章分を 1 回の走査で確認（以降の章ごとの検索は stat 1 回）
+    fps = FPS
     t = {
-        "meta": {"name": "Walt Documentary Auto Timeline", "fps": FPS, "resolution": "1920x1080"},
+        "meta": {"name": "Walt Documentary Auto Timeline", "fps": fps, "resolution": "1920x1080"},
         "tracks": [
             {"type": "video", "clips": []},   # 画像並べ
             {"type": "audio", "role": "voice", "clips": []},   # 章ボイス
             {"type": "audio", "role": "bgm", "clips": []},     # BGM
-            {"type": "subtitles", "clips": []}                 # 予備（今回は未使用）
+            {"type": "subtitles", "clips": list(subtitle_clips or [])}  # make_all から字幕を受け取る
         ],
         "mix": {
             "ducking": {"enable": True, "under_role": "voice", "target_role": "bgm", "gain_db": DUCKING_DB}
@@ -84,121 +110,144 @@ def make_timeline(chapters):
     }
 
     # === 映像・ボイス ===
-    global_time = PADDING_LEAD
+    # 位置はすべて整数フレームで計算し、JSONへは書き出し時に秒へ変換する
+    lead = sec2frame(PADDING_LEAD, fps)
+    chapters = [c for c in chapters if float(c.get("duration_sec", 0) or 0) > 0]
+    chapter_frames = [sec2frame(float(c["duration_sec"]), fps) for c in chapters]
+    offsets = prefix_offsets(chapter_frames, lead)   # 章の開始位置（累積和）
+    xfade = IMG_XFADE_SEC
     shotlist_rows = []
 
     video_track = t["tracks"][0]["clips"]
     voice_track = t["tracks"][1]["clips"]
 
-    for chap in chapters:
+    for chap, chap_start, chap_len in zip(chapters, offsets, chapter_frames):
         chap_id = chap["id"]
-        dur = float(chap.get("duration_sec", 0) or 0)
-        if dur <= 0: 
-            continue
 
         # 画像3枚が基本（不足は章内で繰り返し）
-        stills = chap.get("still_prompts", [])  # 中身はプロンプトだが、実ファイルは images/<id> 内の実体を使う
-        # 実ファイルを拾う（*.png, *.jpg）
-        img_files = natsorted(
-            glob.glob(os.path.join(IMAGES_ROOT, chap_id, "*.png")) +
-            glob.glob(os.path.join(IMAGES_ROOT, chap_id, "*.jpg")) +
-            glob.glob(os.path.join(IMAGES_ROOT, chap_id, "*.jpeg"))
-        )
-        if not img_files:
-            # 画像が未生成でも、空白フレームにならないようにプレースホルダ扱い
-            img_files = []
-
-        # 3分割
-        per = dur / max(1, max(3, len(img_files)))  # 画像が多ければ均等分割
-        frames = []
+        # 実ファイルを拾う（*.png, *.jpg）。中身はプロンプトだが、実ファイルは images/<id> 内の実体を使う
+        img_files = assets.chapter_files(config.images_root, chap_id, "image")
+
         # 並べる対象
-        targets = img_files if img_files else []
         if img_files and len(img_files) < 3:
             # 2以下なら重複使用
-            while len(targets) < 3:
-                targets += img_files
-            targets = targets[:3]
-        elif not img_files:
+            targets = (img_files * 3)[:3]
+        elif img_files:
+            targets = img_files  # 画像が多ければ均等分割
+        else:
             # 本当に何も無い場合はダミーエントリ（CapCut上で後差し替え）
             targets = [f"[MISSING:{chap_id}:img{i+1}]" for i in range(3)]
 
-        start = global_time
-        for i, path in enumerate(targets):
-            length = per
-            if i == len(targets)-1:
-                # 端数は最後に吸収
-                length = (PADDING_LEAD + sum([c.get('duration_sec',0) for c in chapters[:chapters.index(chap)]]) 
-                          + dur) - (start)
-
-            # 感情レベルに応じたモーションを適用
-            emotion_level = chap.get("emotion_level", 5)  # デフォルト5
+        # 章の長さをフレーム単位で分割（端数は最後に吸収）
+        lengths = split_frames(chap_len, len(targets))
+        # 感情レベルに応じたモーションを適用
+        emotion_level = chap.get("emotion_level", 5)  # デフォルト5
+        for i, (path, start, length) in enumerate(zip(targets, prefix_offsets(lengths, chap_start), lengths)):
             motion = motion_by_emotion(emotion_level, i)
+            clip_path = path
+            if config.image_variant == "proxy" and os.path.exists(proxy_path(path)):
+                clip_path = proxy_path(path)
             video_track.append({
-                "path": path.replace("\\\\", "/"),
-                "start": round(start, 3),
-                "duration": round(length, 3),
+                "path": clip_path.replace("\\\\", "/"),
+                "chapter": chap_id,
+                "start": frame2sec(start, fps),
+                "duration": frame2sec(length, fps),
                 "fit": IMG_FIT,
-                "transition_in": {"type": "fade", "duration": IMG_XFADE_SEC} if i>0 else None,
-                "transition_out": {"type": "fade", "duration": IMG_XFADE_SEC} if i < len(targets)-1 else None,
+                "transition_in": {"type": "fade", "duration": xfade} if i>0 else None,
+                "transition_out": {"type": "fade", "duration": xfade} if i < len(targets)-1 else None,
                 "motion": {"preset": motion, "emotion_level": emotion_level}
             })
-            shotlist_rows.append([chap["chapter_index"], chap_id, path, round(start,3), round(length,3)])
-            start += length
+            if clip_path != path:
+                video_track[-1]["master"] = path.replace("\\\\", "/")  # 書き出し時に差し戻す元画像
+            shotlist_rows.append([chap["chapter_index"], chap_id, path, frame2sec(start, fps), frame2sec(length, fps)])
 
         # ボイス
-        voice_path = os.path.join(VOICE_ROOT, f"{chap_id}.wav")
-        if os.path.exists(voice_path):
+        voice_path = os.path.join(config.voice_root, f"{chap_id}.wav")
+        trim = chap.get("voice_trim")
+        if os.path.exists(voice_path) and trim:
+            # リフロー済み：先頭の無音を切り、発話部分だけを章内の所定位置に置く
             voice_track.append({
                 "path": voice_path.replace("\\\\", "/"),
-                "start": round(global_time, 3),
-                "duration": round(dur, 3),
+                "start": frame2sec(chap_start + sec2frame(trim["offset"], fps), fps),
+                "duration": frame2sec(sec2frame(trim["duration"], fps), fps),
+                "source_start": trim["source_start"],
+                "fade_in": AUDIO_FADE_SEC/2,
+                "fade_out": AUDIO_FADE_SEC/2
+            })
+        elif os.path.exists(voice_path):
+            # 実際のWAVの長さで置く（読めなければ台本の長さ）
+            voice_sec = media.duration(voice_path)
+            voice_len = sec2frame(voice_sec, fps) if voice_sec else chap_len
+            voice_track.append({
+                "path": voice_path.replace("\\\\", "/"),
+                "start": frame2sec(chap_start, fps),
+                "duration": frame2sec(voice_len, fps),
                 "fade_in": AUDIO_FADE_SEC/2,
                 "fade_out": AUDIO_FADE_SEC/2
             })
-
-        global_time += dur
 
     # === BGM（フォルダ内を順に敷き詰め・曲間クロスフェード） ===
-    bgm_files = natsorted(
-        glob.glob(os.path.join(BGM_ROOT, "*.mp3")) +
-        glob.glob(os.path.join(BGM_ROOT, "*.wav")) +
-        glob.glob(os.path.join(BGM_ROOT, "*.m4a")) +
-        glob.glob(os.path.join(BGM_ROOT, "*.flac"))
-    )
-    total_len = PADDING_LEAD + sum(float(c.get("duration_sec",0) or 0) for c in chapters)
+    bgm_files = assets.role_files(config.bgm_root, "bgm")
+    total_len = offsets[-1]
     bgm_track = t["tracks"][2]["clips"]
+    bgm_xfade = sec2frame(AUDIO_FADE_SEC, fps)
 
-    tpos = 0.0
+    tpos = 0
     idx = 0
     while tpos < total_len and bgm_files:
         fpath = bgm_files[idx % len(bgm_files)]
-        # 仮：曲長は未知→CapCut側で曲末まで自動延長してくれるケース多し。
-        # ここでは「チャプターの境目に合わせず、全体を順送り」で置く。
-        # （必要ならffprobe等で実長取得→明示長にしてもOK）
-        clip_len = min(190.0, total_len - tpos)  # だいたい3分弱相当・末尾で打ち切り
+        # 「チャプターの境目に合わせず、全体を順送り」で置く。
+        # 曲の実長を読み、前の曲とのクロスフェード分を差し引いた長さだけ進める（末尾で打ち切り）
+        overlap = bgm_xfade if idx > 0 else 0
+        bgm_len = sec2frame(media.duration(fpath) or BGM_FALLBACK_SEC, fps)
+        clip_len = min(max(bgm_len - overlap, 1), total_len - tpos)
         bgm_track.append({
             "path": fpath.replace("\\\\", "/"),
-            "start": round(max(0, tpos - (idx>0)*AUDIO_FADE_SEC), 3),
-            "duration": round(clip_len + (idx>0)*AUDIO_FADE_SEC, 3),
+            "start": frame2sec(max(0, tpos - overlap), fps),
+            "duration": frame2sec(clip_len + overlap, fps),
             "fade_in": AUDIO_FADE_SEC if idx>0 else 0.5,
             "fade_out": AUDIO_FADE_SEC
         })
         tpos += clip_len
         idx += 1
 
+    if own_index:
+        media.save()
+    if own_assets:
+        assets.save()
+    validate_timeline(t)
     return t, shotlist_rows
 
-def write_outputs(project_json, shotlist_rows):
-    ensure_dirs()
-    with open(OUT_CCPROJ, "w", encoding="utf-8") as wf:
-        json.dump(project_json, wf, ensure_ascii=False, indent=2)
+def validate_timeline(t):
+    """トラックごとのすき間・重なりを検査して警告を出す（BGMはクロスフェード分の重なりを許容）"""
+    fps = t["meta"]["fps"]
+
+    def spans(track):
+        return [(sec2frame(c["start"], fps), sec2frame(c["duration"], fps)) for c in track["clips"]]
+
+    video, voice, bgm, subs = t["tracks"][:4]
+    issues = (
+        validate_track("video", spans(video)) +
+        validate_track("voice", spans(voice), allow_gaps=True) +
+        validate_track("bgm", spans(bgm), max_overlap=sec2frame(AUDIO_FADE_SEC, fps)) +
+        validate_track("subtitles", spans(subs), allow_gaps=True)
+    )
+    for issue in issues[:20]:
+        print(f"⚠️ タイムライン検査: {issue.describe(fps)}")
+    if len(issues) > 20:
+        print(f"⚠️ ほか {len(issues) - 20} 件")
+    return issues
+
+def write_outputs(project_json, shotlist_rows, config: BuildConfig):
+    ensure_dirs(config)
+    write_json_atomic(config.out_ccproj, project_json)
 
     # 参照用ショットリスト
-    import csv
-    with open(OUT_CSV, "w", encoding="utf-8", newline="") as cf:
-        w = csv.writer(cf)
-        w.writerow(["chapter_index","chapter_id","image_path","start_sec","duration_sec"])
-        w.writerows(shotlist_rows)
+    buf = io.StringIO(newline="")
+    w = csv.writer(buf)
+    w.writerow(["chapter_index","chapter_id","image_path","start_sec","duration_sec"])
+    w.writerows(shotlist_rows)
+    write_atomic(config.out_csv, buf.getvalue())
 
 from shutil import copyfile
 
@@ -218,21 +267,43 @@ def copy_to_capcut_projects(out_ccproj_path: str, person_name: str):
     except Exception as e:
         print(f"⚠️ CapCutプロジェクトフォルダへのコピーに失敗: {e}")
 
-def main():
-    chapters = read_chapter_batches()
-    project_json, shotlist_rows = make_timeline(chapters)
-    write_outputs(project_json, shotlist_rows)
-    print(f"✅ CapCutプロジェクトJSONを書き出し: {OUT_CCPROJ}")
-    print(f"✅ ショットリストCSVを書き出し:      {OUT_CSV}")
-    print("   → CapCutで .ccproj を開けばタイムラインが展開されます。")
+def build_project(config: BuildConfig, chapters=None, subtitle_clips=None):
+    """タイムラインを構築して .ccproj と CSV を 1 回だけ書き出す。
+    chapters を省略すると config.scripts_dir の章バッチを読み込む。"""
+    if chapters is None:
+        chapters = read_chapter_batches(config.scripts_dir, config.slug)
+    project_json, shotlist_rows = make_timeline(chapters, config, subtitle_clips)
+    write_outputs(project_json, shotlist_rows, config)
+    record_clips(project_json, config)
+    return project_json, shotlist_rows
 
-    # CapCutローカルプロジェクトへの自動コピー
+def record_clips(project_json, config: BuildConfig):
+    """組んだタイムラインのクリップをプロジェクトストアにも残す（章・トラック・時刻で引ける）"""
+    store = ProjectStore.open_existing(config.scripts_dir)
+    if store is None:
+        return
+    with store:
+        package = config.slug or store.latest_package()
+        if package:
+            store.replace_clips(package, project_json)
+
+def copy_to_capcut_for(config: BuildConfig):
     try:
         # 人名を抽出（ファイル名などから判定）
-        person_name = Path(OUT_CCPROJ).stem.split("_capcut")[0] # _capcutまで含めてsplit
-        copy_to_capcut_projects(OUT_CCPROJ, person_name)
+        person_name = Path(config.out_ccproj).stem.split("_capcut")[0] # _capcutまで含めてsplit
+        copy_to_capcut_projects(config.out_ccproj, person_name)
     except Exception as e:
         print(f"⚠️ 自動コピー中にエラー: {e}")
 
+def main(argv=None):
+    config = parse_args(argv)
+    build_project(config)
+    print(f"✅ CapCutプロジェクトJSONを書き出し: {config.out_ccproj}")
+    print(f"✅ ショットリストCSVを書き出し:      {config.out_csv}")
+    print("   → CapCutで .ccproj を開けばタイムラインが展開されます。")
+
+    # CapCutローカルプロジェクトへの自動コピー
+    copy_to_capcut_for(config)
+
 if __name__ == "__main__":
     main()
@@ -1,47 +1,50 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel
-from google.oauth2 import service_account
 import os
 import json
 
+from makeshorts.credentials import generative_model
+from makeshorts.llm_cache import ResponseCache, cached_generate
+from makeshorts.transport import get_endpoint, retry_call
+
 
 class GeminiAPI:
-    def __init__(self):
+    def __init__(self, use_cache: bool = True):
         """Vertex AI の Gemini モデルを初期化"""
         credentials_path = os.getenv("GCP_SERVICE_ACCOUNT_FILE", "credentials/makeshorts-477014-a05545136d6a.json")
         project_id = os.getenv("GCP_PROJECT_ID", "makeshorts-477014")
         location = os.getenv("GCP_LOCATION", "us-central1")
         model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")  # ← 新モデルに対応
 
-        creds = service_account.Credentials.from_service_account_file(credentials_path)
-        vertexai.init(project=project_id, location=location, credentials=creds)
+        # 最新モデルを利用（vertexai.init とモデルの生成はプロセス内で 1 回だけ。インスタンスを作り直しても使い回す）
+        self.model_name = model_name
+        self.model = generative_model(project_id, location, model_name, credentials_path)
+        # 429・5xx・タイムアウトは待って再試行し、続けて失敗したらブレーカーで止める（GEMINI_RPM で送信数も制限）
+        self.endpoint = get_endpoint(
+            f"gemini:{project_id}:{location}", requests_per_minute=float(os.getenv("GEMINI_RPM", "0"))
+        )
+        # 同一 (model, prompt, generation_config) の応答は SQLite キャッシュから返す
+        self.cache = ResponseCache.from_env() if use_cache else None
+
+    def _generate(self, prompt: str, generation_config: dict, validate=None) -> str:
+        def call() -> str:
+            text = retry_call(
+                self.endpoint, lambda: self.model.generate_content(prompt, generation_config=generation_config).text
+            )
+            if validate is not None:
+                validate(text)  # 壊れた応答はキャッシュしない
+            return text
 
-        # 最新モデルを利用
-        self.model = GenerativeModel(model_name)
+        return cached_generate(self.cache, self.model_name, prompt, generation_config, call)
 
     def generate_text(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.7) -> str:
-        """Geminiからテキストを生成"""
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    "max_output_tokens": max_tokens,
-                    "temperature": temperature,
-                },
-            )
-            return response.text.strip()
-        except Exception as e:
-            print(f"[GeminiAPI Error]: {e}")
-            return "⚠️ Gemini応答エラー：Vertex AIへの接続またはAPIの権限を確認してください。"
+        """Geminiからテキストを生成（失敗時は makeshorts.transport.TransportError などを送出）"""
+        return self._generate(
+            prompt,
+            {
+                "max_output_tokens": max_tokens,
+                "temperature": temperature,
+            },
+        ).strip()
 
     def generate_json(self, prompt: str) -> dict:
-        """GeminiからJSON形式の応答を生成"""
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config={"response_mime_type": "application/json"},
-            )
-            return json.loads(response.text)
-        except Exception as e:
-            print(f"[GeminiAPI JSON Error]: {e}")
-            return {"error": str(e)}
+        """GeminiからJSON形式の応答を生成（壊れたJSONは ValueError）"""
+        return json.loads(self._generate(prompt, {"response_mime_type": "application/json"}, validate=json.loads))
@@ -0,0 +1,148 @@
+"""JSONL ジョブファイルをまとめて 1 つの GeminiAPI で並列実行するバッチモード
+
+ジョブは 1 行 1 JSON:
+    {"person": "ウォルト・ディズニー", "task": "script", "section": "第1章", "output": "out/ch1.txt"}
+省略可能なキー: id, length, max_tokens, temperature
+
+journal（makeshorts.run_journal.RunJournal）を渡すとジョブの状態を記録し、再開時は完了済みのジョブだけを飛ばす。
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from makeshorts.build_manifest import digest
+from makeshorts.run_journal import RunJournal, write_atomic
+
+PROMPTS_DIR = Path(__file__).parent / "prompts"
+
+
+@dataclass
+class PromptJob:
+    """プロンプトテンプレート 1 回分の生成ジョブ"""
+
+    output: str
+    person: str
+    task: str = "script"
+    section: str = "第1章"
+    length: int = 1100
+    max_tokens: int = 2048
+    temperature: float = 0.7
+    id: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self.id or self.output
+
+
+@dataclass
+class JobResult:
+    job: PromptJob
+    status: str  # "done" / "skipped" / "failed"
+    error: Optional[str] = None
+
+
+_TEMPLATES: Dict[str, str] = {}
+_TEMPLATES_LOCK = threading.Lock()
+
+
+def render_prompt(job: PromptJob) -> str:
+    with _TEMPLATES_LOCK:
+        template = _TEMPLATES.get(job.task)
+        if template is None:
+            template = _TEMPLATES[job.task] = (PROMPTS_DIR / f"{job.task}.txt").read_text(encoding="utf-8")
+    return template.format(person=job.person, section=job.section, length=job.length)
+
+
+def load_jobs(path: str) -> List[PromptJob]:
+    """JSONL を読み込んで PromptJob のリストにする（空行・# 行は無視）"""
+    known = {f.name for f in fields(PromptJob)}
+    jobs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            data = json.loads(line)
+            unknown = set(data) - known
+            if unknown:
+                raise ValueError(f"{path}:{line_no}: 未知のキー {sorted(unknown)}")
+            if "output" not in data or "person" not in data:
+                raise ValueError(f"{path}:{line_no}: output と person は必須です")
+            jobs.append(PromptJob(**data))
+    return jobs
+
+
+def add_jobs(journal: RunJournal, jobs: Iterable[PromptJob]) -> None:
+    """ジョブをジャーナルへ登録する（入力が前回と変わったジョブは未完了に戻る）"""
+    for job in jobs:
+        journal.add(job.name, inputs=digest(render_prompt(job), job.max_tokens, job.temperature), output=job.output)
+
+
+def run_job(
+    job: PromptJob,
+    gemini,
+    *,
+    skip_existing: bool = True,
+    journal: Optional[RunJournal] = None,
+) -> JobResult:
+    """ジョブを 1 件実行して出力ファイルへ書き出す（journal には add_jobs で登録済みのこと）
+
+    再開したラン（journal.resumed）では既存ファイルを信用せず、ジャーナルで完了と確認できたジョブだけを飛ばす。
+    """
+    if journal is not None and journal.is_done(job.name):
+        return JobResult(job, "skipped")
+    if skip_existing and os.path.exists(job.output) and (journal is None or not journal.resumed):
+        if journal is not None:
+            journal.finish(job.name, job.output)
+        return JobResult(job, "skipped")
+    if journal is not None:
+        journal.start(job.name)
+    try:
+        text = gemini.generate_text(render_prompt(job), max_tokens=job.max_tokens, temperature=job.temperature)
+    except Exception as exc:  # 再試行し尽くした失敗。出力ファイルは書かない
+        error = f"{type(exc).__name__}: {exc}"
+        if journal is not None:
+            journal.fail(job.name, error)
+        return JobResult(job, "failed", error)
+    write_atomic(job.output, text)
+    if journal is not None:
+        journal.finish(job.name, job.output)
+    return JobResult(job, "done")
+
+
+def run_jobs(
+    jobs: Iterable[PromptJob],
+    gemini,
+    *,
+    workers: int = 4,
+    skip_existing: bool = True,
+    on_result: Optional[Callable[[JobResult], None]] = None,
+    journal: Optional[RunJournal] = None,
+) -> List[JobResult]:
+    """ジョブを並列に実行し、完了したものから出力ファイルへ書き出す
+
+    gemini は初期化済みの GeminiAPI を 1 つだけ渡す（vertexai.init や認証は 1 回で済む）。
+    戻り値は入力順。on_result は完了順に呼ばれる。スキップの判定は run_job を参照。
+    """
+    jobs = list(jobs)
+    results: List[Optional[JobResult]] = [None] * len(jobs)
+    if journal is not None:
+        add_jobs(journal, jobs)
+
+    def run(job: PromptJob) -> JobResult:
+        return run_job(job, gemini, skip_existing=skip_existing, journal=journal)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(run, job): position for position, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if on_result is not None:
+                on_result(result)
+
+    return [result for result in results if result is not None]
@@ -1,25 +1,70 @@
 import argparse
+import sys
 from gemini_cli.api import GeminiAPI
+from gemini_cli.batch import load_jobs, run_jobs
+from makeshorts.run_journal import JournalError, RunJournal
+from makeshorts.transport import TransportError
 from pathlib import Path
 
-def main():
+def run_batch(gemini, jobs_path, workers, journal=None):
+    jobs = load_jobs(jobs_path)
+    print(f"📦 {len(jobs)} 件のジョブを {workers} 並列で実行します: {jobs_path}")
+    if journal is None:
+        journal = RunJournal.create("gemini", {"jobs": jobs_path})
+    print(f"📒 ラン ID: {journal.run_id}")
+
+    def report(result):
+        mark = {"done": "✅", "skipped": "⏩", "failed": "❌"}[result.status]
+        suffix = f" ({result.error})" if result.error else ""
+        print(f"{mark} {result.status}: {result.job.name} → {result.job.output}{suffix}", flush=True)
+
+    with journal:
+        results = run_jobs(jobs, gemini, workers=workers, on_result=report, journal=journal)
+    counts = {status: sum(1 for r in results if r.status == status) for status in ("done", "skipped", "failed")}
+    print(f"🏁 完了 {counts['done']} / スキップ {counts['skipped']} / 失敗 {counts['failed']}")
+    print(journal.summary())
+    return 1 if counts["failed"] else 0
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Gemini CLI for MakeShorts")
-    parser.add_argument("--person", required=True, help="対象人物名（例：ウォルト・ディズニー）")
+    parser.add_argument("--person", help="対象人物名（例：ウォルト・ディズニー）")
     parser.add_argument("--task", choices=["script", "thumbnail", "seo"], default="script")
     parser.add_argument("--section", default="第1章")
     parser.add_argument("--length", type=int, default=1100)
     parser.add_argument("--max_tokens", type=int, default=2048)
     parser.add_argument("--temperature", type=float, default=0.7)
-    args = parser.parse_args()
+    parser.add_argument("--no-cache", action="store_true", help="応答キャッシュを使わずに毎回 Vertex AI を呼ぶ")
+    parser.add_argument("--jobs", help="JSONL のジョブファイル（1行1ジョブ、出力済みはスキップ）")
+    parser.add_argument("--workers", type=int, default=4, help="--jobs 使用時の並列数")
+    parser.add_argument("--resume", metavar="RUN_ID", help="中断した --jobs のランを再開（完了済みのジョブは飛ばす）")
+    args = parser.parse_args(argv)
+    if not args.jobs and not args.person and not args.resume:
+        parser.error("--person・--jobs・--resume のいずれかを指定してください")
+
+    journal = None
+    if args.resume:
+        try:
+            journal = RunJournal.open(args.resume, command="gemini")
+        except JournalError as e:
+            parser.error(str(e))
+        args.jobs = journal.params["jobs"]
+
+    gemini = GeminiAPI(use_cache=not args.no_cache)
+    if args.jobs:
+        raise SystemExit(run_batch(gemini, args.jobs, args.workers, journal))
 
-    gemini = GeminiAPI()
     template_path = Path(__file__).parent / "prompts" / f"{args.task}.txt"
     prompt = template_path.read_text(encoding="utf-8").format(
         person=args.person, section=args.section, length=args.length
     )
 
-    output = gemini.generate_text(prompt, max_tokens=args.max_tokens, temperature=args.temperature)
+    try:
+        output = gemini.generate_text(prompt, max_tokens=args.max_tokens, temperature=args.temperature)
+    except TransportError as e:
+        # 標準出力をそのまま台本ファイルにリダイレクトされても壊れないよう、エラーは stderr に出して終了する
+        print(f"❌ Gemini応答エラー: {e}", file=sys.stderr)
+        raise SystemExit(1)
     print(output)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
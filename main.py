@@ -1,18 +1,10 @@
-import argparse
-import subprocess
-from config.model_registry import GEMINI_MODELS
+import sys
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--person", required=True)
-    args = parser.parse_args()
-    person = args.person
-
-    print(f"🎬 素材生成開始: {person}")
-    subprocess.run(["python3", "-m", "zap1.zap1_auto_generate", "--person", person])
+from makeshorts.cli import run_pipeline
 
-    print(f"🎞️ 動画生成開始: {person}")
-    subprocess.run(["python3", "-m", "zap2.shorts_pipeline", person, "--model", GEMINI_MODELS["default"]])
+def main():
+    # 台本・画像・ナレーション・タイムラインを章ごとの DAG で 1 プロセスで組み立てる（python3 -m makeshorts run と同じ）
+    raise SystemExit(run_pipeline(sys.argv[1:]))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,8 +1,31 @@
 #!/usr/bin/env python3
-import os, json, glob, argparse, re, subprocess
+import os, json, glob, argparse, re, subprocess, time, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack, redirect_stdout
+from dataclasses import dataclass
 from pathlib import Path
 from collections import defaultdict
 
+import build_capcut_project
+
+from makeshorts.asset_index import shared_index
+from makeshorts.audio_reflow import measure_chapters
+from makeshorts.build_manifest import BuildManifest, digest
+from makeshorts.image_post import ImagePostError, ImagePostProcessor, PostOptions, proxy_path, summarize_variants
+from makeshorts.media_probe import MediaIndex
+from makeshorts.render import RenderError, render_project
+from makeshorts.project_store import ProjectStore
+from makeshorts.run_journal import write_atomic, write_json_atomic
+from makeshorts.scheduler import Scheduler
+from makeshorts.subtitle_timing import chapter_cues, read_timing
+from makeshorts.subtitles import Cue, render_cues, segment_and_time
+from makeshorts.timeline import frame2sec, sec2frame
+
+VOICE_SPEAKER = "ずんだもん"
+VOICE_SPEED = 1.0
+VOICE_WORKERS = 4  # VOICEVOX への同時リクエスト数（全章で共有）
+IO_WORKERS = 8     # DAG の I/O プール（章ごとの合成待ち・書き出し）
+
 # ---------- ユーティリティ ----------
 def slugify(s:str)->str:
     s = s.strip()
@@ -21,219 +44,604 @@ def ensure_dir(p:Path):
     p.mkdir(parents=True, exist_ok=True)
 
 # ---------- 章バッチ生成（emotion_level付き） ----------
-def create_chapter_batches(master:dict, scripts_out_dir:Path):
+def chapter_lookups(master:dict):
+    """章 id ごとの静止画/モーションプロンプトと、章番号ごとの emotion_level"""
     pkg = master.get("package", {})
-    chapters = pkg.get("script", {}).get("chapters", [])
-    thumbnails = pkg.get("thumbnails", [])
-    curve = pkg.get("emotion_curve", [])
-
     prompt_lookup = defaultdict(lambda: {"still": [], "motion": []})
-    for t in thumbnails:
+    for t in pkg.get("thumbnails", []):
         slot = t.get("slot")
         if slot:
             prompt_lookup[slot]["still"].append(t.get("still_prompt",""))
             prompt_lookup[slot]["motion"].append(t.get("motion_prompt",""))
+    emotion_lookup = {item.get("chapter_index"): item.get("level") for item in pkg.get("emotion_curve", [])}
+    return prompt_lookup, emotion_lookup
 
-    emotion_lookup = {item.get("chapter_index"): item.get("level") for item in curve}
-
-    ensure_dir(scripts_out_dir)
-    for idx, ch in enumerate(chapters):
-        chap_id = ch.get("id")
-        if not chap_id:
-            continue
-        batch = {
-            "chapter_index": idx,
-            "id": chap_id,
-            "title": ch.get("title",""),
-            "duration_sec": ch.get("time",{}).get("duration_sec",0),
-            "narration_text": ch.get("narration",""),
-            "still_prompts": prompt_lookup[chap_id]["still"][:3],
-            "motion_prompts": prompt_lookup[chap_id]["motion"][:3],
-            "bgm_tag": ch.get("audio",{}).get("bgm_tag",""),
-            "sfx": ch.get("audio",{}).get("sfx",[]),
-            "lesson": ch.get("lesson",""),
-            "emotion_level": emotion_lookup.get(idx, 5),
-            "voice_speaker": "ずんだもん",
-            "output_paths": {
-                "image_dir": f"zap1/images/{chap_id}/",
-                "voice_path": f"zap1/voice/{chap_id}.wav"
-            }
+def chapter_batch(idx:int, ch:dict, lookups, images_root:str, voice_root:str, timing=None)->dict:
+    """1章分のバッチ(dict)。timing（ボイス実測の尺）があれば duration_sec を置き換え、voice_trim を付ける"""
+    prompt_lookup, emotion_lookup = lookups
+    chap_id = ch.get("id")
+    batch = {
+        "chapter_index": idx,
+        "id": chap_id,
+        "title": ch.get("title",""),
+        "duration_sec": ch.get("time",{}).get("duration_sec",0),
+        "narration_text": ch.get("narration",""),
+        "still_prompts": prompt_lookup[chap_id]["still"][:3],
+        "motion_prompts": prompt_lookup[chap_id]["motion"][:3],
+        "bgm_tag": ch.get("audio",{}).get("bgm_tag",""),
+        "sfx": ch.get("audio",{}).get("sfx",[]),
+        "lesson": ch.get("lesson",""),
+        "emotion_level": emotion_lookup.get(idx, 5),
+        "voice_speaker": VOICE_SPEAKER,
+        "output_paths": {
+            "image_dir": f"{images_root}/{chap_id}/",
+            "voice_path": f"{voice_root}/{chap_id}.wav"
         }
-        out = scripts_out_dir / f"chapter_{idx:02d}_{chap_id}.json"
-        with open(out, "w", encoding="utf-8") as f:
-            json.dump(batch, f, ensure_ascii=False, indent=2)
-    print(f"🧩 章バッチ生成完了: {scripts_out_dir}")
-
-# ---------- 字幕（SRT）生成 + CapCut統合 ----------
-def to_srt_lines(narration:str, start_sec:float, duration:float, max_chars:int=24):
-    # 超単純ブレイク：句点・改行・長さで分割
-    text = narration.replace("\r","").strip()
-    parts = []
-    buf = ""
-    for ch in text:
-        buf += ch
-        if ch in ".。!?\n" or len(buf) >= max_chars:
-            parts.append(buf.strip())
-            buf = ""
-    if buf.strip():
-        parts.append(buf.strip())
-    if not parts:
-        return []
+    }
+    if timing is not None:
+        batch["duration_sec"] = timing.duration_sec
+        batch["voice_trim"] = timing.voice_trim()
+    return batch
 
-    seg_dur = duration / len(parts)
-    lines = []
-    cur = start_sec
-    for i, seg in enumerate(parts, 1):
-        st = cur
-        en = start_sec + duration if i==len(parts) else (cur + seg_dur)
-        lines.append((i, st, en, seg))
-        cur = en
-    return lines
-
-def fmt_ts(sec:float):
-    if sec < 0: sec = 0
-    ms = int(round((sec - int(sec)) * 1000))
-    s = int(sec) % 60
-    m = (int(sec) // 60) % 60
-    h = int(sec) // 3600
-    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
-
-def gen_subtitles_and_integrate(master:dict, srt_out_dir:Path, ccproj_path:Path):
-    pkg = master["package"]
-    chapters = pkg["script"]["chapters"]
-    ensure_dir(srt_out_dir)
-
-    # グローバルタイムを章のdurationで進める
-    g = 0.0
-    cc_sub_clips = []
-    for idx, ch in enumerate(chapters):
-        dur = float(ch.get("time",{}).get("duration_sec",0) or 0)
-        if dur <= 0:
-            continue
-        nid = ch.get("id", f"chapter{idx}")
-        narration = ch.get("narration","")
-        lines = to_srt_lines(narration, g, dur)
-
-        # SRT出力
-        srt_path = srt_out_dir / f"chapter_{idx:02d}_{nid}.srt"
-        with open(srt_path, "w", encoding="utf-8") as sf:
-            for no, st, en, seg in lines:
-                sf.write(f"{no}\n{fmt_ts(st)} --> {fmt_ts(en)}\n{seg}\n\n")
-        print(f"📝 {srt_path} を生成")
-
-        # CapCut字幕トラック用
-        cc_sub_style = {
-            "font_family":"Hiragino Sans",
-            "font_size": 42,
-            "fill": "#FFFFFF",
-            "stroke": {"color":"#000000","width":4},
-            "align":"center",
-            "position":"bottom_center",
-            "margin_bottom": 80
-        }
-        # visual_styleがあれば上書き
-        if "visual_style" in ch:
-            if "subtitle_fade_in" in ch["visual_style"]:
-                cc_sub_style["fade_in"] = ch["visual_style"]["subtitle_fade_in"]
-            if "subtitle_fade_out" in ch["visual_style"]:
-                cc_sub_style["fade_out"] = ch["visual_style"]["subtitle_fade_out"]
-
-        for no, st, en, seg in lines:
-            cc_sub_clips.append({
-                "start": round(st,3),
-                "duration": round(en - st,3),
-                "text": seg,
-                "style": cc_sub_style
-            })
-        g += dur
-
-    # CapCutプロジェクトへ統合
-    if ccproj_path.exists():
-        with open(ccproj_path, "r", encoding="utf-8") as f:
-            proj = json.load(f)
-        track = None
-        for t in proj.get("tracks", []):
-            if t.get("type") == "subtitles":
-                track = t
-                break
-        if track is None:
-            proj.setdefault("tracks", []).append({"type":"subtitles","clips":[]})
-            track = proj["tracks"][-1]
-        track["clips"] = cc_sub_clips
-        with open(ccproj_path, "w", encoding="utf-8") as f:
-            json.dump(proj, f, ensure_ascii=False, indent=2)
-        print(f"✅ CapCut字幕トラック統合: {ccproj_path}")
+def write_chapter_batch(batch:dict, store:ProjectStore, package:str, manifest:BuildManifest=None)->bool:
+    """章バッチをプロジェクトストアへ書く（内容が前回と同じならスキップして False）。
+    BGM・演出など他の工程がストアで足したキーは上書きしない。"""
+    chap_id = batch["id"]
+    inputs = digest(batch)
+    stale = manifest is None or manifest.needs_build(f"batch:{chap_id}", inputs)
+    if not stale and store.chapter_digest(package, chap_id) == inputs:
+        return False
+    store.put_chapter(package, batch, inputs)
+    if manifest is not None:
+        manifest.record(f"batch:{chap_id}", inputs)
+    return True
+
+# ---------- ナレーション音声（VOICEVOX） ----------
+def voice_item(ch:dict, voice_root:str, manifest:BuildManifest=None):
+    """章を合成し直すなら (chap_id, ナレーション, 出力パス, 入力ダイジェスト)、最新・ナレーション無しなら None"""
+    chap_id, narration = ch.get("id"), ch.get("narration","").strip()
+    if not chap_id or not narration:
+        return None
+    out = os.path.join(voice_root, f"{chap_id}.wav")
+    inputs = digest(narration, VOICE_SPEAKER, VOICE_SPEED)
+    if manifest is not None and not manifest.needs_build(f"voice:{chap_id}", inputs, [out]):
+        return None
+    return chap_id, narration, out, inputs
+
+def synthesize_chapter_voice(client, item, manifest:BuildManifest=None):
+    """1章分のナレーションを合成して書き出す（DAG の I/O タスク）"""
+    chap_id, narration, out, inputs = item
+    voice = client.synthesize_chapters([(narration, out)], VOICE_SPEAKER, VOICE_SPEED)[0]
+    if manifest is not None:
+        manifest.record(f"voice:{chap_id}", inputs, [out])
+    print(f"   ✅ {out} ({voice.duration:.1f}s, {len(voice.sentences)}文中 {voice.cached}文キャッシュ)")
+    return voice
+
+def chapter_voice_task(client, ch:dict, voice_root:str, manifest:BuildManifest=None):
+    """1章分のナレーションが変わっていれば合成する（DAG の I/O タスク）。
+    台本を生成するタスクが先に走る場合もあるので、合成するかどうかはタスクの中で決める"""
+    item = voice_item(ch, voice_root, manifest)
+    return synthesize_chapter_voice(client, item, manifest) if item else None
+
+# ---------- 字幕（SRT / WebVTT）生成 + CapCut統合 ----------
+def chapter_duration(ch:dict, timing=None)->float:
+    """章の尺（実測があればそちら）。字幕・タイムライン上の章の開始位置はこれの累積"""
+    if timing is not None:
+        return timing.duration_sec
+    return float(ch.get("time",{}).get("duration_sec",0) or 0)
+
+def chapter_subtitles(idx:int, ch:dict, start:float, timing=None, voice_root:str=None):
+    """1章分の字幕を作り (SRT, WebVTT, CapCutクリップ) を返す。尺が無い章は None"""
+    nid = ch.get("id", f"chapter{idx}")
+    dur = chapter_duration(ch, timing)
+    if dur <= 0:
+        return None
+    if timing is not None:
+        speech_at, speech_dur = start + timing.speech_start, timing.speech_sec
+    else:
+        speech_at, speech_dur = start, dur
+    narration = ch.get("narration","")
+    sentences = read_timing(os.path.join(voice_root, f"{nid}.wav")) if voice_root else None
+    if sentences:
+        # WAVの先頭が章のどこに置かれるか（リフロー時は先頭の無音を切った分だけ前にずれる）
+        wav_at = speech_at - timing.trim_in if timing is not None else start
+        cues = [Cue(wav_at + st, wav_at + en, seg) for st, en, seg in chapter_cues(sentences)]
     else:
-        print("⚠ CapCutプロジェクトが未生成のため字幕統合をスキップしました。")
+        cues = segment_and_time(narration.strip(), speech_at, speech_dur)
 
-# ---------- メイン ----------
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--package", required=True, help="人物ごとの master.json (packages/<slug>/master.json)")
-    ap.add_argument("--images-root", default="zap1/images")
-    ap.add_argument("--voice-root",  default="zap1/voice")
-    ap.add_argument("--bgm-root",    default="zap1/bgm")
-    ap.add_argument("--outdir",      default="zap1/output")
-    ap.add_argument("--scripts-dir", default="zap1/outputs/scripts", help="章バッチJSONの出力先ディレクトリ")
-    ap.add_argument("--export",      action="store_true", help="CapCutをGUI自動操作で書き出し")
-    args = ap.parse_args()
+    # CapCut字幕トラック用
+    cc_sub_style = {
+        "font_family":"Hiragino Sans",
+        "font_size": 42,
+        "fill": "#FFFFFF",
+        "stroke": {"color":"#000000","width":4},
+        "align":"center",
+        "position":"bottom_center",
+        "margin_bottom": 80
+    }
+    # visual_styleがあれば上書き
+    if "visual_style" in ch:
+        if "subtitle_fade_in" in ch["visual_style"]:
+            cc_sub_style["fade_in"] = ch["visual_style"]["subtitle_fade_in"]
+        if "subtitle_fade_out" in ch["visual_style"]:
+            cc_sub_style["fade_out"] = ch["visual_style"]["subtitle_fade_out"]
+
+    # SRT・WebVTT・CapCutクリップを1回の走査で作る（クリップはフレーム境界にそろえる）
+    return render_cues(cues, cc_sub_style, build_capcut_project.FPS)
+
+def write_chapter_subtitles(idx:int, ch:dict, srt_text:str, vtt_text:str, srt_out_dir:Path,
+                            manifest:BuildManifest=None, store:ProjectStore=None, package:str=None):
+    nid = ch.get("id", f"chapter{idx}")
+    srt_path = srt_out_dir / f"chapter_{idx:02d}_{nid}.srt"
+    vtt_path = srt_path.with_suffix(".vtt")
+    outputs = [str(srt_path), str(vtt_path)]
+    sub_inputs = digest(srt_text, vtt_text)
+    if manifest is None or manifest.needs_build(f"srt:{nid}", sub_inputs, outputs):
+        write_atomic(str(srt_path), srt_text)
+        write_atomic(str(vtt_path), vtt_text)
+        if manifest is not None:
+            manifest.record(f"srt:{nid}", sub_inputs, outputs)
+        print(f"📝 {srt_path} / .vtt を生成")
+    if store is not None:
+        store.put_assets(package, nid, "subtitle", outputs)
+
+# ---------- 章ごとのタスク（DAG） ----------
+def measure_chapter(chap_id:str, voice_root:str):
+    """1章分のボイス実測（WAV が無い・読めない・無音なら None）"""
+    return measure_chapters([chap_id], voice_root).get(chap_id)
+
+def chapter_batch_task(idx:int, ch:dict, lookups, images_root:str, voice_root:str, timing,
+                       store:ProjectStore, package:str, manifest:BuildManifest):
+    """1章分のバッチをストアへ書き、章の画像・ボイスをアセットとして登録する"""
+    batch = chapter_batch(idx, ch, lookups, images_root, voice_root, timing)
+    written = write_chapter_batch(batch, store, package, manifest)
+    chap_id = batch["id"]
+    store.put_assets(package, chap_id, "image", shared_index().chapter_files(images_root, chap_id, "image"))
+    voice = os.path.join(voice_root, f"{chap_id}.wav")
+    store.put_assets(package, chap_id, "voice", [voice] if os.path.exists(voice) else [])
+    return batch, written
+
+def chapter_subtitle_task(idx:int, ch:dict, rendered, srt_out_dir:Path,
+                          manifest:BuildManifest, store:ProjectStore, package:str)->list:
+    """別プロセスで組んだ1章分の SRT/WebVTT を書き、CapCut 字幕トラック用のクリップを返す"""
+    if rendered is None:
+        return []
+    srt_text, vtt_text, clips = rendered
+    write_chapter_subtitles(idx, ch, srt_text, vtt_text, srt_out_dir, manifest, store, package)
+    return clips
+
+def chapter_start(idx:int, chapters:list, measures:list, results:dict)->float:
+    """章の開始位置 = それより前の章の尺（実測があればそちら）の合計"""
+    return sum(max(0.0, chapter_duration(chapters[j], results.get(measures[j]) if measures[j] else None))
+               for j in range(idx))
+
+def _subtitle_args(idx:int, chapters:list, measures:list, voice_root:str):
+    """字幕を組むタスク（chapter_subtitles）の引数を依存タスクの結果から組む。
+    CPU プールが別プロセスなので、マニフェスト・ストアは渡さず pickle できる値だけにする"""
+    def bind(results:dict):
+        timing = results.get(measures[idx]) if measures[idx] else None
+        return idx, chapters[idx], chapter_start(idx, chapters, measures, results), timing, voice_root
+    return bind
+
+def chapter_segment_task(batch:dict, clips:list, start:float, variants:list, paths, segment_dir:Path, slug:str,
+                         manifest:BuildManifest, media)->str:
+    """1章分のタイムライン区間を、全章を待たずにプレビュー用の .ccproj として書き出す（DAG の I/O タスク）。
+    字幕クリップは章の先頭を 0 秒に寄せて入れる。入力が前回と同じなら組み直さない"""
+    chap_id = batch["id"]
+    out = segment_dir / f"{slug}_{chap_id}.ccproj"
+    fps = build_capcut_project.FPS
+    shift = sec2frame(start, fps)
+    clips = [dict(c, start=frame2sec(sec2frame(c["start"], fps) - shift, fps)) for c in clips]
+    proxy_files = [r.proxy for r in variants if r.ok and r.proxy]
+    image_variant = "proxy" if proxy_files else "master"
+    inputs = digest(segment_inputs(manifest, batch, paths), clips, image_variant, proxy_files)
+    if manifest.needs_build(f"segment:{chap_id}", inputs, [str(out)]):
+        config = build_capcut_project.BuildConfig(
+            scripts_dir=paths.scripts_dir,
+            images_root=paths.images_root,
+            voice_root=paths.voice_root,
+            bgm_root=paths.bgm_root,
+            out_ccproj=str(out),
+            image_variant=image_variant,
+            slug=slug,
+        )
+        project, _ = build_capcut_project.make_timeline([batch], config, clips, media=media, assets=shared_index())
+        write_json_atomic(str(out), project)
+        manifest.record(f"segment:{chap_id}", inputs, [str(out)])
+        print(f"🎞  区間プレビュー: {out}")
+    return str(out)
+
+def save_master_task(master:dict, master_out:Path, manifest:BuildManifest, store:ProjectStore, slug:str):
+    """（上流のタスクが埋め終えた）master を保存し、プロジェクトストアにも置く"""
+    master_inputs = digest(master)
+    if manifest.needs_build("master", master_inputs, [str(master_out)]):
+        write_json_atomic(str(master_out), master)
+        manifest.record("master", master_inputs, [str(master_out)])
+        print(f"📦 master を保存: {master_out}")
+    store.put_package(slug, master)
+
+# ---------- インクリメンタルビルド判定 ----------
+def segment_inputs(manifest:BuildManifest, batch:dict, paths)->str:
+    """章ごとのタイムライン区間の入力ダイジェスト（バッチ+画像+ボイス）"""
+    chap_id = batch["id"]
+    assets = shared_index().chapter_files(paths.images_root, chap_id, "image")
+    assets.append(os.path.join(paths.voice_root, f"{chap_id}.wav"))
+    return digest(batch, manifest.files_digest(assets))
+
+def timeline_inputs(manifest:BuildManifest, master:dict, batches:list, paths)->str:
+    """章ごとのタイムライン区間と全体要素（BGM・字幕元データ）からタイムライン全体の入力ダイジェストを作る"""
+    index = shared_index()
+    segment_digests = [segment_inputs(manifest, batch, paths) for batch in batches]
+    bgm = manifest.files_digest(index.role_files(paths.bgm_root, "bgm"))
+    params = [paths.scripts_dir, paths.images_root, paths.voice_root, paths.bgm_root]
+    return digest(segment_digests, bgm, master["package"]["script"]["chapters"], params)
+
+def chapter_proxies(post:ImagePostProcessor, images_root:str, store:ProjectStore, package:str, chap_id:str)->list:
+    """章の画像のプロキシ作成を別プロセスへ投入して完了を待ち、できたプロキシをアセットとして登録する（DAG の I/O タスク）。
+    画像を生成するタスクが先に走る場合もあるので、章の画像はタスクの中で引く"""
+    masters = shared_index().chapter_files(images_root, chap_id, "image")
+    variants = [future.result() for future in [post.submit(m) for m in masters]]
+    store.put_assets(package, chap_id, "proxy", [r.proxy for r in variants if r.ok and r.proxy])
+    return variants
+
+def build_timeline(master:dict, batches:list, sub_clips:list, variants:list, paths, manifest:BuildManifest,
+                   ccproj:Path, shotcsv:Path, slug:str)->bool:
+    """全章のバッチ・字幕がそろったところで CapCut プロジェクトを組む（入力が前回と同じならスキップ）"""
+    if variants:
+        summarize_variants(variants)
+    proxy_files = [r.proxy for r in variants if r.ok and r.proxy]
+    image_variant = "proxy" if proxy_files else "master"
+
+    # 字幕クリップも入力に含める（分割・タイミングの変更でタイムラインを作り直すため）
+    tl_inputs = digest(timeline_inputs(manifest, master, batches, paths), sub_clips, image_variant, proxy_files)
+    if not manifest.needs_build("timeline", tl_inputs, [str(ccproj), str(shotcsv)]):
+        print(f"⏩ CapCutプロジェクトは最新です: {ccproj}")
+        return False
+    config = build_capcut_project.BuildConfig(
+        scripts_dir=paths.scripts_dir,
+        images_root=paths.images_root,
+        voice_root=paths.voice_root,
+        bgm_root=paths.bgm_root,
+        out_ccproj=str(ccproj),
+        out_csv=str(shotcsv),
+        image_variant=image_variant,
+        slug=slug,
+    )
+    print("🛠  CapCutプロジェクト生成（字幕トラック込み）")
+    build_capcut_project.build_project(config, chapters=batches, subtitle_clips=sub_clips)
+    build_capcut_project.copy_to_capcut_for(config)
+    manifest.record("timeline", tl_inputs, [str(ccproj), str(shotcsv)])
+    print(f"✅ CapCutプロジェクト: {ccproj}")
+    print(f"✅ ショットリスト:      {shotcsv}")
+    return True
+
+# ---------- パッケージ単位のビルド ----------
+@dataclass
+class PackagePaths:
+    """1パッケージ分の入出力先。バッチモードではパッケージごとのワークスペース配下を指す"""
+    images_root: str = "zap1/images"
+    voice_root:  str = "zap1/voice"
+    bgm_root:    str = "zap1/bgm"
+    outdir:      str = "zap1/output"
+    outputs_root: str = "zap1/outputs"
+    scripts_dir: str = "zap1/outputs/scripts"
 
-    master = load_master(args.package)
+    @classmethod
+    def for_workspace(cls, workspace:Path, bgm_root:str)->"PackagePaths":
+        # BGMライブラリは読み取り専用の共有資産なので、ワークスペースに複製しない
+        return cls(
+            images_root=str(workspace / "images"),
+            voice_root=str(workspace / "voice"),
+            bgm_root=bgm_root,
+            outdir=str(workspace / "output"),
+            outputs_root=str(workspace / "outputs"),
+            scripts_dir=str(workspace / "outputs" / "scripts"),
+        )
+
+def build_package(package_path:str, paths:PackagePaths, force:bool=False, explain:bool=False,
+                  reflow:bool=True, tts:bool=False, proxies:bool=False, export_json:bool=False,
+                  io_workers:int=IO_WORKERS, cpu_processes:bool=True)->dict:
+    """master.json 1件から章バッチ・SRT・CapCutプロジェクトを生成し、結果の要約を返す（build_master を参照）"""
+    return build_master(load_master(package_path), paths, force=force, explain=explain, reflow=reflow, tts=tts,
+                        proxies=proxies, export_json=export_json, io_workers=io_workers, cpu_processes=cpu_processes)
+
+def build_master(master:dict, paths:PackagePaths, force:bool=False, explain:bool=False,
+                 reflow:bool=True, tts:bool=False, proxies:bool=False, export_json:bool=False,
+                 io_workers:int=IO_WORKERS, cpu_processes:bool=True, upstream=None)->dict:
+    """master 1件から章バッチ・SRT・CapCutプロジェクトを生成し、結果の要約を返す。
+    tts=True なら先にナレーションを VOICEVOX で合成する。
+    reflow=True なら章の尺をボイスWAVの実測で置き換えてから全体を組み立てる。
+    proxies=True なら画像の縮小プロキシを作り、タイムラインからはそちらを参照する。
+    工程ごとに全章を待たず、章ごとのタスク（ボイス → 実測 → バッチ・字幕、プロキシ → 区間）を依存関係つきで
+    I/O・CPU の別プールへ流すので、合成の済んだ章から仕上がり、章ごとの区間プレビュー（outdir/segments/）が
+    先に書き出される。全体のタイムラインは全章がそろってから組む。
+    upstream(sched) を渡すと、台本・画像を生成するタスクを同じ Scheduler に足してから章のタスクを並べる。
+    戻り値は章 id → その章の上流タスク名の一覧で、上流タスクは master の章（ナレーション・尺）や
+    thumbnails をその場で埋める。章のタスクは自分の章の上流だけを待つ。
+    cpu_processes=True なら実測・字幕の組み立ては別プロセスで動かし（GIL を避ける）、
+    マニフェスト・ストア・ファイルへの書き込みはこのプロセスの I/O プールで行う。
+    章バッチ・アセット・クリップは scripts_dir のプロジェクトストアに書き、export_json=True なら章バッチJSONも書き出す。"""
     person = master["package"].get("person") or "project"
     slug = slugify(person)
 
     # 出力系パス
-    outputs_root = Path("zap1/outputs")
+    outputs_root = Path(paths.outputs_root)
     ensure_dir(outputs_root)
+    manifest = BuildManifest(str(outputs_root / f"{slug}.manifest.json"), force=force)
     master_out = outputs_root / f"{slug}_master.json"
-    with open(master_out, "w", encoding="utf-8") as f:
-        json.dump(master, f, ensure_ascii=False, indent=2)
-    print(f"📦 master を保存: {master_out}")
-
-    scripts_dir = Path(args.scripts_dir)
-    create_chapter_batches(master, scripts_dir)
 
-    # CapCutプロジェクト生成
-    outdir = Path(args.outdir)
+    chapters = master["package"]["script"]["chapters"]
+    scripts_dir = Path(paths.scripts_dir)
+    ensure_dir(scripts_dir)
+    srt_out = outputs_root / "subtitles"
+    ensure_dir(srt_out)
+    outdir = Path(paths.outdir)
     ensure_dir(outdir)
+    segment_dir = outdir / "segments"
+    ensure_dir(segment_dir)
     ccproj = outdir / f"{slug}_capcut.ccproj"
     shotcsv = outdir / f"{slug}_shotlist.csv"
 
-    cmd = [
-        "python3", "build_capcut_project.py",
-        "--scripts-dir", str(scripts_dir),
-        "--images-root", args.images_root,
-        "--voice-root",  args.voice_root,
-        "--bgm-root",    args.bgm_root,
-        "--out-ccproj",  str(ccproj),
-        "--out-csv",     str(shotcsv),
-    ]
-    print("🛠  CapCutプロジェクト生成:", " ".join(cmd))
-    subprocess.run(cmd, check=True)
-    print(f"✅ CapCutプロジェクト: {ccproj}")
-    print(f"✅ ショットリスト:      {shotcsv}")
+    def chapter_ready(label:str, at:float):
+        if not first_ready:
+            first_ready.append(label)
+            print(f"👀 最初にそろった章: {label}（{at:.2f}s、{segment_dir}/ の区間プレビューを確認できます）")
 
-    # 字幕生成 + 統合
-    srt_out = outputs_root / "subtitles"
-    gen_subtitles_and_integrate(master, srt_out, ccproj)
+    # 画像フォルダは最初に 1 回だけ走査し、章ごとの一覧はインデックスから引く（変わっていなければ stat だけ）
+    assets = shared_index()
+    assets.scan(paths.images_root)
+    media = MediaIndex()  # 区間プレビューで共有する（ボイス・BGM の長さを 1 回だけ読む）
 
-    # 任意：自動エクスポート（GUI）
-    if args.export:
-        # ここはあなたが以前使った GUI 自動化スクリプトを再利用想定
-        # 例: python3 zap1/export_capcut_auto.py --project <ccproj> --out <mp4>
+    first_ready = []
+    sched = Scheduler(io_workers=io_workers, cpu_processes=cpu_processes, on_chapter_ready=chapter_ready)
+    up = upstream(sched) if upstream else {}
+    with ExitStack() as stack:
+        store = stack.enter_context(ProjectStore.for_scripts_dir(paths.scripts_dir))
+        pruned = store.prune_chapters(slug, [ch.get("id") for ch in chapters if ch.get("id")])
+        if pruned:
+            print(f"🗑  台本から消えた {pruned} 章をプロジェクトストアから削除しました")
+        master_task = sched.add("master", save_master_task, master, master_out, manifest, store, slug,
+                                deps=[t for tasks in up.values() for t in tasks])
+
+        # ナレーション合成（変わった章だけ。文単位のキャッシュがあるので直した文だけ合成し直す）
+        client = None
+        if tts:
+            from makeshorts.tts import VoiceCache, VoicevoxClient  # requests は --tts のときだけ読み込む
+            client = stack.enter_context(VoicevoxClient(max_workers=VOICE_WORKERS, cache=VoiceCache()))
+
+        # 編集用プロキシ（マスターより新しいものは作り直さない）は章ごとに別プロセスへ投入する
+        post = None
+        if proxies:
+            try:
+                post = stack.enter_context(ImagePostProcessor(PostOptions()))
+            except ImagePostError as e:
+                print(f"⚠️ {e}（タイムラインはマスター画像を参照します）")
+
+        # 章ごとのタスク: （上流）→ ボイス合成 → 実測 → バッチJSON / 字幕（開始位置が要るので前の章の実測も待つ）→ 区間
+        measures, sub_tasks, batch_tasks, proxy_tasks, segment_tasks = [], [], [], [], []
+        seen_up = []
+        for idx, ch in enumerate(chapters):
+            chap_id = ch.get("id")
+            label = chap_id or f"chapter{idx}"
+            ch_up = list(up.get(chap_id, ()))
+            seen_up += ch_up
+            voice = []
+            if client is not None and chap_id:
+                voice.append(sched.add(f"voice:{chap_id}", chapter_voice_task, client, ch, paths.voice_root, manifest,
+                                       deps=ch_up, chapter=label))
+            measure = None
+            if reflow and chap_id:
+                measure = sched.add(f"measure:{chap_id}", measure_chapter, chap_id, paths.voice_root,
+                                    deps=voice + ch_up, pool="cpu", chapter=label)
+            measures.append(measure)
+            cues = sched.add(
+                f"subs:{label}", chapter_subtitles, pool="cpu", chapter=label,
+                deps=[m for m in measures if m] + voice + seen_up,
+                bind=_subtitle_args(idx, chapters, list(measures), paths.voice_root),
+            )
+            srt = sched.add(
+                f"srt:{label}", chapter_subtitle_task, deps=[cues], chapter=label,
+                bind=lambda r, idx=idx, ch=ch, cues=cues: (idx, ch, r[cues], srt_out, manifest, store, slug),
+            )
+            sub_tasks.append(srt)
+            if not chap_id:
+                continue
+            batch = sched.add(
+                f"batch:{chap_id}", chapter_batch_task, deps=([measure] if measure else []) + ch_up, chapter=label,
+                bind=lambda r, idx=idx, ch=ch, measure=measure: (idx, ch, chapter_lookups(master), paths.images_root,
+                                                               paths.voice_root, r.get(measure), store, slug, manifest),
+            )
+            batch_tasks.append(batch)
+            proxy = None
+            if post is not None:
+                proxy = sched.add(f"proxy:{chap_id}", chapter_proxies, post, paths.images_root, store, slug, chap_id,
+                                  deps=ch_up, chapter=label)
+                proxy_tasks.append(proxy)
+            segment_tasks.append(sched.add(
+                f"segment:{chap_id}", chapter_segment_task, deps=[srt, batch] + ([proxy] if proxy else []),
+                chapter=label,
+                bind=lambda r, idx=idx, srt=srt, batch=batch, proxy=proxy, measures=list(measures): (
+                    r[batch][0], r[srt], chapter_start(idx, chapters, measures, r), r[proxy] if proxy else [],
+                    paths, segment_dir, slug, manifest, media),
+            ))
+
+        # 全章がそろったらタイムライン（マニフェスト・ストアを更新するのでこのプロセスの I/O プールで組む）
+        sched.add(
+            "timeline", build_timeline, deps=sub_tasks + segment_tasks + [master_task],
+            bind=lambda r: (master, [r[t][0] for t in batch_tasks], [c for t in sub_tasks for c in r[t]],
+                            [v for t in proxy_tasks for v in r[t]], paths, manifest, ccproj, shotcsv, slug),
+        )
+        report = sched.run()
+        if export_json and not report.failed:
+            exported = store.export_chapters(slug, str(scripts_dir))
+            print(f"🗂  章バッチJSONを書き出し: {scripts_dir} （{len(exported)}章）")
+
+    written = sum(1 for t in batch_tasks if report.runs[t].ok and report.runs[t].result[1])
+    print(f"🧩 章バッチ生成完了: {store.path} （書き込み {written}/{len(batch_tasks)}章）")
+    if client is not None:
+        synthesized = sum(1 for run in report.runs.values() if run.name.startswith("voice:") and run.ok and run.result)
+        print(f"🎙  VOICEVOX で合成: {synthesized}章" if synthesized else "⏩ ナレーション音声は最新です")
+    measured = sum(1 for m in measures if m and report.runs[m].ok and report.runs[m].result is not None)
+    if measured:
+        print(f"🎙  ボイス実測で章の尺を再計算: {measured}/{sum(1 for m in measures if m)}章")
+    print(report.summary())
+    assets.save()
+    media.save()
+    if report.failed:
+        manifest.save()  # 終わった章の分は次回スキップできるように残す
+        for run in report.failed:
+            print(f"   ❌ {run.name}: {run.error}")
+        raise RuntimeError(f"{len(report.failed)} 件のタスクが完了しませんでした")
+
+    manifest.save()
+    manifest.report(verbose=explain)
+    return {"slug": slug, "ccproj": str(ccproj), "chapters": len(batch_tasks)}
+
+def export_packages(items:list):
+    """(ccproj, outdir, slug) の並びを CapCut の GUI 操作で順番に書き出す。
+    完了は出力MP4の監視で判定するので、短い動画は待たされず長い動画も途中で打ち切られない。"""
+    # 例: python3 zap1/export_capcut_auto.py --project <ccproj> --out <mp4> [--project ... --out ...]
+    cmd = ["python3","zap1/export_capcut_auto.py"]
+    for ccproj, outdir, slug in items:
         exported = outdir / "exported" / f"{slug}_final.mp4"
         ensure_dir(exported.parent)
-        print("🚀 CapCut自動エクスポート開始（GUI操作）")
+        cmd += ["--project", str(ccproj), "--out", str(exported)]
+    print(f"🚀 CapCut自動エクスポート開始（GUI操作・{len(items)}件）")
+    try:
+        subprocess.run(cmd, check=True)
+    except Exception as e:
+        print("⚠ 自動エクスポートに失敗しました:", e)
+    else:
+        print("🎬 エクスポート完了")
+
+def export_package(ccproj:Path, outdir:Path, slug:str):
+    export_packages([(ccproj, outdir, slug)])
+
+def render_package(ccproj:Path, outdir:Path, slug:str, workers:int=None):
+    """CapCutを使わず ffmpeg で章ごとに並列描画して書き出す（Linux のレンダリング機でも可）"""
+    rendered = outdir / "exported" / f"{slug}_final.mp4"
+    try:
+        render_project(str(ccproj), str(rendered), workers=workers)
+    except RenderError as e:
+        print(f"❌ ヘッドレス書き出しに失敗: {e}")
+        return None
+    return rendered
+
+# ---------- 複数パッケージのバッチビルド ----------
+def _build_in_workspace(package_path:str, workspace:str, bgm_root:str, force:bool, explain:bool,
+                        reflow:bool=True, tts:bool=False, proxies:bool=False, export_json:bool=False)->dict:
+    """ワーカープロセス側の処理。ログはワークスペースの build.log に書き、要約だけを返す"""
+    started = time.perf_counter()
+    ws = Path(workspace)
+    ensure_dir(ws)
+    result = {"package": package_path, "workspace": workspace, "ok": False}
+    with open(ws / "build.log", "w", encoding="utf-8") as log, redirect_stdout(log):
         try:
-            subprocess.run([
-                "python3","zap1/export_capcut_auto.py",
-                "--project", str(ccproj),
-                "--out",     str(exported)
-            ], check=True)
+            # パッケージ単位で既にプロセスを分けているので、章の CPU タスクはスレッドで動かす
+            result.update(build_package(package_path, PackagePaths.for_workspace(ws, bgm_root), force, explain,
+                                        reflow, tts, proxies, export_json, cpu_processes=False))
+            result["ok"] = True
         except Exception as e:
-            print("⚠ 自動エクスポートに失敗しました:", e)
-        else:
-            print(f"🎬 エクスポート完了: {exported}")
+            traceback.print_exc(file=log)
+            result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed"] = time.perf_counter() - started
+    return result
+
+def build_packages(pattern:str, workspace_root:str, bgm_root:str, workers:int,
+                   force:bool=False, explain:bool=False, reflow:bool=True, tts:bool=False,
+                   proxies:bool=False, export_json:bool=False)->list:
+    """glob に一致する master.json を、パッケージごとに独立したワークスペースで並列ビルドする"""
+    packages = sorted(glob.glob(pattern))
+    if not packages:
+        raise FileNotFoundError(f"パッケージが見つかりません: {pattern}")
+    print(f"🏭 {len(packages)} パッケージを {workers} プロセスでビルドします（ワークスペース: {workspace_root}/）")
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            # packages/<name>/master.json → <workspace_root>/<name>/
+            pool.submit(_build_in_workspace, pkg, str(Path(workspace_root) / Path(pkg).parent.name),
+                        bgm_root, force, explain, reflow, tts, proxies, export_json): pkg
+            for pkg in packages
+        }
+        for future in as_completed(futures):
+            try:
+                r = future.result()
+            except Exception as e:  # ワーカープロセス自体が落ちた場合
+                r = {"package": futures[future], "ok": False, "error": f"{type(e).__name__}: {e}", "elapsed": 0.0}
+            mark = "✅" if r["ok"] else "❌"
+            print(f"{mark} {r['package']} ({r['elapsed']:.1f}s)" + ("" if r["ok"] else f" — {r['error']}"))
+            results.append(r)
+    total = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    chapters = sum(r.get("chapters", 0) for r in ok)
+    print(f"\n📊 成功 {len(ok)} / 失敗 {len(results) - len(ok)}  合計 {total:.1f}s")
+    print(f"   スループット: {len(results) / total * 60:.1f} パッケージ/分, {chapters / total:.1f} 章/秒")
+    for r in results:
+        if not r["ok"]:
+            print(f"   ❌ {r['package']}: {r['error']}（詳細: {r['workspace']}/build.log）")
+    return results
+
+# ---------- メイン ----------
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--package", help="人物ごとの master.json (packages/<slug>/master.json)")
+    ap.add_argument("--packages", help="複数パッケージの glob（例: 'packages/*/master.json'）。パッケージごとにワークスペースを分けて並列ビルド")
+    ap.add_argument("--workers",  type=int, default=os.cpu_count() or 1, help="--packages 使用時のプロセス数 / --render 時の同時描画数")
+    ap.add_argument("--workspace-root", default="builds", help="--packages 使用時のワークスペース親ディレクトリ")
+    ap.add_argument("--images-root", default="zap1/images")
+    ap.add_argument("--voice-root",  default="zap1/voice")
+    ap.add_argument("--bgm-root",    default="zap1/bgm")
+    ap.add_argument("--outdir",      default="zap1/output")
+    ap.add_argument("--outputs-root", default="zap1/outputs", help="master・マニフェスト・字幕の出力先")
+    ap.add_argument("--scripts-dir", default="zap1/outputs/scripts", help="プロジェクトストア（project.sqlite3）と章バッチJSONの置き場")
+    ap.add_argument("--export-json", action="store_true", help="章バッチを従来の chapter_XX_<id>.json としても書き出す")
+    ap.add_argument("--export",      action="store_true", help="CapCutをGUI自動操作で書き出し")
+    ap.add_argument("--render",      action="store_true", help="ffmpegでヘッドレスに書き出し（--workers 並列）")
+    ap.add_argument("--force",       action="store_true", help="マニフェストを無視して全て再生成")
+    ap.add_argument("--explain",     action="store_true", help="スキップした対象とその理由も表示")
+    ap.add_argument("--tts",         action="store_true", help="ナレーションをVOICEVOXで合成してから組み立てる（MAKESHORTS_VOICEVOX_URL）")
+    ap.add_argument("--no-reflow",   action="store_true", help="ボイスWAVの実測を使わず台本の duration_sec のまま組む")
+    ap.add_argument("--proxy",       action="store_true", help="画像の縮小プロキシ（<章>/proxy/*.jpg）を作り、CapCutプロジェクトから参照する")
+    args = ap.parse_args(argv)
+    if bool(args.package) == bool(args.packages):
+        ap.error("--package か --packages のどちらか一方を指定してください")
+    # CapCutはプロジェクトが参照する画像のまま書き出すので、書き出す場合はマスターを参照させる
+    proxies = args.proxy and not args.export
+    if args.proxy and args.export:
+        print("⚠️ --export 時は画質を保つためマスター画像を参照します（--proxy は無視）")
+
+    if args.packages:
+        if args.render:
+            ap.error("--render は --package と併用してください（各ワークスペースの .ccproj は makeshorts.render で個別に書き出せます）")
+        results = build_packages(args.packages, args.workspace_root, args.bgm_root, args.workers,
+                                 force=args.force, explain=args.explain, reflow=not args.no_reflow,
+                                 tts=args.tts, proxies=proxies, export_json=args.export_json)
+        if args.export:
+            # GUIは1セッションなので、ビルドが済んだものを順番に書き出す
+            export_packages([(Path(r["ccproj"]), Path(r["workspace"]) / "output", r["slug"])
+                             for r in results if r["ok"]])
+        raise SystemExit(0 if all(r["ok"] for r in results) else 1)
+
+    paths = PackagePaths(
+        images_root=args.images_root,
+        voice_root=args.voice_root,
+        bgm_root=args.bgm_root,
+        outdir=args.outdir,
+        outputs_root=args.outputs_root,
+        scripts_dir=args.scripts_dir,
+    )
+    built = build_package(args.package, paths, force=args.force, explain=args.explain,
+                          reflow=not args.no_reflow, tts=args.tts, proxies=proxies, export_json=args.export_json)
+
+    # 任意：自動エクスポート（GUI）
+    if args.export:
+        export_package(Path(built["ccproj"]), Path(paths.outdir), built["slug"])
+    if args.render:
+        if render_package(Path(built["ccproj"]), Path(paths.outdir), built["slug"], args.workers) is None:
+            raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,3 @@
+from makeshorts.cli import main
+
+raise SystemExit(main())
@@ -0,0 +1,173 @@
+"""画像・ボイス・BGM フォルダのファイル一覧を 1 回の os.scandir の走査で集めるアセットインデックス
+
+ディレクトリごとに (mtime_ns, ファイル名, サブディレクトリ名) を持ち、引くときはディレクトリを 1 回 stat して
+mtime が変わっていなければ一覧を読み直さない（ファイルの追加・削除・改名でディレクトリの mtime が変わる）。
+結果は ~/.cache/makeshorts/asset_index.json（環境変数 MAKESHORTS_ASSET_INDEX）へ保存するので、
+ネットワーク越しのアセット置き場でも、次の実行からは変わったディレクトリしか一覧し直さない。
+保存はファイルをロックして読み直し、このプロセスで読み直した・消えたディレクトリだけを重ねて書き戻す
+（パッケージごとのプロセスが同じインデックスを同時に保存しても、ほかのプロセスの結果を消さない）。
+
+    assets = shared_index()
+    assets.scan("zap1/images")                                # ルート以下をまとめて走査
+    assets.chapter_files("zap1/images", "chapter1", "image")  # zap1/images/chapter1/*.png|jpg|jpeg（自然順）
+    assets.role_files("zap1/bgm", "bgm")                      # zap1/bgm/*.mp3|wav|m4a|flac（自然順）
+
+返すパスは渡したディレクトリに名前を join したもの（glob.glob と同じ形）で、natsort の自然順に並ぶ。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import stat
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Set
+
+from natsort import natsorted
+
+from makeshorts.run_journal import file_lock, write_json_atomic
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "makeshorts", "asset_index.json")
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+AUDIO_EXTS = (".mp3", ".wav", ".m4a", ".flac")
+ROLE_EXTS = {
+    "image": IMAGE_EXTS,
+    "voice": (".wav",),
+    "bgm": AUDIO_EXTS,
+}
+
+# 一覧を読んだ時刻とディレクトリの mtime がこれより近いと、同じ時刻の刻みのうちに
+# 追加されたファイルを見落としうる（秒単位の mtime のファイルシステムもある）ので、次に引くときも読み直す
+RACY_NS = 2_000_000_000
+
+
+class AssetIndex:
+    """ディレクトリの mtime をキーにファイル一覧を持つインデックス（スレッドセーフ）"""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or os.getenv("MAKESHORTS_ASSET_INDEX", DEFAULT_INDEX_PATH)
+        self._changed: Set[str] = set()  # 前回の保存から読み直した・消えたディレクトリ
+        self._lock = threading.Lock()
+        self.rescans = 0  # 一覧を読み直したディレクトリ数（確認用）
+        self._dirs: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # ---------- 走査 ----------
+    def scan(self, root: str) -> int:
+        """root 以下を 1 回の走査で確認し、一覧を読み直したディレクトリ数を返す"""
+        before = self.rescans
+        self._refresh(os.path.abspath(root), recursive=True)
+        return self.rescans - before
+
+    def _refresh(self, key: str, st: Optional[os.stat_result] = None, recursive: bool = False) -> Optional[dict]:
+        if st is None:
+            try:
+                st = os.stat(key)
+            except (FileNotFoundError, NotADirectoryError):
+                st = None
+        if st is None or not stat.S_ISDIR(st.st_mode):
+            self._forget(key)
+            return None
+        with self._lock:
+            entry = self._dirs.get(key)
+        if entry is not None and entry["mtime_ns"] == st.st_mtime_ns and entry["scanned_ns"] - st.st_mtime_ns > RACY_NS:
+            if recursive:
+                for name in entry["dirs"]:
+                    self._refresh(os.path.join(key, name), recursive=True)
+            return entry
+
+        files: List[str] = []
+        subdirs: Dict[str, Optional[os.stat_result]] = {}
+        with os.scandir(key) as it:
+            for e in it:
+                if e.name.startswith("."):
+                    continue
+                if e.is_dir():
+                    subdirs[e.name] = e.stat() if recursive else None
+                else:
+                    files.append(e.name)
+        entry = {
+            "mtime_ns": st.st_mtime_ns,
+            "scanned_ns": time.time_ns(),
+            "files": natsorted(files),
+            "dirs": sorted(subdirs),
+        }
+        with self._lock:
+            old = self._dirs.get(key)
+            self._dirs[key] = entry
+            self._changed.add(key)
+            self.rescans += 1
+        for name in set(old["dirs"] if old else ()) - set(subdirs):
+            self._forget(os.path.join(key, name))
+        if recursive:
+            for name, sub_st in subdirs.items():
+                self._refresh(os.path.join(key, name), sub_st, recursive=True)
+        return entry
+
+    def _forget(self, key: str) -> None:
+        """消えたディレクトリとその下のエントリを捨てる"""
+        prefix = key + os.sep
+        with self._lock:
+            gone = [k for k in self._dirs if k == key or k.startswith(prefix)]
+            for k in gone:
+                del self._dirs[k]
+            self._changed.update(gone)
+
+    # ---------- 検索 ----------
+    def files(self, directory: str, exts: Optional[Sequence[str]] = None) -> List[str]:
+        """directory 直下のファイル（exts で拡張子を絞る・大文字小文字は区別しない）を自然順で返す。無ければ []"""
+        entry = self._refresh(os.path.abspath(directory))
+        if entry is None:
+            return []
+        names = entry["files"]
+        if exts is not None:
+            exts = tuple(exts)
+            names = [n for n in names if n.lower().endswith(exts)]
+        return [os.path.join(directory, n) for n in names]
+
+    def role_files(self, directory: str, role: str) -> List[str]:
+        """役割（image / voice / bgm）の拡張子で絞ったファイル"""
+        return self.files(directory, ROLE_EXTS[role])
+
+    def chapter_files(self, root: str, chapter_id: str, role: str = "image") -> List[str]:
+        """<root>/<章ID>/ の役割ごとのファイル"""
+        return self.role_files(os.path.join(root, chapter_id), role)
+
+    def save(self) -> None:
+        """ディスク上のインデックスに、このプロセスで変わったディレクトリだけを重ねて書き戻す"""
+        with self._lock:
+            if not self._changed:
+                return
+            with file_lock(self.path):
+                merged = self._load()
+                for key in self._changed:
+                    entry = self._dirs.get(key)
+                    if entry is None:
+                        merged.pop(key, None)
+                    elif key not in merged or merged[key]["scanned_ns"] <= entry["scanned_ns"]:
+                        merged[key] = entry  # ほかのプロセスがあとから読み直した一覧は残す
+                write_json_atomic(self.path, merged, indent=None)
+            self._changed.clear()
+            for key, entry in merged.items():
+                self._dirs.setdefault(key, entry)
+
+
+_shared: Optional[AssetIndex] = None
+_shared_lock = threading.Lock()
+
+
+def shared_index() -> AssetIndex:
+    """プロセス内で共有するインデックス（make_all・build_capcut_project・zap1 の各スクリプトで同じ一覧を使う）"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = AssetIndex()
+        return _shared
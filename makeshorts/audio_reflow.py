@@ -0,0 +1,169 @@
+"""ナレーション音声の実長に合わせて章の尺を組み直す（リフロー）
+
+台本の duration_sec は LLM の見積もりなので、実際に合成された zap1/voice/<id>.wav とはずれる。
+各章の WAV を mmap し、ブロック単位のエネルギー（RMS）で先頭・末尾の無音を削ったうえで
+「発話の長さ + 前後の間」を章の尺とする。章の開始位置・画像の分割・字幕・BGM は
+すべてこの尺から導かれるので、make_all はタイムラインを書き出す前に一度だけ計算すればよい。
+
+クリックやポップノイズのような一瞬のピークはブロック全体のエネルギーにはほとんど効かないので、
+発話とはみなさない。二乗和は Python 3.12 以降なら math.sumprod（C 実装・浮動小数 PCM も可）、
+3.11 以前の整数 PCM は audioop.rms（3.13 で削除されたので 3.12 以降では読み込まない）で求める。
+どちらも無いとき（3.11 以前の浮動小数 PCM）だけ Python のループで二乗和を取るので遅いが、
+無音判定は両端から発話が見つかった時点で打ち切るため、長い音声でも読むのは端の数秒だけ。
+"""
+
+from __future__ import annotations
+
+import math
+import mmap
+import operator
+import os
+import sys
+import warnings
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+from makeshorts.media_probe import ProbeError, read_wav_layout
+
+_sumprod = getattr(math, "sumprod", None)  # Python 3.12+
+audioop = None
+if _sumprod is None:
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            import audioop  # Python 3.13 で削除
+    except ImportError:  # pragma: no cover - audioop を外したビルド
+        audioop = None
+
+DEFAULT_THRESHOLD_DB = -45.0  # RMS がこれ以下のブロックを無音とみなす（フルスケール比）
+DEFAULT_BLOCK_SEC = 0.01
+DEFAULT_PAD_SEC = 0.3  # 発話の前後に残す間
+
+# (format_tag, bits) -> (memoryview の型, フルスケール, 無音の中心値)。audioop で扱えるのは整数 PCM だけ
+_PCM_TYPES = {
+    (1, 8): ("B", 128, 128),
+    (1, 16): ("h", 32768, 0),
+    (1, 32): ("i", 2147483648, 0),
+    (3, 32): ("f", 1.0, 0),
+    (3, 64): ("d", 1.0, 0),
+}
+
+
+def _sum_of_squares(chunk, center: float = 0) -> float:
+    """center を中心とした二乗和（中心は展開して足すので、サンプルごとの Python ループを作らない）"""
+    if _sumprod is not None:
+        total = _sumprod(chunk, chunk)
+    else:
+        total = sum(map(operator.mul, chunk, chunk))
+    if center:
+        total += len(chunk) * center * center - 2 * center * sum(chunk)
+    return total
+
+
+@dataclass
+class SpeechSpan:
+    """WAV ファイル内で発話がある区間（秒）"""
+    start: float
+    end: float
+    total: float
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.end - self.start)
+
+
+@dataclass
+class ChapterTiming:
+    """リフロー後の章の尺と、章内でのボイスの置き方"""
+    duration_sec: float  # 章の長さ（発話 + 前後の間）
+    speech_start: float  # 章の先頭からボイスを置く位置
+    speech_sec: float  # ボイスクリップの長さ
+    trim_in: float  # WAV の先頭から切り捨てる無音
+
+    def voice_trim(self) -> dict:
+        """章バッチに載せてタイムライン構築へ渡す形"""
+        return {
+            "offset": self.speech_start,
+            "source_start": self.trim_in,
+            "duration": self.speech_sec,
+        }
+
+
+def speech_span(
+    path: str,
+    *,
+    threshold_db: float = DEFAULT_THRESHOLD_DB,
+    block_sec: float = DEFAULT_BLOCK_SEC,
+) -> Optional[SpeechSpan]:
+    """先頭・末尾の無音を除いた発話区間を返す。全体が無音なら None
+
+    対応していない PCM 形式（24bit など）は削らずにファイル全体を発話区間として返す。
+    """
+    layout = read_wav_layout(path)
+    total = layout.data_size / layout.byte_rate if layout.byte_rate else 0.0
+    pcm = _PCM_TYPES.get((layout.format_tag, layout.bits_per_sample))
+    if pcm is None or sys.byteorder != "little" or layout.data_size < layout.block_align:
+        return SpeechSpan(0.0, total, total)
+    code, full_scale, center = pcm
+    threshold = full_scale * 10 ** (threshold_db / 20)
+    width = layout.bits_per_sample // 8
+    use_audioop = audioop is not None and layout.format_tag == 1
+
+    frames = layout.data_size // layout.block_align
+    block = max(1, int(layout.sample_rate * block_sec)) * layout.channels  # 1ブロックのサンプル数
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        raw = memoryview(buf)[layout.data_offset:layout.data_offset + frames * layout.block_align]
+        samples = raw.cast(code)
+        try:
+            n = len(samples)
+
+            def loud(i: int) -> bool:
+                if use_audioop:
+                    chunk = raw[i * width:(i + block) * width]
+                    if center:  # 8bit WAV は符号なし
+                        chunk = audioop.bias(chunk, width, -center)
+                    return audioop.rms(chunk, width) > threshold
+                chunk = samples[i:i + block]
+                return math.sqrt(max(0.0, _sum_of_squares(chunk, center)) / len(chunk)) > threshold
+
+            first = next((i for i in range(0, n, block) if loud(i)), None)
+            if first is None:
+                return None
+            last = next(i for i in range((n - 1) // block * block, first - 1, -block) if loud(i))
+            end = min(n, last + block)
+        finally:
+            samples.release()
+            raw.release()
+
+    per_sec = layout.sample_rate * layout.channels
+    return SpeechSpan(round(first / per_sec, 3), round(end / per_sec, 3), total)
+
+
+def chapter_timing(span: SpeechSpan, pad_sec: float = DEFAULT_PAD_SEC) -> ChapterTiming:
+    speech = round(span.duration, 3)
+    return ChapterTiming(round(speech + 2 * pad_sec, 3), pad_sec, speech, span.start)
+
+
+def measure_chapters(
+    chapter_ids: Iterable[str],
+    voice_root: str,
+    *,
+    pad_sec: float = DEFAULT_PAD_SEC,
+    threshold_db: float = DEFAULT_THRESHOLD_DB,
+) -> Dict[str, ChapterTiming]:
+    """voice_root/<id>.wav がある章だけ実測の尺を返す（無い・読めない・無音の章は含まない）"""
+    timings: Dict[str, ChapterTiming] = {}
+    for chap_id in chapter_ids:
+        path = os.path.join(voice_root, f"{chap_id}.wav")
+        if not os.path.exists(path):
+            continue
+        try:
+            span = speech_span(path, threshold_db=threshold_db)
+        except (ProbeError, OSError, ValueError) as e:
+            print(f"⚠️ ボイスを解析できません（台本の尺を使用）: {path}: {e}")
+            continue
+        if span is None:
+            print(f"⚠️ ボイスが無音です（台本の尺を使用）: {path}")
+            continue
+        timings[chap_id] = chapter_timing(span, pad_sec)
+    return timings
@@ -0,0 +1,327 @@
+"""MakeShorts のベンチマーク（ローカルスタブ・合成データのみで実行でき、外部サービス不要）
+
+使い方:
+    python3 -m makeshorts.bench imagen --images 30 --latency 0.5 --workers 1 8
+    python3 -m makeshorts.bench timeline --chapters 100 1000 5000
+    python3 -m makeshorts.bench media --files 2000
+    python3 -m makeshorts.bench subtitles --chars 1100 --chapters 12 --packages 200
+    python3 -m makeshorts.bench transport --images 30 --fault-rate 0.3 --burst 8
+    python3 -m makeshorts.bench imagen-batch --chapters 10 --per-chapter 3 --batch 1 3
+    python3 -m makeshorts.bench startup --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import redirect_stdout
+from pathlib import Path
+
+
+def bench_imagen(args: argparse.Namespace) -> None:
+    from makeshorts.imagen import ImageJob, ImagenEngine
+    from makeshorts.stubs import MockImagenServer
+
+    print(f"🧪 Imagen モック: {args.images} 枚 / レイテンシ {args.latency:.2f}s / RPM {args.rpm}")
+    with MockImagenServer(latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            out_dir = Path(tmp) / f"w{workers}"
+            jobs = [
+                ImageJob(index, f"bench prompt {index}", str(out_dir / f"{index:02d}_bench.png"))
+                for index in range(1, args.images + 1)
+            ]
+            engine = ImagenEngine(
+                server.endpoint,
+                "dummy-token",
+                project_id=f"bench-{workers}",
+                max_workers=workers,
+                requests_per_minute=args.rpm,
+            )
+            started = time.perf_counter()
+            with engine:
+                results = engine.render(jobs)
+            elapsed = time.perf_counter() - started
+            ok = sum(1 for result in results if result.ok)
+            ordered = [result.job.index for result in results] == [job.index for job in jobs]
+            print(
+                f"  workers={workers:>3}  {elapsed:7.2f}s  {args.images / elapsed:6.2f} img/s  "
+                f"成功 {ok}/{len(jobs)}  順序保持={'OK' if ordered else 'NG'}"
+            )
+
+
+def bench_imagen_batch(args: argparse.Namespace) -> None:
+    from makeshorts.imagen import ImageJob, ImagenEngine
+    from makeshorts.stubs import MockImagenServer
+
+    total = args.chapters * args.per_chapter
+    print(f"🧪 Imagen まとめ送信: {args.chapters} 章 x {args.per_chapter} 枚 / 往復 {args.latency:.2f}s + "
+          f"1 枚 {args.per_image:.2f}s / workers={args.workers}")
+    scenarios = [("通常", {})]
+    if args.max_instances:
+        scenarios.append((f"instances は {args.max_instances} 件まで（400）", {"max_instances": args.max_instances}))
+    scenarios.append(("一部が安全フィルタで欠落", {"filtered_words": ["#filtered"]}))
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, options in scenarios:
+            print(f"  {label}")
+            for batch in args.batch:
+                with MockImagenServer(latency=args.latency, per_image_latency=args.per_image, **options) as server:
+                    out_dir = Path(tmp) / f"{len(label)}-{batch}"
+                    jobs = [
+                        ImageJob(
+                            index,
+                            f"chapter {index // args.per_chapter} still {index}" + (" #filtered" if index % 7 == 3 else ""),
+                            str(out_dir / f"{index:02d}_bench.png"),
+                            group=f"ch{index // args.per_chapter}",
+                        )
+                        for index in range(total)
+                    ]
+                    engine = ImagenEngine(
+                        server.endpoint,
+                        "dummy-token",
+                        project_id=f"batch-{len(label)}-{batch}",
+                        max_workers=args.workers,
+                        requests_per_minute=0,
+                        batch_size=batch,
+                    )
+                    started = time.perf_counter()
+                    with engine:
+                        results = engine.render(jobs)
+                    elapsed = time.perf_counter() - started
+                    ok = sum(1 for result in results if result.ok)
+                    expected = sum(1 for job in jobs if "#filtered" not in job.prompt) if options.get("filtered_words") else total
+                    named = all(result.path == job.filename for result, job in zip(results, jobs) if result.ok)
+                    print(f"    batch={batch:>2}  {elapsed:6.2f}s  リクエスト {server.request_count:>3}  "
+                          f"成功 {ok}/{total}（期待 {expected}）  ファイル名={'OK' if named else 'NG'}")
+
+
+def bench_timeline(args: argparse.Namespace) -> None:
+    import build_capcut_project as bcp
+
+    print("🧪 タイムライン構築（画像未生成のプレースホルダ 3 枚/章）")
+    with tempfile.TemporaryDirectory() as tmp:
+        config = bcp.BuildConfig(images_root=tmp, voice_root=tmp, bgm_root=tmp)
+        for count in args.chapters:
+            chapters = [
+                {"chapter_index": i, "id": f"ch{i}", "duration_sec": 150 + (i % 7) / 3, "emotion_level": i % 10}
+                for i in range(count)
+            ]
+            started = time.perf_counter()
+            project, _ = bcp.make_timeline(chapters, config)
+            elapsed = time.perf_counter() - started
+            clips = project["tracks"][0]["clips"]
+            end = clips[-1]["start"] + clips[-1]["duration"]
+            expected = bcp.frame2sec(sum(bcp.sec2frame(c["duration_sec"]) for c in chapters))
+            print(
+                f"  章 {count:>6}  クリップ {len(clips):>6}  {elapsed * 1000:9.1f} ms  "
+                f"{elapsed / count * 1e6:7.1f} µs/章  終端一致={'OK' if abs(end - expected) < 1e-6 else 'NG'}"
+            )
+
+
+def bench_media(args: argparse.Namespace) -> None:
+    import os
+    import wave
+
+    from makeshorts.media_probe import MediaIndex
+
+    print(f"🧪 メディアプローブ: WAV {args.files} 本（初回プローブ → インデックス再利用）")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for index in range(args.files):
+            path = os.path.join(tmp, f"{index:05d}.wav")
+            with wave.open(path, "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(24000)
+                w.writeframes(b"\0\0" * (2400 * (1 + index % 10)))
+            paths.append(path)
+        index_path = os.path.join(tmp, "media_index.json")
+        for label in ("初回", "2回目"):
+            started = time.perf_counter()
+            media = MediaIndex(index_path)
+            total = sum(media.duration(path) or 0 for path in paths)
+            media.save()
+            elapsed = time.perf_counter() - started
+            print(
+                f"  {label:<4} {elapsed * 1000:9.1f} ms  {elapsed / args.files * 1e6:7.1f} µs/本  合計 {total:.1f}s"
+            )
+
+
+_NARRATION = (
+    "1901年12月5日、イリノイ州シカゴに一人の男児が生まれた。名はウォルター・イライアス・ディズニー。"
+    "少年ウォルトはそこで動物たちを観察し、紙にスケッチを繰り返した。彼の最初の「観客」は農場の豚と鶏だったと言われている。"
+    "しかし彼の手は止まらない！ノートの余白には常に落書きが溢れていた。"
+)
+
+
+def bench_subtitles(args: argparse.Namespace) -> None:
+    from makeshorts.subtitles import render_cues, segment_and_time
+
+    narration = (_NARRATION * (args.chars // len(_NARRATION) + 1))[:args.chars]
+    chapters = args.chapters * args.packages
+    print(f"🧪 字幕分割: {args.chars} 文字 × {args.chapters} 章 × {args.packages} パッケージ")
+    started = time.perf_counter()
+    cues = 0
+    for index in range(chapters):
+        chapter_cues = segment_and_time(narration, index * 150.0, 150.0)
+        render_cues(chapter_cues, {}, 30)
+        cues += len(chapter_cues)
+    elapsed = time.perf_counter() - started
+    chars = args.chars * chapters
+    print(
+        f"  {elapsed:7.2f}s  {chars / elapsed / 1e6:6.2f} M文字/s  {chapters / elapsed:8.0f} 章/s  "
+        f"字幕 {cues} 件（SRT・WebVTT・CapCut を同時出力）"
+    )
+
+
+def bench_transport(args: argparse.Namespace) -> None:
+    import os
+
+    from makeshorts.imagen import ImageJob, ImagenEngine
+    from makeshorts.stubs import FaultPlan, MockImagenServer, TINY_PNG
+
+    os.environ.setdefault("MAKESHORTS_RETRY_BASE_SEC", str(args.base_delay))
+    os.environ.setdefault("MAKESHORTS_RETRY_MAX", "8")
+    scenarios = [
+        ("障害なし", None),
+        (f"先頭 {args.burst} 件 429 + 以降 {args.fault_rate:.0%} で 429/503",
+         FaultPlan(statuses=[429] * args.burst, rate=args.fault_rate, retry_after=args.retry_after, seed=1)),
+        ("503 が続く（ブレーカー）", FaultPlan(rate=1.0, status_pool=(503,), seed=1)),
+    ]
+    print(f"🧪 通信層: Imagen モック {args.images} 枚 / workers={args.workers}")
+    for number, (label, faults) in enumerate(scenarios):
+        with MockImagenServer(latency=args.latency, faults=faults) as server, tempfile.TemporaryDirectory() as tmp:
+            jobs = [ImageJob(i, f"transport {i}", str(Path(tmp) / f"{i:02d}.png")) for i in range(1, args.images + 1)]
+            started = time.perf_counter()
+            # 再試行のログは件数だけ数える
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                with ImagenEngine(server.endpoint, "dummy", project_id=f"transport-{number}",
+                                  max_workers=args.workers, requests_per_minute=0) as engine:
+                    results = engine.render(jobs)
+            elapsed = time.perf_counter() - started
+            ok = sum(1 for r in results if r.ok and Path(r.path).read_bytes() == TINY_PNG)
+            errors = Counter(r.error.split(":")[0] for r in results if not r.ok)
+            injected = dict(faults.injected) if faults else {}
+            print(f"  {label}")
+            print(f"    {elapsed:6.2f}s  成功 {ok}/{len(jobs)}  リクエスト {server.request_count}  "
+                  f"注入 {injected or '-'}  失敗 {dict(errors) or '-'}")
+
+
+HEAVY_PREFIXES = ("vertexai", "google.cloud", "google.auth", "google.oauth2", "grpc", "proto")
+
+
+def parse_importtime(stderr: str) -> list:
+    """-X importtime の出力を (モジュール名, 累積マイクロ秒, 深さ) の並びにする"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # ヘッダ行
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(cumulative), depth))
+    return rows
+
+
+def bench_startup(args: argparse.Namespace) -> None:
+    from makeshorts.cli import COMMANDS, OFFLINE_COMMANDS
+
+    root = Path(__file__).resolve().parents[1]
+    targets = [("makeshorts", "makeshorts.cli")] + [(name, module) for name, (module, _, _) in COMMANDS.items()]
+    print(f"🧪 起動時間（python -X importtime、{args.repeat} 回の最小値 / 目標: 通信しない工程は {args.budget:g}s 未満）")
+    for name, module in targets:
+        best, rows = None, []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                cwd=root, capture_output=True, text=True,
+            )
+            elapsed = time.perf_counter() - started
+            if proc.returncode != 0:
+                print(f"  {name:<10} ❌ import 失敗: {proc.stderr.strip().splitlines()[-1]}")
+                break
+            if best is None or elapsed < best:
+                best, rows = elapsed, parse_importtime(proc.stderr)
+        if best is None:
+            continue
+        # importtime は子を親より先に出すので、対象の行から遡って直前の最上位の行までが対象の配下
+        end = max((i for i, (mod, _, depth) in enumerate(rows) if mod == module and depth == 0), default=None)
+        start = end
+        while start and rows[start - 1][2] > 0:
+            start -= 1
+        subtree = rows[start:end] if end is not None else []
+        own = rows[end][1] if end is not None else 0
+        heaviest = sorted((r for r in subtree if r[2] == 1), key=lambda r: r[1], reverse=True)[: args.top]
+        # 配下のサブモジュール（vertexai.generative_models など）も親パッケージ名で数える
+        heavy = sorted({p for mod, _, _ in subtree for p in HEAVY_PREFIXES if mod == p or mod.startswith(p + ".")})
+        mark = ""
+        if name in OFFLINE_COMMANDS:
+            mark = "✅" if best < args.budget and not heavy else "⚠️"
+        print(f"  {name:<10} {best:6.3f}s  import {own / 1e6:6.3f}s  {mark}")
+        print(f"             重い import: {', '.join(f'{mod} {us / 1e3:.0f}ms' for mod, us, _ in heaviest) or '-'}")
+        if heavy:
+            print(f"             ⚠️ Google SDK を起動時に読み込んでいます: {', '.join(heavy)}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="MakeShorts ベンチマーク（外部サービス不要）")
+    sub = parser.add_subparsers(dest="target", required=True)
+
+    imagen = sub.add_parser("imagen", help="Imagen 描画エンジンの並列度ベンチ")
+    imagen.add_argument("--images", type=int, default=30)
+    imagen.add_argument("--latency", type=float, default=0.5, help="モックの応答遅延（秒）")
+    imagen.add_argument("--rpm", type=float, default=0, help="1分あたりの上限（0で無制限）")
+    imagen.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    imagen.set_defaults(func=bench_imagen)
+
+    batch = sub.add_parser("imagen-batch", help="章ごとに複数プロンプトを 1 回の predict にまとめる効果")
+    batch.add_argument("--chapters", type=int, default=10)
+    batch.add_argument("--per-chapter", type=int, default=3)
+    batch.add_argument("--latency", type=float, default=0.3, help="1 往復あたりの固定遅延（秒）")
+    batch.add_argument("--per-image", type=float, default=0.05, help="1 枚あたりの生成時間（秒）")
+    batch.add_argument("--workers", type=int, default=4)
+    batch.add_argument("--batch", type=int, nargs="+", default=[1, 3])
+    batch.add_argument("--max-instances", type=int, default=2, help="この件数を超える predict を 400 で拒むシナリオ（0 で省略）")
+    batch.set_defaults(func=bench_imagen_batch)
+
+    timeline = sub.add_parser("timeline", help="タイムライン構築のスケーリング確認")
+    timeline.add_argument("--chapters", type=int, nargs="+", default=[100, 1000, 5000])
+    timeline.set_defaults(func=bench_timeline)
+
+    media = sub.add_parser("media", help="音声ヘッダのプローブとインデックス再利用")
+    media.add_argument("--files", type=int, default=2000)
+    media.set_defaults(func=bench_media)
+
+    subtitles = sub.add_parser("subtitles", help="字幕分割と SRT/WebVTT/CapCut 出力のスループット")
+    subtitles.add_argument("--chars", type=int, default=1100)
+    subtitles.add_argument("--chapters", type=int, default=12)
+    subtitles.add_argument("--packages", type=int, default=200)
+    subtitles.set_defaults(func=bench_subtitles)
+
+    transport = sub.add_parser("transport", help="障害注入スタブに対する再試行・Retry-After・ブレーカーの確認")
+    transport.add_argument("--images", type=int, default=30)
+    transport.add_argument("--workers", type=int, default=4)
+    transport.add_argument("--latency", type=float, default=0.05)
+    transport.add_argument("--fault-rate", type=float, default=0.3)
+    transport.add_argument("--burst", type=int, default=8, help="先頭で連続して返す 429 の件数")
+    transport.add_argument("--retry-after", type=float, default=0.5)
+    transport.add_argument("--base-delay", type=float, default=0.1, help="バックオフの初期値（秒）")
+    transport.set_defaults(func=bench_transport)
+
+    startup = sub.add_parser("startup", help="サブコマンドごとの起動時間（-X importtime）")
+    startup.add_argument("--repeat", type=int, default=3)
+    startup.add_argument("--top", type=int, default=3, help="表示する重い import の件数")
+    startup.add_argument("--budget", type=float, default=1.0, help="通信しない工程の起動時間の目標（秒）")
+    startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
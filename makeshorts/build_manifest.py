@@ -0,0 +1,125 @@
+"""make_all.py のインクリメンタルビルド用マニフェスト
+
+ターゲット（章バッチ・SRT・タイムライン区間など）ごとに
+「入力のダイジェスト」と「出力ファイルのハッシュ」を記録し、
+次回実行時にどちらも変わっていなければ再生成をスキップする。
+
+アセットファイルのハッシュは (size, mtime_ns) が同じ限り前回値を再利用するので、
+大きな画像・音声を毎回読み直すことはない。
+章ごとのタスクを並列に流す make_all から同時に呼ばれるため、判定・記録・保存はロックの下で行う。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from makeshorts.run_journal import write_json_atomic
+
+MANIFEST_VERSION = 1
+
+
+def digest(*parts) -> str:
+    """JSON 化できる値の組からダイジェストを作る"""
+    canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class BuildManifest:
+    def __init__(self, path: str, *, force: bool = False) -> None:
+        self.path = path
+        self.force = force
+        self.data: Dict = {"version": MANIFEST_VERSION, "targets": {}, "files": {}}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if loaded.get("version") == MANIFEST_VERSION:
+                    self.data = loaded
+            except (OSError, ValueError):
+                pass  # 壊れていたら作り直す
+        self.decisions: List[Tuple[str, str, str]] = []  # (target, "build"/"skip", reason)
+        self._lock = threading.RLock()
+
+    # ---------- ファイルハッシュ ----------
+    def file_digest(self, path: str) -> Optional[str]:
+        """内容の SHA-256（存在しなければ None）。size/mtime が同じなら前回値を使う"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        files = self.data["files"]
+        with self._lock:
+            cached = files.get(path)
+        if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+            return cached["sha256"]
+        sha = _sha256_file(path)  # 大きなファイルのハッシュ計算はロックの外で行う
+        with self._lock:
+            files[path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+        return sha
+
+    def files_digest(self, paths: Iterable[str]) -> str:
+        return digest(sorted((p, self.file_digest(p)) for p in paths))
+
+    # ---------- ターゲット判定 ----------
+    def stale_reason(self, target: str, inputs: str, outputs: Iterable[str] = ()) -> Optional[str]:
+        """再生成が必要なら理由を、不要なら None を返す"""
+        if self.force:
+            return "--force 指定"
+        entry = self.data["targets"].get(target)
+        if entry is None:
+            return "初回ビルド"
+        if entry["inputs"] != inputs:
+            return "入力が変更されました"
+        for out in outputs:
+            current = self.file_digest(out)
+            if current is None:
+                return f"出力がありません: {out}"
+            if current != entry["outputs"].get(out):
+                return f"出力が外部で変更されました: {out}"
+        return None
+
+    def needs_build(self, target: str, inputs: str, outputs: Iterable[str] = ()) -> bool:
+        """stale_reason を判定しつつ、判定結果を decisions に記録する"""
+        outputs = list(outputs)
+        reason = self.stale_reason(target, inputs, outputs)
+        with self._lock:
+            if reason is None:
+                self.decisions.append((target, "skip", "入力・出力とも前回と同一"))
+                return False
+            self.decisions.append((target, "build", reason))
+            return True
+
+    def record(self, target: str, inputs: str, outputs: Iterable[str] = ()) -> None:
+        entry = {
+            "inputs": inputs,
+            "outputs": {out: self.file_digest(out) for out in outputs},
+        }
+        with self._lock:
+            self.data["targets"][target] = entry
+
+    def save(self) -> None:
+        with self._lock:
+            write_json_atomic(self.path, self.data, indent=None)
+
+    # ---------- レポート ----------
+    def report(self, *, verbose: bool = False) -> None:
+        built = [d for d in self.decisions if d[1] == "build"]
+        skipped = [d for d in self.decisions if d[1] == "skip"]
+        print(f"📋 ビルドマニフェスト: 再生成 {len(built)} / スキップ {len(skipped)}  ({self.path})")
+        for target, _, reason in built:
+            print(f"   🔨 {target}: {reason}")
+        if verbose:
+            for target, _, reason in skipped:
+                print(f"   ⏩ {target}: {reason}")
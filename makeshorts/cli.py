@@ -0,0 +1,103 @@
+"""MakeShorts の単一エントリポイント（python3 -m makeshorts <サブコマンド> [引数...]）
+
+各工程を同じインタプリタの中で順に実行する。読み込むのは選ばれたサブコマンドのモジュールだけで、
+vertexai / google.auth はネットワーク工程が実際に通信する時点（makeshorts.credentials）まで読み込まない。
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import sys
+import traceback
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# サブコマンド -> (モジュール, 関数, 説明)。関数は argv のリストを受け取る
+COMMANDS: Dict[str, Tuple[str, str, str]] = {
+    "script": ("zap1.zap1_auto_generate", "main", "Gemini で章ごとの台本と meta.json を生成（--person）"),
+    "package": ("zap2.shorts_pipeline", "run_cli", "ショート動画パッケージ（台本・画像プロンプト）を生成"),
+    "build": ("make_all", "main", "master.json から字幕・CapCutプロジェクトを組み立て（--render で書き出し）"),
+    "capcut": ("build_capcut_project", "main", "章バッチJSONから .ccproj だけを組み立て"),
+    "render": ("makeshorts.render", "main", ".ccproj を ffmpeg でヘッドレスに書き出し"),
+    "gemini": ("gemini_cli.cli", "main", "Gemini CLI（単発生成・バッチ）"),
+    "bench": ("makeshorts.bench", "main", "ベンチマーク（startup で起動時間を計測）"),
+}
+
+# 通信しない工程（起動時間の目標はこれらで 1 秒未満）
+OFFLINE_COMMANDS = ("build", "capcut", "render")
+
+
+def load_command(name: str) -> Callable[[List[str]], object]:
+    module, func, _ = COMMANDS[name]
+    return getattr(importlib.import_module(module), func)
+
+
+def run_command(name: str, argv: Sequence[str]) -> int:
+    """サブコマンドを実行して終了コードを返す
+
+    SystemExit / exit() は終了コードとして受け取り、例外はトレースバックを表示して 1 を返す。
+    """
+    saved_argv = sys.argv
+    sys.argv = [f"makeshorts {name}", *argv]  # argparse の usage 表示用
+    try:
+        load_command(name)(list(argv))
+    except SystemExit as exc:
+        if exc.code is None or isinstance(exc.code, int):
+            return exc.code or 0
+        print(exc.code, file=sys.stderr)
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.argv = saved_argv
+    return 0
+
+
+def run_pipeline(argv: Sequence[str]) -> int:
+    """台本生成からタイムラインまでを章ごとの DAG で 1 プロセスで行う（main.py と同じ流れ。makeshorts.pipeline を参照）"""
+    parser = argparse.ArgumentParser(prog="makeshorts run", description="台本・画像・ナレーションを章ごとに生成しながらタイムラインまで組み立て")
+    parser.add_argument("--person", required=True, help="著名人の名前")
+    parser.add_argument("--model", default=None, help="パッケージ生成に使うモデル（省略時は config.model_registry の default）")
+    parser.add_argument("--no-images", action="store_true", help="画像を描かない（タイムラインは [MISSING] のまま組む）")
+    parser.add_argument("--proxies", action="store_true", help="画像の縮小プロキシを作り、タイムラインからはそちらを参照")
+    parser.add_argument("--force", action="store_true", help="生成済みの出力があっても組み立て直す")
+    args = parser.parse_args(list(argv))
+
+    model = args.model
+    if model is None:
+        from config.model_registry import GEMINI_MODELS
+
+        model = GEMINI_MODELS["default"]
+
+    from makeshorts.pipeline import run_person
+
+    print(f"🎬 素材生成・動画生成開始: {args.person}")
+    try:
+        built = run_person(args.person, model=model, images=not args.no_images, proxies=args.proxies, force=args.force)
+    except Exception:
+        traceback.print_exc()
+        return 1
+    print(f"✅ {built['ccproj']}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    lines = ["  run        台本・画像・ナレーションを章ごとに生成しながらタイムラインまで組み立て（--person）"]
+    lines += [f"  {name:<10} {help_text}" for name, (_, _, help_text) in COMMANDS.items()]
+    parser = argparse.ArgumentParser(
+        prog="makeshorts",
+        description="MakeShorts の各工程を 1 プロセスで実行します。",
+        epilog="サブコマンド:\n" + "\n".join(lines) + "\n\n各サブコマンドの引数は `makeshorts <サブコマンド> -h` で確認できます。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=["run", *COMMANDS], metavar="<サブコマンド>", help="下記のいずれか")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(sys.argv[1:] if argv is None else list(argv))
+    if args.command == "run":
+        return run_pipeline(args.args)
+    return run_command(args.command, args.args)
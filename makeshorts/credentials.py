@@ -0,0 +1,166 @@
+"""GCP 認証情報と Vertex AI クライアントのプロセス内レジストリ
+
+- サービスアカウントのアクセストークンは有効期限の少し前までメモリに保持し、OAuth の往復を毎回しない
+- 環境変数 MAKESHORTS_TOKEN_FILE を指定すると、トークンをそのファイルにも保存して複数プロセスで共有する。
+  更新はファイルロックの下で行うので、並列ワーカーが一斉にトークンを取り直すことはない
+- vertexai.init は (プロジェクト, リージョン, 認証ファイル) が変わらない限りプロセス内で 1 回だけ
+- GenerativeModel は (プロジェクト, リージョン, モデル) ごとに 1 つを使い回す
+
+google-auth / vertexai は必要になった時点で import する。
+"""
+
+from __future__ import annotations
+
+import calendar
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from makeshorts.run_journal import file_lock, write_json_atomic
+
+CLOUD_PLATFORM_SCOPES = ("https://www.googleapis.com/auth/cloud-platform",)
+REFRESH_MARGIN_SEC = 300  # 期限の 5 分前には取り直す
+
+
+@dataclass
+class CachedToken:
+    token: str
+    expiry: float  # UNIX 時刻
+
+    def fresh(self, margin: float = REFRESH_MARGIN_SEC) -> bool:
+        return self.expiry - margin > time.time()
+
+
+def _read_token_file(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_token_file(path: str, data: dict) -> None:
+    write_json_atomic(path, data, indent=None, mode=0o600)  # ベアラートークンなので本人のみ読める
+
+
+class TokenProvider:
+    """サービスアカウント 1 つ分のアクセストークンを期限まで使い回す"""
+
+    def __init__(
+        self,
+        service_account_file: str,
+        scopes: Sequence[str] = CLOUD_PLATFORM_SCOPES,
+        *,
+        token_file: Optional[str] = None,
+        margin: float = REFRESH_MARGIN_SEC,
+    ) -> None:
+        self.service_account_file = service_account_file
+        self.scopes = tuple(scopes)
+        self.token_file = token_file
+        self.margin = margin
+        self.refresh_count = 0
+        self._credentials = None
+        self._cached: Optional[CachedToken] = None
+        self._lock = threading.Lock()
+        self._key = hashlib.sha256(
+            f"{os.path.abspath(service_account_file)}\n{' '.join(self.scopes)}".encode("utf-8")
+        ).hexdigest()[:16]
+
+    @property
+    def credentials(self):
+        """google.oauth2 の Credentials（ファイルは最初の 1 回だけ読む）"""
+        if self._credentials is None:
+            from google.oauth2 import service_account
+
+            self._credentials = service_account.Credentials.from_service_account_file(
+                self.service_account_file, scopes=list(self.scopes)
+            )
+        return self._credentials
+
+    def token(self) -> str:
+        cached = self._cached
+        if cached is not None and cached.fresh(self.margin):
+            return cached.token
+        with self._lock:
+            if self._cached is None or not self._cached.fresh(self.margin):
+                self._cached = self._shared_token() if self.token_file else self._refresh()
+            return self._cached.token
+
+    def _refresh(self) -> CachedToken:
+        from google.auth.transport.requests import Request
+
+        credentials = self.credentials
+        credentials.refresh(Request())
+        self.refresh_count += 1
+        # google-auth の expiry は naive な UTC
+        expiry = calendar.timegm(credentials.expiry.utctimetuple()) if credentials.expiry else time.time() + 3600
+        return CachedToken(credentials.token, float(expiry))
+
+    def _shared_token(self) -> CachedToken:
+        """トークンファイルをロックして、有効なものがあれば使い、無ければ 1 プロセスだけが取り直す"""
+        with file_lock(self.token_file):
+            data = _read_token_file(self.token_file)
+            entry = data.get(self._key)
+            if entry:
+                cached = CachedToken(entry["token"], float(entry["expiry"]))
+                if cached.fresh(self.margin):
+                    return cached
+            cached = self._refresh()
+            data = {k: v for k, v in data.items() if float(v.get("expiry", 0)) > time.time()}
+            data[self._key] = {"token": cached.token, "expiry": cached.expiry}
+            _write_token_file(self.token_file, data)
+            return cached
+
+
+_PROVIDERS: Dict[Tuple[str, Tuple[str, ...]], TokenProvider] = {}
+_VERTEX_INIT: Optional[Tuple[str, str, Optional[str]]] = None
+_MODELS: Dict[Tuple[str, str, str], object] = {}
+_REGISTRY_LOCK = threading.RLock()
+
+
+def get_token_provider(service_account_file: str, scopes: Sequence[str] = CLOUD_PLATFORM_SCOPES) -> TokenProvider:
+    """プロセス内で共有される TokenProvider を返す"""
+    key = (os.path.abspath(service_account_file), tuple(scopes))
+    with _REGISTRY_LOCK:
+        provider = _PROVIDERS.get(key)
+        if provider is None:
+            provider = _PROVIDERS[key] = TokenProvider(
+                service_account_file, scopes, token_file=os.getenv("MAKESHORTS_TOKEN_FILE") or None
+            )
+        return provider
+
+
+def access_token(service_account_file: str, scopes: Sequence[str] = CLOUD_PLATFORM_SCOPES) -> str:
+    return get_token_provider(service_account_file, scopes).token()
+
+
+def init_vertexai(project: str, location: str, service_account_file: Optional[str] = None) -> None:
+    """vertexai.init を (プロジェクト, リージョン, 認証ファイル) ごとに 1 回だけ呼ぶ"""
+    global _VERTEX_INIT
+    key = (project, location, os.path.abspath(service_account_file) if service_account_file else None)
+    with _REGISTRY_LOCK:
+        if _VERTEX_INIT == key:
+            return
+        import vertexai
+
+        credentials = get_token_provider(service_account_file).credentials if service_account_file else None
+        vertexai.init(project=project, location=location, credentials=credentials)
+        _VERTEX_INIT = key
+
+
+def generative_model(project: str, location: str, model: str, service_account_file: Optional[str] = None):
+    """(プロジェクト, リージョン, モデル) ごとに 1 つの GenerativeModel を返す"""
+    key = (project, location, model)
+    with _REGISTRY_LOCK:
+        handle = _MODELS.get(key)
+        if handle is None:
+            # GenerativeModel は生成時の vertexai.init の設定でリソース名を決める
+            init_vertexai(project, location, service_account_file)
+            from vertexai.generative_models import GenerativeModel
+
+            handle = _MODELS[key] = GenerativeModel(model)
+        return handle
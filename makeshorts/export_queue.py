@@ -0,0 +1,244 @@
+"""CapCut などの外部エクスポータに .ccproj を順番に書き出させるキューと完了検出
+
+固定秒数の sleep ではなく、出力 MP4 を監視して
+「サイズが一定時間変わらない」かつ「コンテナが閉じている（moov があり、ボックスがファイル末尾まで整合）」
+になった時点で完了とみなす。タイムアウトはタイムラインの長さに比例させる。
+
+エクスポータは Exporter を実装すれば差し替えられる。FakeExporter は MP4 風のファイルを
+少しずつ書くだけなので、GUI の無い Linux でもスケジューリングと完了検出を確認できる。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+DEFAULT_TIMEOUT_BASE = 120.0  # 起動・エンコーダ準備分（秒）
+DEFAULT_TIMEOUT_FACTOR = 1.5  # タイムライン 1 秒あたりに許す書き出し時間
+DEFAULT_STABLE_SEC = 3.0
+DEFAULT_POLL_SEC = 0.5
+
+
+@dataclass
+class ExportJob:
+    project: str
+    out: str
+    duration: float = 0.0  # タイムラインの長さ（秒）。0 なら .ccproj から読む
+
+
+@dataclass
+class ExportResult:
+    job: ExportJob
+    ok: bool
+    elapsed: float
+    error: Optional[str] = None
+    size: int = 0
+
+
+def timeline_duration(project_path: str) -> float:
+    """.ccproj の全トラックで最も遅いクリップ終端（秒）"""
+    with open(project_path, "r", encoding="utf-8") as f:
+        project = json.load(f)
+    return max(
+        (clip["start"] + clip["duration"] for track in project.get("tracks", []) for clip in track.get("clips", [])),
+        default=0.0,
+    )
+
+
+def mp4_finalized(path: str) -> bool:
+    """トップレベルのボックスがファイル末尾までちょうど並び、moov と mdat がそろっていれば True"""
+    try:
+        with open(path, "rb") as f:
+            end = os.fstat(f.fileno()).st_size
+            pos = 0
+            kinds = set()
+            while pos < end:
+                f.seek(pos)
+                header = f.read(16)
+                if len(header) < 8:
+                    return False
+                size, kind = struct.unpack(">I4s", header[:8])
+                if size == 1:
+                    if len(header) < 16:
+                        return False
+                    size = struct.unpack(">Q", header[8:16])[0]
+                elif size == 0:  # 「末尾まで」＝書き込み中の mdat
+                    return False
+                if size < 8:
+                    return False
+                kinds.add(kind)
+                pos += size
+            return pos == end and b"moov" in kinds and b"mdat" in kinds
+    except OSError:
+        return False
+
+
+class OutputWatcher:
+    """出力ファイルのサイズとコンテナの状態を監視して完了を待つ"""
+
+    def __init__(
+        self,
+        *,
+        stable_sec: float = DEFAULT_STABLE_SEC,
+        poll_sec: float = DEFAULT_POLL_SEC,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.stable_sec = stable_sec
+        self.poll_sec = poll_sec
+        self.clock = clock
+        self.sleep = sleep
+
+    def wait(self, path: str, timeout: float, *, failed: Callable[[], Optional[str]] = lambda: None) -> int:
+        """完了したらファイルサイズを返す。タイムアウト・エクスポータ側の失敗は TimeoutError / RuntimeError"""
+        deadline = self.clock() + timeout
+        last_size = -1
+        stable_since = None
+        while True:
+            error = failed()
+            if error:
+                raise RuntimeError(error)
+            now = self.clock()
+            try:
+                size = os.stat(path).st_size
+            except FileNotFoundError:
+                size = -1
+            if size != last_size:
+                last_size, stable_since = size, now
+            elif size > 0 and now - stable_since >= self.stable_sec and mp4_finalized(path):
+                return size
+            if now >= deadline:
+                state = "出力がありません" if size < 0 else f"{size} bytes で停止"
+                raise TimeoutError(f"{timeout:.0f}s 以内に完了しませんでした（{state}）")
+            self.sleep(self.poll_sec)
+
+
+class Exporter(ABC):
+    """書き出しを開始するだけのインターフェース（完了待ちはキュー側で行う）"""
+
+    name = "exporter"
+
+    @abstractmethod
+    def start(self, job: ExportJob) -> None:
+        """書き出しを開始してすぐ戻る"""
+
+    def error(self) -> Optional[str]:
+        """エクスポータ側で失敗が分かればメッセージを返す（待ち時間を打ち切るため）"""
+        return None
+
+    def finish(self, job: ExportJob, ok: bool) -> None:
+        """1 件終わるごとに呼ばれる（ダイアログを閉じる等の後始末用）"""
+
+
+class FakeExporter(Exporter):
+    """MP4 風のボックス（ftyp → 伸びていく mdat → moov）をバックグラウンドで書くだけのエクスポータ
+
+    speed はタイムライン 1 秒を何秒で書き出すか。fail に含まれるプロジェクトは途中で止まって
+    error() で失敗を報告し、stall に含まれるプロジェクトは何も言わずに途中で止まる（タイムアウト待ち）。
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        speed: float = 0.01,
+        *,
+        chunk: int = 64 * 1024,
+        fail: Sequence[str] = (),
+        stall: Sequence[str] = (),
+    ) -> None:
+        self.speed = speed
+        self.chunk = chunk
+        self.fail = set(fail)
+        self.stall = set(stall)
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[str] = None
+
+    def start(self, job: ExportJob) -> None:
+        self._error = None
+        self._thread = threading.Thread(target=self._write, args=(job,), daemon=True)
+        self._thread.start()
+
+    def _write(self, job: ExportJob) -> None:
+        steps = max(1, int(job.duration))
+        os.makedirs(os.path.dirname(os.path.abspath(job.out)), exist_ok=True)
+        with open(job.out, "wb") as f:
+            f.write(struct.pack(">I4s", 16, b"ftyp") + b"isom\0\0\0\0")
+            mdat_at = f.tell()
+            f.write(struct.pack(">I4s", 0, b"mdat"))  # 書き込み中はサイズ 0（末尾まで）
+            for step in range(steps):
+                f.write(b"\0" * self.chunk)
+                f.flush()
+                if step >= steps // 2:
+                    if job.project in self.fail:
+                        self._error = f"{job.project} の書き出しに失敗しました"
+                        return
+                    if job.project in self.stall:
+                        return  # 途中で止まったまま
+                time.sleep(self.speed)
+            end = f.tell()
+            f.seek(mdat_at)
+            f.write(struct.pack(">I", end - mdat_at))
+            f.seek(end)
+            f.write(struct.pack(">I4s", 8, b"moov"))
+
+    def error(self) -> Optional[str]:
+        return self._error
+
+    def finish(self, job: ExportJob, ok: bool) -> None:
+        self._thread = None
+
+
+class ExportQueue:
+    """ジョブを 1 件ずつ（GUI は同時に 1 セッションなので）途切れなく書き出す"""
+
+    def __init__(
+        self,
+        exporter: Exporter,
+        *,
+        timeout_base: float = DEFAULT_TIMEOUT_BASE,
+        timeout_factor: float = DEFAULT_TIMEOUT_FACTOR,
+        watcher: Optional[OutputWatcher] = None,
+    ) -> None:
+        self.exporter = exporter
+        self.timeout_base = timeout_base
+        self.timeout_factor = timeout_factor
+        self.watcher = watcher or OutputWatcher()
+
+    def timeout_for(self, job: ExportJob) -> float:
+        return self.timeout_base + job.duration * self.timeout_factor
+
+    def run_one(self, job: ExportJob) -> ExportResult:
+        if not job.duration:
+            job.duration = timeline_duration(job.project)
+        timeout = self.timeout_for(job)
+        # 前回の出力が残っていると即「完了」と誤判定するので消しておく
+        if os.path.exists(job.out):
+            os.remove(job.out)
+        started = time.monotonic()
+        print(f"🚀 {self.exporter.name}: {job.project} → {job.out}（{job.duration:.0f}s, 上限 {timeout:.0f}s）")
+        ok = False
+        try:
+            self.exporter.start(job)
+            size = self.watcher.wait(job.out, timeout, failed=self.exporter.error)
+            ok = True
+            result = ExportResult(job, True, time.monotonic() - started, size=size)
+            print(f"   ✅ 完了 {size / 1e6:.1f}MB（{result.elapsed:.1f}s）")
+        except Exception as e:
+            result = ExportResult(job, False, time.monotonic() - started, error=f"{type(e).__name__}: {e}")
+            print(f"   ❌ {result.error}")
+        finally:
+            self.exporter.finish(job, ok)
+        return result
+
+    def run(self, jobs: Sequence[ExportJob]) -> List[ExportResult]:
+        results = [self.run_one(job) for job in jobs]
+        ok = sum(1 for r in results if r.ok)
+        print(f"📊 書き出し 成功 {ok} / 失敗 {len(results) - ok}")
+        return results
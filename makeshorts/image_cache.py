@@ -0,0 +1,117 @@
+"""生成画像のコンテンツアドレス型ディスクキャッシュ
+
+キーは「エンドポイント + リクエストペイロード全体」の SHA-256。
+プロンプト・アスペクト比・モデル・sampleCount のどれかが変われば別キーになる。
+ヒット時は保存済み PNG を output_dir に複製（対応するファイルシステムなら reflink、それ以外はコピー）するだけで
+ネットワークは使わない。キャッシュと出力は別のファイルなので、出力をその場で編集してもキャッシュや他の出力は変わらない。
+LRU はキャッシュ側のファイルの mtime で表現し、ヒットのたびに touch して容量超過時に古いものから削除する。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "makeshorts", "images")
+DEFAULT_MAX_MB = 2048
+
+
+def request_key(endpoint: str, payload: dict) -> str:
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(f"{endpoint}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+FICLONE = 0x40049409  # Linux の ioctl（Btrfs / XFS などでデータを共有したまま別 inode を作る）
+
+
+def _clone_or_copy(src: str, dest: str) -> None:
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        with open(src, "rb") as fin, open(dest, "wb") as fout:
+            try:
+                fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+                return
+            except OSError:
+                pass
+    shutil.copyfile(src, dest)
+
+
+def _place(src: str, dest: str) -> None:
+    """src を dest へ複製する（同じディレクトリの一時ファイルに書いてから差し替える）"""
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    tmp = os.path.join(os.path.dirname(dest) or ".", f".{os.path.basename(dest)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        _clone_or_copy(src, tmp)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class ImageCache:
+    """サイズ上限付き LRU の画像キャッシュ"""
+
+    suffix = ".png"
+
+    def __init__(self, root: Optional[str] = None, *, max_bytes: Optional[int] = None) -> None:
+        self.root = Path(root or os.getenv("MAKESHORTS_IMAGE_CACHE", DEFAULT_CACHE_DIR))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("MAKESHORTS_IMAGE_CACHE_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}{self.suffix}"
+
+    def fetch(self, key: str, dest: str) -> bool:
+        """ヒットすれば dest に配置して True"""
+        cached = self.path_for(key)
+        try:
+            os.utime(cached)  # LRU 更新
+        except FileNotFoundError:
+            return False
+        _place(str(cached), dest)
+        return True
+
+    def store(self, key: str, src: str) -> None:
+        _place(src, str(self.path_for(key)))
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in self.root.glob(f"*/*{self.suffix}"))
+
+    def evict(self) -> int:
+        """上限を超えていれば最終利用が古い順に削除し、削除件数を返す"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in self.root.glob(f"*/*{self.suffix}"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return 0
+
+            removed = 0
+            for _, size, entry in sorted(entries, key=lambda item: item[0]):
+                if total <= self.max_bytes:
+                    break
+                self._remove(entry)
+                total -= size
+                removed += 1
+            return removed
+
+    def _remove(self, entry: Path) -> None:
+        try:
+            entry.unlink()
+        except FileNotFoundError:
+            pass
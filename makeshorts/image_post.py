@@ -0,0 +1,295 @@
+"""生成画像の受信と後処理（マスター / 編集用プロキシ / 配布用の変換版）
+
+predict の応答は base64 の画像を丸ごと含む巨大な JSON なので、response.json() で全体を
+メモリに載せずに、bytesBase64Encoded の値だけをチャンク単位でデコードしながらディスクへ書く。
+
+書き出したマスター（生成されたままのフル画質 PNG）からの派生物はプロセスプールで作る。
+    <章>/proxy/<名前>.jpg   長辺を縮めた編集用プロキシ（CapCut のスクラブを軽くする）
+    <章>/webp/<名前>.webp   必要なら WebP / JPEG に変換した配布用の版
+派生物はサブフォルダに置くので、章フォルダ直下の画像を拾う既存の処理には影響しない。
+縮小・変換は Pillow があれば Pillow、なければ ffmpeg で行う。
+"""
+
+from __future__ import annotations
+
+import binascii
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterable, List, Optional, Sequence
+
+try:  # Pillow は任意（無ければ ffmpeg を使う）
+    from PIL import Image
+except ImportError:  # pragma: no cover - depends on environment
+    Image = None
+
+PROXY_DIR = "proxy"
+PROXY_SIZE = 960  # プロキシの長辺（px）
+PROXY_QUALITY = 80
+TRANSCODE_FORMATS = {"webp": ".webp", "jpeg": ".jpg"}
+TRANSCODE_QUALITY = 85
+
+_JSON_NOISE = b"\\ \t\r\n"  # JSON 文字列中の "\/" のエスケープと改行は base64 の一部ではない
+
+
+class ImagePostError(RuntimeError):
+    pass
+
+
+# ---------- 受信 ----------
+class Base64Decoder:
+    """任意の位置で切れたチャンクを受け取り、4 文字単位でそろった分だけデコードする"""
+
+    def __init__(self) -> None:
+        self._rest = b""
+
+    def feed(self, data: bytes) -> bytes:
+        data = self._rest + data.translate(None, _JSON_NOISE)
+        usable = len(data) - len(data) % 4
+        self._rest = data[usable:]
+        return base64_decode(data[:usable]) if usable else b""
+
+    def finish(self) -> bytes:
+        rest, self._rest = self._rest, b""
+        return base64_decode(rest + b"=" * (-len(rest) % 4)) if rest else b""
+
+
+def base64_decode(data: bytes) -> bytes:
+    try:
+        return binascii.a2b_base64(data, strict_mode=True)
+    except TypeError:  # Python 3.10 以前
+        return binascii.a2b_base64(data)
+
+
+def stream_base64_field(chunks: Iterable[bytes], key: str, out: BinaryIO) -> int:
+    """JSON のバイト列を先頭から読み、最初の "key": "..." の値をデコードして out に書く
+
+    書き込んだバイト数を返す（キーが無ければ 0）。保持するのはチャンク 1 つ分と末尾の数十バイトだけ。
+    """
+    sizes = stream_base64_fields(chunks, key, lambda index: out, limit=1)
+    return sizes[0] if sizes else 0
+
+
+def stream_base64_fields(
+    chunks: Iterable[bytes],
+    key: str,
+    sink: Callable[[int], Optional[BinaryIO]],
+    *,
+    limit: Optional[int] = None,
+) -> List[int]:
+    """JSON のバイト列に現れる "key": "..." の値を順にデコードし、i 番目を sink(i) が返すファイルに書く
+
+    sink が None を返した値は読み飛ばす（デコードもしない）。値ごとの書き込みバイト数を返す。
+    """
+    start = re.compile(rb'"' + re.escape(key.encode("ascii")) + rb'"\s*:\s*"')
+    keep = len(key) + 64  # チャンクの境目でキーが切れても見つけられるように残す長さ
+    chunks = iter(chunks)
+    sizes: List[int] = []
+    buf = b""
+    while limit is None or len(sizes) < limit:
+        m = start.search(buf)
+        while m is None:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return sizes
+            buf = buf[-keep:] + chunk
+            m = start.search(buf)
+        piece: Optional[bytes] = buf[m.end():]
+
+        out = sink(len(sizes))
+        decoder = Base64Decoder() if out is not None else None
+        written = 0
+        while True:
+            end = piece.find(b'"')
+            if decoder is not None:
+                data = decoder.feed(piece if end < 0 else piece[:end])
+                if end >= 0:
+                    data += decoder.finish()
+                out.write(data)
+                written += len(data)
+            if end >= 0:
+                buf = piece[end + 1:]
+                break
+            piece = next(chunks, None)
+            if piece is None:
+                raise ImagePostError("画像データの途中で応答が終わりました")
+        sizes.append(written)
+    return sizes
+
+
+# ---------- 後処理 ----------
+@dataclass
+class PostOptions:
+    proxy: bool = True
+    proxy_size: int = PROXY_SIZE
+    proxy_quality: int = PROXY_QUALITY
+    transcode: Optional[str] = None  # "webp" / "jpeg"（None なら変換版を作らない）
+    quality: int = TRANSCODE_QUALITY
+    backend: str = "auto"  # "pillow" / "ffmpeg" / "auto"
+
+
+@dataclass
+class ImageVariants:
+    """マスター 1 枚分の後処理結果"""
+
+    master: str
+    proxy: Optional[str] = None
+    transcoded: Optional[str] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    skipped: bool = False  # 派生物が最新だった
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def proxy_path(master: str) -> str:
+    folder, name = os.path.split(master)
+    return os.path.join(folder, PROXY_DIR, os.path.splitext(name)[0] + ".jpg")
+
+
+def transcoded_path(master: str, fmt: str) -> str:
+    folder, name = os.path.split(master)
+    return os.path.join(folder, fmt, os.path.splitext(name)[0] + TRANSCODE_FORMATS[fmt])
+
+
+def resolve_backend(backend: str = "auto") -> str:
+    """使える縮小・変換の手段を返す（どちらも無ければ ImagePostError）"""
+    if backend in ("auto", "pillow") and Image is not None:
+        return "pillow"
+    if backend in ("auto", "ffmpeg") and (os.getenv("MAKESHORTS_FFMPEG") or shutil.which("ffmpeg")):
+        return "ffmpeg"
+    raise ImagePostError("画像の縮小・変換には Pillow か ffmpeg が必要です")
+
+
+def _up_to_date(out_path: str, master_stat: os.stat_result) -> bool:
+    try:
+        return os.stat(out_path).st_mtime_ns >= master_stat.st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _save_pillow(master: str, out_path: str, fmt: str, quality: int, max_size: Optional[int]) -> None:
+    with Image.open(master) as img:
+        if max_size:
+            img.draft("RGB", (max_size, max_size))  # JPEG なら縮小デコードで読む
+            img.thumbnail((max_size, max_size))
+        if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(out_path, format=fmt.upper(), quality=quality)
+
+
+def _save_ffmpeg(master: str, out_path: str, fmt: str, quality: int, max_size: Optional[int]) -> None:
+    ffmpeg = os.getenv("MAKESHORTS_FFMPEG") or shutil.which("ffmpeg") or "ffmpeg"
+    args = [ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-i", master]
+    if max_size:
+        args += ["-vf", f"scale='min({max_size},iw)':'min({max_size},ih)':force_original_aspect_ratio=decrease"]
+    if fmt == "webp":
+        args += ["-c:v", "libwebp", "-quality", str(quality)]
+    else:
+        # JPEG の品質 1〜100 を ffmpeg の qscale（2=高画質〜31）に寄せる
+        args += ["-q:v", str(max(2, min(31, round(31 - quality * 0.29))))]
+    args += ["-frames:v", "1", "-f", "image2", out_path]
+    proc = subprocess.run(args, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise ImagePostError(f"ffmpeg が失敗しました ({proc.returncode}): {proc.stderr.strip()[-300:]}")
+
+
+def _write_variant(master: str, out_path: str, fmt: str, quality: int, max_size: Optional[int], backend: str) -> None:
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    root, ext = os.path.splitext(out_path)
+    tmp_path = f"{root}.{os.getpid()}.part{ext}"  # ffmpeg は拡張子で形式を見るので末尾に残す
+    try:
+        save = _save_pillow if backend == "pillow" else _save_ffmpeg
+        save(master, tmp_path, fmt, quality, max_size)
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def process_image(master: str, options: PostOptions, backend: str) -> ImageVariants:
+    """マスター 1 枚からプロキシ（と変換版）を作る。プロセスプールのワーカーで実行される"""
+    started = time.monotonic()
+    result = ImageVariants(master)
+    try:
+        master_stat = os.stat(master)
+        if options.proxy:
+            result.proxy = proxy_path(master)
+        if options.transcode:
+            result.transcoded = transcoded_path(master, options.transcode)
+        targets = [
+            (result.proxy, "jpeg", options.proxy_quality, options.proxy_size),
+            (result.transcoded, options.transcode, options.quality, None),
+        ]
+        result.skipped = True
+        for out_path, fmt, quality, max_size in targets:
+            if out_path and not _up_to_date(out_path, master_stat):
+                _write_variant(master, out_path, fmt, quality, max_size, backend)
+                result.skipped = False
+    except Exception as exc:  # 1 枚の失敗で他の画像を止めない
+        result.error = f"{type(exc).__name__}: {exc}"
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+class ImagePostProcessor:
+    """マスター画像の後処理をプロセスプールで並列に行う
+
+    submit() は描画エンジンの完了コールバックや複数のスレッドからも呼べるので、生成と後処理を重ねられる。
+    """
+
+    def __init__(self, options: Optional[PostOptions] = None, *, max_workers: Optional[int] = None) -> None:
+        self.options = options or PostOptions()
+        if self.options.transcode and self.options.transcode not in TRANSCODE_FORMATS:
+            raise ValueError(f"未対応の変換形式です: {self.options.transcode}")
+        self.backend = resolve_backend(self.options.backend)
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._futures: List["Future[ImageVariants]"] = []
+        self._lock = threading.Lock()
+
+    def submit(self, master: str) -> "Future[ImageVariants]":
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            future = self._pool.submit(process_image, master, self.options, self.backend)
+            self._futures.append(future)
+        return future
+
+    def wait(self) -> List[ImageVariants]:
+        """これまでに投入した分の完了を待ち、投入順の結果を返す"""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        return [future.result() for future in futures]
+
+    def run(self, masters: Sequence[str]) -> List[ImageVariants]:
+        for master in masters:
+            self.submit(master)
+        return self.wait()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self) -> "ImagePostProcessor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def summarize_variants(results: Sequence[ImageVariants]) -> None:
+    made = sum(1 for r in results if r.ok and not r.skipped)
+    fresh = sum(1 for r in results if r.ok and r.skipped)
+    failed = [r for r in results if not r.ok]
+    print(f"🖼  プロキシ生成 {made} 枚 / 最新 {fresh} 枚 / 失敗 {len(failed)} 枚")
+    for r in failed[:5]:
+        print(f"   ⚠️ {r.master}: {r.error}")
@@ -0,0 +1,349 @@
+"""Vertex AI Imagen の predict エンドポイントを並列に叩く共有レンダリングエンジン
+
+レート制限・再試行・サーキットブレーカーは makeshorts.transport に任せる（プロジェクト単位で共有）。
+batch_size > 1 なら同じ group（章）のプロンプトを 1 回の predict にまとめ、predictions を 1 枚ずつのファイルに戻す。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from makeshorts.image_cache import ImageCache, request_key
+from makeshorts.image_post import ImagePostError, stream_base64_fields
+from makeshorts.transport import ClientError, NetworkError, Transport, check_response, get_endpoint
+
+STREAM_CHUNK = 64 * 1024
+
+
+@dataclass
+class ImageJob:
+    """1 枚分の描画ジョブ"""
+
+    index: int
+    prompt: str
+    filename: str
+    group: Optional[str] = None  # まとめて送ってよい単位（章の slot など）。違う group は同じ predict に入れない
+
+
+@dataclass
+class ImageResult:
+    """描画結果（失敗時は path が None で error にメッセージ）"""
+
+    job: ImageJob
+    path: Optional[str] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.path is not None
+
+
+def build_endpoint(project_id: str, location: str, model: str) -> str:
+    return (
+        f"https://{location}-aiplatform.googleapis.com/v1/projects/{project_id}"
+        f"/locations/{location}/publishers/google/models/{model}:predict"
+    )
+
+
+def build_payload(prompt: str, *, aspect_ratio: str = "9:16", sample_count: int = 1, **parameters) -> dict:
+    return build_batch_payload([prompt], aspect_ratio=aspect_ratio, sample_count=sample_count, **parameters)
+
+
+def build_batch_payload(
+    prompts: Sequence[str], *, aspect_ratio: str = "9:16", sample_count: int = 1, **parameters
+) -> dict:
+    """複数プロンプトを 1 回の predict に載せる（predictions はプロンプト順に sample_count 枚ずつ並ぶ）"""
+    return {
+        "instances": [{"prompt": prompt} for prompt in prompts],
+        "parameters": {"sampleCount": sample_count, "aspectRatio": aspect_ratio, **parameters},
+    }
+
+
+def plan_batches(jobs: Sequence[ImageJob], batch_size: int) -> List[List[ImageJob]]:
+    """group ごと（出現順）に batch_size 件ずつに分ける"""
+    groups: Dict[Optional[str], List[ImageJob]] = {}
+    for job in jobs:
+        groups.setdefault(job.group, []).append(job)
+    size = max(1, batch_size)
+    return [members[i:i + size] for members in groups.values() for i in range(0, len(members), size)]
+
+
+class ImagenEngine:
+    """スレッドプール + コネクションプール付き Session で predict を並列実行する"""
+
+    def __init__(
+        self,
+        endpoint: str,
+        access_token: Union[str, Callable[[], str]],
+        *,
+        project_id: str = "default",
+        max_workers: int = 4,
+        requests_per_minute: float = 60,
+        timeout: float = 120,
+        aspect_ratio: str = "9:16",
+        sample_count: int = 1,
+        parameters: Optional[dict] = None,
+        cache: Optional[ImageCache] = None,
+        refresh: bool = False,
+        batch_size: int = 1,
+    ) -> None:
+        self.endpoint = endpoint
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.aspect_ratio = aspect_ratio
+        self.sample_count = sample_count
+        self.parameters = parameters or {}
+        self.cache = cache
+        self.refresh = refresh
+        # 1 回の predict に載せるプロンプト数の上限（指定値）。エンドポイントが複数件を拒んだら
+        # ワーカー間で共有する _batch_limit の方を縮める
+        self.batch_size = max(1, batch_size)
+        self._batch_limit = self.batch_size
+        self._limit_lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._callback_lock = threading.Lock()
+        # 呼び出し可能なら送信のたびに聞き直す（長いバッチの途中でトークンが期限切れにならない）
+        self._token = access_token if callable(access_token) else (lambda: access_token)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        # 同一プロジェクトの全エンジンで 1 分あたりの上限を共有する（均等間隔で送信）
+        self.transport = Transport(
+            get_endpoint(f"imagen:{project_id}", requests_per_minute=requests_per_minute),
+            session=self.session,
+        )
+
+    def close(self) -> None:
+        """プールの完了を待ってからキャッシュの容量調整を行い、Session を閉じる"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            if self.cache is not None:
+                self.cache.evict()
+        self.session.close()
+
+    def __enter__(self) -> "ImagenEngine":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def payload_for(self, prompt: str) -> dict:
+        return build_payload(
+            prompt,
+            aspect_ratio=self.aspect_ratio,
+            sample_count=self.sample_count,
+            **self.parameters,
+        )
+
+    def _cache_key(self, job: ImageJob) -> Optional[str]:
+        # まとめて送る場合も 1 枚ずつのリクエストとして鍵を作る（batch_size を変えてもキャッシュが効く）
+        return request_key(self.endpoint, self.payload_for(job.prompt)) if self.cache is not None else None
+
+    def _fetch_cached(self, job: ImageJob, key: Optional[str]) -> Optional[ImageResult]:
+        if key and not self.refresh and self.cache.fetch(key, job.filename):
+            return ImageResult(job, path=job.filename, cached=True)
+        return None
+
+    def render_one(self, job: ImageJob) -> ImageResult:
+        key = self._cache_key(job)
+        return self._fetch_cached(job, key) or self._render_uncached(job, key)
+
+    def _render_uncached(self, job: ImageJob, key: Optional[str]) -> ImageResult:
+        payload = self.payload_for(job.prompt)
+        tmp_path = f"{job.filename}.part"
+        try:
+            # 429 / 5xx / タイムアウトは transport が待って再試行する（失敗した画像を黙って落とさない）
+            size = self.transport.call(lambda: self._download(payload, tmp_path))
+            if not size:
+                return ImageResult(job, error="画像データが見つかりませんでした")
+            os.replace(tmp_path, job.filename)
+            if key:
+                self.cache.store(key, job.filename)
+            return ImageResult(job, path=job.filename)
+        except Exception as exc:  # pragma: no cover - runtime feedback only
+            return ImageResult(job, error=f"{type(exc).__name__}: {exc}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _download(self, payload: dict, tmp_path: str) -> int:
+        """predict を 1 回送り、応答全体をメモリに載せずに画像の base64 だけをデコードしながら書く"""
+        sizes = self._download_many(payload, [tmp_path], samples=1)
+        return sizes[0] if sizes else 0
+
+    def _download_many(self, payload: dict, tmp_paths: Sequence[str], *, samples: int) -> List[int]:
+        """predictions を先頭から順に読み、i 番目のプロンプトの 1 枚目を tmp_paths[i] に書く（残りの候補は読み飛ばす）"""
+        files: List = []
+
+        def sink(index: int):
+            slot, sample = divmod(index, samples)
+            if sample or slot >= len(tmp_paths):
+                return None
+            os.makedirs(os.path.dirname(tmp_paths[slot]) or ".", exist_ok=True)
+            # 一時ファイル（.part）に書き、そろってから本来のファイル名へ差し替える
+            files.append(open(tmp_paths[slot], "wb"))
+            return files[-1]
+
+        response = self.session.post(
+            self.endpoint,
+            json=payload,
+            headers={"Authorization": f"Bearer {self._token()}"},
+            timeout=self.timeout,
+            stream=True,
+        )
+        with check_response(response, self.transport.endpoint.name):
+            try:
+                return stream_base64_fields(response.iter_content(STREAM_CHUNK), "bytesBase64Encoded", sink)
+            except ImagePostError as exc:  # 応答の途中切れは通信エラーとして再試行する
+                raise NetworkError(str(exc)) from exc
+            finally:
+                for file_obj in files:
+                    file_obj.close()
+
+    def render_batch(self, jobs: Sequence[ImageJob]) -> List[ImageResult]:
+        """複数のプロンプトを 1 回の predict で描画し、入力順の結果を返す
+
+        キャッシュにある分は送らない。応答の枚数が合わない（安全フィルタで一部が落ちた等）・
+        エンドポイントが複数件を拒んだ（4xx）場合は半分ずつに分けて送り直し、最後は 1 枚ずつのリクエストになる。
+        再試行し尽くした通信エラー・ブレーカーが開いている等は分割せず、バッチ全体を失敗として返す。
+        """
+        results: Dict[int, ImageResult] = {}
+        pending: List[Tuple[ImageJob, Optional[str]]] = []
+        for job in jobs:
+            key = self._cache_key(job)
+            cached = self._fetch_cached(job, key)
+            if cached is not None:
+                results[id(job)] = cached
+            else:
+                pending.append((job, key))
+        self._render_pending(pending, results)
+        return [results[id(job)] for job in jobs]
+
+    def _shrink_batch_limit(self, size: int) -> None:
+        with self._limit_lock:
+            self._batch_limit = max(1, min(self._batch_limit, size))
+
+    def _render_pending(self, pending: List[Tuple[ImageJob, Optional[str]]], results: Dict[int, ImageResult]) -> None:
+        with self._limit_lock:
+            limit = self._batch_limit
+        if len(pending) > limit:
+            for i in range(0, len(pending), limit):
+                self._render_pending(pending[i:i + limit], results)
+            return
+        if len(pending) <= 1:
+            for job, key in pending:
+                results[id(job)] = self._render_uncached(job, key)
+            return
+
+        jobs = [job for job, _ in pending]
+        tmp_paths = [f"{job.filename}.part" for job in jobs]
+        payload = build_batch_payload(
+            [job.prompt for job in jobs],
+            aspect_ratio=self.aspect_ratio,
+            sample_count=self.sample_count,
+            **self.parameters,
+        )
+        try:
+            sizes = self.transport.call(lambda: self._download_many(payload, tmp_paths, samples=self.sample_count))
+            complete = len(sizes) == len(jobs) * self.sample_count and all(sizes[::self.sample_count])
+        except ClientError:
+            # 複数件のリクエストを受け付けないエンドポイント（400 など）。以降のバッチも小さくする
+            self._shrink_batch_limit((len(jobs) + 1) // 2)
+            complete = False
+        except Exception as exc:  # pragma: no cover - runtime feedback only
+            # 分けて送り直しても同じ理由で失敗するだけなので、このバッチの全件を失敗にする
+            for tmp_path in tmp_paths:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            for job in jobs:
+                results[id(job)] = ImageResult(job, error=f"{type(exc).__name__}: {exc}")
+            return
+
+        if complete:
+            for (job, key), tmp_path in zip(pending, tmp_paths):
+                os.replace(tmp_path, job.filename)
+                if key:
+                    self.cache.store(key, job.filename)
+                results[id(job)] = ImageResult(job, path=job.filename)
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if not complete:
+            # どの画像が欠けたか応答からは分からないので、半分ずつ送り直す
+            half = (len(pending) + 1) // 2
+            self._render_pending(pending[:half], results)
+            self._render_pending(pending[half:], results)
+
+    def _run(self, job: ImageJob, on_result: Optional[Callable[[ImageResult], None]]) -> ImageResult:
+        started = time.monotonic()
+        result = self.render_one(job)
+        result.elapsed = time.monotonic() - started
+        if on_result is not None:
+            with self._callback_lock:
+                on_result(result)
+        return result
+
+    def _run_batch(
+        self, jobs: Sequence[ImageJob], on_result: Optional[Callable[[ImageResult], None]]
+    ) -> List[ImageResult]:
+        started = time.monotonic()
+        results = self.render_batch(jobs)
+        elapsed = time.monotonic() - started
+        for result in results:
+            result.elapsed = elapsed
+            if on_result is not None:
+                with self._callback_lock:
+                    on_result(result)
+        return results
+
+    def submit(
+        self,
+        job: ImageJob,
+        *,
+        on_result: Optional[Callable[[ImageResult], None]] = None,
+    ) -> "Future[ImageResult]":
+        """ジョブを 1 件投入して Future を返す（プロンプトが揃う前から描画を始めたい場合用）"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._pool.submit(self._run, job, on_result)
+
+    def submit_batch(
+        self,
+        jobs: Sequence[ImageJob],
+        *,
+        on_result: Optional[Callable[[ImageResult], None]] = None,
+    ) -> "Future[List[ImageResult]]":
+        """複数のジョブを 1 回の predict にまとめて投入する（group は呼び出し側でそろえる）"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._pool.submit(self._run_batch, list(jobs), on_result)
+
+    def render(
+        self,
+        jobs: Sequence[ImageJob],
+        *,
+        on_result: Optional[Callable[[ImageResult], None]] = None,
+    ) -> List[ImageResult]:
+        """ジョブを並列に描画し、入力順に並んだ結果を返す（on_result は完了順に呼ばれる）"""
+
+        if self.batch_size <= 1:
+            futures = [self.submit(job, on_result=on_result) for job in jobs]
+            return [future.result() for future in futures]
+
+        batches = [self.submit_batch(batch, on_result=on_result) for batch in plan_batches(jobs, self.batch_size)]
+        by_job = {id(result.job): result for future in batches for result in future.result()}
+        return [by_job[id(job)] for job in jobs]
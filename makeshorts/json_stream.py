@@ -0,0 +1,78 @@
+"""ストリーミング中の LLM 応答から、配列要素が閉じた瞬間に取り出すインクリメンタル JSON スキャナ
+
+完全な JSON パーサではなく、文字列・エスケープ・括弧の深さだけを追跡する。
+トップレベルのオブジェクト直下にある `key` 配列の要素（オブジェクト）が閉じたら
+その部分文字列だけを json.loads して返す。先頭の ```json などのゴミは無視される。
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, List, Optional
+
+
+class ArrayItemStream:
+    """feed() で受け取ったチャンクから、完成した `key` 配列の要素を順に返す"""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._text = ""
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str) -> List[Any]:
+        items = []
+        base = len(self._text)
+        self._text += chunk
+        text = self._text
+        for offset, ch in enumerate(chunk):
+            pos = base + offset
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:pos]
+                continue
+
+            if ch == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._string_start = pos
+            elif ch == ":":
+                # トップレベルオブジェクトのキーだけ覚えておけば十分
+                if self._stack == ["{"]:
+                    self._current_key = self._last_string
+            elif ch in "{[":
+                if (
+                    ch == "["
+                    and self._stack == ["{"]
+                    and self._current_key == self.key
+                ):
+                    self._array_depth = len(self._stack) + 1
+                self._stack.append(ch)
+                if ch == "{" and self._array_depth is not None and len(self._stack) == self._array_depth + 1:
+                    self._item_start = pos
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if self._array_depth is not None:
+                    if ch == "}" and self._item_start is not None and len(self._stack) == self._array_depth:
+                        items.append(json.loads(text[self._item_start:pos + 1]))
+                        self._item_start = None
+                    elif ch == "]" and len(self._stack) == self._array_depth - 1:
+                        self._array_depth = None
+        return items
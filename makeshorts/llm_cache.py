@@ -0,0 +1,157 @@
+"""LLM 応答の SQLite キャッシュと、同一リクエストの in-flight 合流
+
+キーは (model, prompt, generation_config) の SHA-256。
+- TTL を過ぎたエントリは使わない（次の書き込みで上書き）
+- 件数上限を超えたら最終参照が古いものから削除
+- 同じキーの呼び出しが同時に来た場合は 1 回だけ API を叩き、残りはその結果を待つ
+失敗（例外）はキャッシュしない。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "makeshorts", "llm.sqlite3")
+DEFAULT_TTL_SEC = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def cache_key(model: str, prompt: str, generation_config: Optional[dict] = None) -> str:
+    canonical = json.dumps(
+        {"model": model, "prompt": prompt, "config": generation_config or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite に応答テキストを保存するキャッシュ（スレッド・プロセス間で共有可）"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        *,
+        ttl_sec: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ) -> None:
+        self.path = path or os.getenv("MAKESHORTS_LLM_CACHE", DEFAULT_CACHE_PATH)
+        self.ttl_sec = float(ttl_sec if ttl_sec is not None else os.getenv("MAKESHORTS_LLM_CACHE_TTL", DEFAULT_TTL_SEC))
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv("MAKESHORTS_LLM_CACHE_MAX", DEFAULT_MAX_ENTRIES))
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self._db.commit()
+        self._db_lock = threading.Lock()
+
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """MAKESHORTS_LLM_CACHE=off なら None（キャッシュ無効）"""
+        if os.getenv("MAKESHORTS_LLM_CACHE", "").lower() in ("0", "off", "false", "none"):
+            return None
+        return cls()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._db_lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_sec:
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._evict_locked()
+            self._db.commit()
+
+    def _evict_locked(self) -> None:
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (overflow,),
+            )
+        self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_sec,))
+
+    def get_or_compute(
+        self,
+        model: str,
+        prompt: str,
+        generation_config: Optional[dict],
+        compute: Callable[[], str],
+    ) -> str:
+        """キャッシュにあれば返し、無ければ compute() を 1 回だけ実行して保存"""
+        key = cache_key(model, prompt, generation_config)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is None:
+                # 上で外れてからここまでの間に、先に走っていた呼び出しが保存して抜けていることがある
+                cached = self.get(key)
+                if cached is not None:
+                    return cached
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            response = compute()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            self.put(key, model, response)
+            future.set_result(response)
+            return response
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def close(self) -> None:
+        with self._db_lock:
+            self._db.close()
+
+
+def cached_generate(
+    cache: Optional[ResponseCache],
+    model: str,
+    prompt: str,
+    generation_config: Optional[dict],
+    compute: Callable[[], str],
+) -> str:
+    """cache が None（無効）なら素通しで compute() を呼ぶ"""
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(model, prompt, generation_config, compute)
@@ -0,0 +1,349 @@
+"""音声ファイルの長さ・サンプルレート・チャンネル数をデコードせずに読み取るプローブと、その結果のインデックス
+
+- WAV : RIFF の fmt / data チャンクから計算
+- MP3 : ID3v2 を飛ばして先頭フレームを解析。Xing/Info/VBRI があればフレーム数から、
+        無ければフレームヘッダだけを順にたどって合計する（mmap 上を飛び移るだけでデコードしない）
+- FLAC: STREAMINFO ブロックの総サンプル数から計算
+- M4A : moov/trak/mdia/mdhd と stsd の mp4a エントリから計算
+
+MediaIndex は (絶対パス, size, mtime_ns) をキーに結果を JSON に保存し、
+変更の無いファイルは二度とヘッダを読まない。
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+from makeshorts.run_journal import write_json_atomic
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "makeshorts", "media_index.json")
+
+
+@dataclass
+class MediaInfo:
+    duration: float
+    sample_rate: int
+    channels: int
+    codec: str
+
+
+class ProbeError(ValueError):
+    pass
+
+
+# ---------- WAV ----------
+@dataclass
+class WavLayout:
+    """WAV の PCM 形式と data チャンクの位置（mmap で直接サンプルを読むときに使う）"""
+    format_tag: int
+    channels: int
+    sample_rate: int
+    byte_rate: int
+    block_align: int
+    bits_per_sample: int
+    data_offset: int
+    data_size: int
+
+
+def read_wav_layout(path: str) -> WavLayout:
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff not in (b"RIFF", b"RF64") or wave != b"WAVE":
+            raise ProbeError("RIFF/WAVE ヘッダがありません")
+        file_size = os.fstat(f.fileno()).st_size
+        fmt = None
+        data_offset = data_size = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                if fmt[0] == 0xFFFE and size >= 40:  # WAVE_FORMAT_EXTENSIBLE は SubFormat の先頭が実際の形式
+                    f.seek(8, os.SEEK_CUR)
+                    fmt = (struct.unpack("<H", f.read(2))[0],) + fmt[1:]
+                    f.seek(size - 26 + (size & 1), os.SEEK_CUR)
+                else:
+                    f.seek(size - 16 + (size & 1), os.SEEK_CUR)
+            elif chunk_id == b"data":
+                data_offset = f.tell()
+                data_size = size
+                if size == 0xFFFFFFFF or fmt is not None:
+                    break
+                f.seek(size + (size & 1), os.SEEK_CUR)
+            else:
+                f.seek(size + (size & 1), os.SEEK_CUR)
+        if fmt is None or data_offset is None:
+            raise ProbeError("fmt / data チャンクが見つかりません")
+        if data_size == 0xFFFFFFFF or data_offset + data_size > file_size:  # ストリーミング書き出し途中など
+            data_size = file_size - data_offset
+        format_tag, channels, sample_rate, byte_rate, block_align, bits = fmt
+        return WavLayout(format_tag, channels, sample_rate, byte_rate, block_align, bits, data_offset, data_size)
+
+
+def probe_wav(path: str) -> MediaInfo:
+    layout = read_wav_layout(path)
+    duration = layout.data_size / layout.byte_rate if layout.byte_rate else 0.0
+    return MediaInfo(duration, layout.sample_rate, layout.channels, "pcm")
+
+
+# ---------- MP3 ----------
+_MP3_BITRATES = {
+    # (MPEG1?, layer) -> kbps テーブル
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _mp3_frame(buf, pos: int):
+    """pos のフレームヘッダを解析して (frame_len, samples, sample_rate, channels, mpeg1, mono) を返す"""
+    if pos + 4 > len(buf):
+        return None
+    b1, b2, b3, b4 = buf[pos], buf[pos + 1], buf[pos + 2], buf[pos + 3]
+    if b1 != 0xFF or (b2 & 0xE0) != 0xE0:
+        return None
+    version = (b2 >> 3) & 0x3
+    layer_bits = (b2 >> 1) & 0x3
+    bitrate_idx = b3 >> 4
+    sr_idx = (b3 >> 2) & 0x3
+    if version == 1 or layer_bits == 0 or bitrate_idx in (0, 15) or sr_idx == 3:
+        return None
+    layer = 4 - layer_bits
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_idx] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sr_idx]
+    padding = (b3 >> 1) & 0x1
+    mono = (b4 >> 6) == 3
+    if layer == 1:
+        samples = 384
+        frame_len = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        frame_len = samples // 8 * bitrate // sample_rate + padding
+    return frame_len, samples, sample_rate, 1 if mono else 2, mpeg1, mono
+
+
+def probe_mp3(path: str) -> MediaInfo:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        pos = 0
+        if buf[:3] == b"ID3" and len(buf) >= 10:
+            size = (buf[6] << 21) | (buf[7] << 14) | (buf[8] << 7) | buf[9]
+            pos = 10 + size + (10 if buf[5] & 0x10 else 0)
+        # 先頭フレームを探す（次のフレームヘッダも正しいことを確認して誤検出を避ける）
+        end = len(buf)
+        first = None
+        while pos < end - 4:
+            pos = buf.find(b"\xff", pos)
+            if pos < 0:
+                break
+            frame = _mp3_frame(buf, pos)
+            if frame and (pos + frame[0] >= end or _mp3_frame(buf, pos + frame[0])):
+                first = frame
+                break
+            pos += 1
+        if first is None:
+            raise ProbeError("MP3 フレームが見つかりません")
+
+        frame_len, samples, sample_rate, channels, mpeg1, mono = first
+        # Xing / Info（VBR ヘッダ）
+        side = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+        xing = pos + 4 + side
+        if buf[xing:xing + 4] in (b"Xing", b"Info"):
+            flags = struct.unpack(">I", buf[xing + 4:xing + 8])[0]
+            if flags & 0x1:
+                frames = struct.unpack(">I", buf[xing + 8:xing + 12])[0]
+                return MediaInfo(frames * samples / sample_rate, sample_rate, channels, "mp3")
+        # VBRI
+        vbri = pos + 4 + 32
+        if buf[vbri:vbri + 4] == b"VBRI":
+            frames = struct.unpack(">I", buf[vbri + 14:vbri + 18])[0]
+            return MediaInfo(frames * samples / sample_rate, sample_rate, channels, "mp3")
+
+        # VBR ヘッダが無ければフレームヘッダだけをたどって合計する
+        total_samples = 0
+        while pos < end:
+            frame = _mp3_frame(buf, pos)
+            if frame is None or frame[0] <= 0:
+                break
+            total_samples += frame[1]
+            pos += frame[0]
+        return MediaInfo(total_samples / sample_rate, sample_rate, channels, "mp3")
+
+
+# ---------- FLAC ----------
+def probe_flac(path: str) -> MediaInfo:
+    with open(path, "rb") as f:
+        head = f.read(4)
+        if head == b"ID3":
+            f.seek(6)
+            b = f.read(4)
+            f.seek(10 + ((b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]))
+            head = f.read(4)
+        if head != b"fLaC":
+            raise ProbeError("fLaC シグネチャがありません")
+        block_header = f.read(4)
+        if block_header[0] & 0x7F != 0:
+            raise ProbeError("STREAMINFO が先頭にありません")
+        info = f.read(34)
+        packed = int.from_bytes(info[10:18], "big")
+        sample_rate = packed >> 44
+        channels = ((packed >> 41) & 0x7) + 1
+        total_samples = packed & 0xFFFFFFFFF
+        return MediaInfo(total_samples / sample_rate if sample_rate else 0.0, sample_rate, channels, "flac")
+
+
+# ---------- M4A / MP4 ----------
+_MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+def _mp4_boxes(f, start: int, end: int):
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def probe_m4a(path: str) -> MediaInfo:
+    with open(path, "rb") as f:
+        file_end = os.fstat(f.fileno()).st_size
+        found: Dict[str, object] = {}
+
+        def walk(start: int, end: int, in_audio_trak: bool = False) -> None:
+            for kind, body, box_end in _mp4_boxes(f, start, end):
+                if kind == b"trak":
+                    walk(body, box_end)
+                elif kind in _MP4_CONTAINERS:
+                    walk(body, box_end, in_audio_trak)
+                elif kind == b"mvhd" and "mvhd" not in found:
+                    f.seek(body)
+                    version = f.read(4)[0]
+                    if version == 1:
+                        f.seek(16, os.SEEK_CUR)
+                        timescale, duration = struct.unpack(">IQ", f.read(12))
+                    else:
+                        f.seek(8, os.SEEK_CUR)
+                        timescale, duration = struct.unpack(">II", f.read(8))
+                    found["mvhd"] = duration / timescale if timescale else 0.0
+                elif kind == b"mdhd":
+                    f.seek(body)
+                    version = f.read(4)[0]
+                    if version == 1:
+                        f.seek(16, os.SEEK_CUR)
+                        timescale, duration = struct.unpack(">IQ", f.read(12))
+                    else:
+                        f.seek(8, os.SEEK_CUR)
+                        timescale, duration = struct.unpack(">II", f.read(8))
+                    found["_mdhd"] = duration / timescale if timescale else 0.0
+                elif kind == b"stsd" and "codec" not in found:
+                    f.seek(body + 8)  # version/flags + entry_count
+                    _, fmt = struct.unpack(">I4s", f.read(8))
+                    if fmt in (b"mp4a", b"alac", b"Opus", b"fLaC"):
+                        f.seek(body + 8 + 8 + 16)
+                        channels, _, _, _, rate_fixed = struct.unpack(">HHHHI", f.read(12))
+                        found["codec"] = fmt.decode("latin-1").strip().lower()
+                        found["channels"] = channels
+                        found["sample_rate"] = rate_fixed >> 16
+                        found["duration"] = found.get("_mdhd")
+
+        walk(0, file_end)
+        if "codec" not in found:
+            raise ProbeError("音声トラックが見つかりません")
+        duration = found.get("duration") or found.get("mvhd") or 0.0
+        return MediaInfo(float(duration), int(found["sample_rate"]), int(found["channels"]), str(found["codec"]))
+
+
+PROBES = {
+    ".wav": probe_wav,
+    ".mp3": probe_mp3,
+    ".flac": probe_flac,
+    ".m4a": probe_m4a,
+    ".mp4": probe_m4a,
+    ".aac": probe_m4a,
+}
+
+
+def probe(path: str) -> MediaInfo:
+    """拡張子に応じてヘッダを解析する（非対応・破損なら ProbeError）"""
+    fn = PROBES.get(os.path.splitext(path)[1].lower())
+    if fn is None:
+        raise ProbeError(f"非対応の形式です: {path}")
+    try:
+        return fn(path)
+    except (struct.error, IndexError, OSError, ValueError) as exc:
+        if isinstance(exc, ProbeError):
+            raise
+        raise ProbeError(f"{path}: {exc}") from exc
+
+
+class MediaIndex:
+    """(絶対パス, size, mtime_ns) をキーにプローブ結果を保存する JSON インデックス"""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or os.getenv("MAKESHORTS_MEDIA_INDEX", DEFAULT_INDEX_PATH)
+        self._entries: Dict[str, dict] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get(self, path: str) -> Optional[MediaInfo]:
+        """長さ等を返す。読めないファイル・存在しないファイルは None"""
+        key = os.path.abspath(path)
+        try:
+            st = os.stat(key)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            info = entry.get("info")
+            return MediaInfo(**info) if info else None
+
+        try:
+            info = probe(key)
+        except ProbeError:
+            info = None
+        with self._lock:
+            self._entries[key] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "info": asdict(info) if info else None,
+            }
+            self._dirty = True
+        return info
+
+    def duration(self, path: str) -> Optional[float]:
+        info = self.get(path)
+        return info.duration if info and info.duration > 0 else None
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            write_json_atomic(self.path, self._entries, indent=None)
+            self._dirty = False
@@ -0,0 +1,165 @@
+"""台本生成からタイムラインまでを 1 つの DAG で流す（python3 -m makeshorts run / main.py）
+
+以前の run は「全章の台本」→「パッケージ（画像プロンプト）」→ 組み立て を工程ごとに待ち合わせていた。
+ここでは章ごとに
+
+    script:<章>（Gemini） → voice:<章>（VOICEVOX） → measure → subs → srt ──┐
+    package（画像プロンプト） → images:<章>（Imagen） → batch / proxy ────────┴→ segment:<章>（章の区間）
+
+を make_all.build_master と同じ Scheduler に並べる。台本のそろった章から合成・字幕・区間の組み立てへ進むので、
+後の章を生成している間に最初の章の区間プレビュー（zap1/output/segments/）を確認できる。
+全体のタイムラインだけが全章を待つ。パッケージは全章分を 1 回の LLM 呼び出しで作る
+（画像はこれを待つが、ナレーション・合成は待たない）。
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Optional
+
+import make_all
+from gemini_cli.batch import PromptJob, add_jobs, run_job
+from makeshorts.run_journal import RunJournal
+from makeshorts.scheduler import Scheduler
+from zap1.zap1_auto_generate import CHAPTERS, script_jobs, write_meta
+from zap2.shorts_pipeline import section_prompts
+
+NARRATION_CHARS_PER_SEC = 350 / 60  # 1 分あたり 300-400 字。ボイスを実測するまでの仮の尺
+
+
+def chapter_skeleton(person: str, chapters: List[dict] = CHAPTERS) -> dict:
+    """台本を生成する前の master（章の id・タイトル・BGM だけ。ナレーション・画像プロンプトはタスクが埋める）"""
+    return {
+        "package": {
+            "person": person,
+            "thumbnails": [],
+            "emotion_curve": [],
+            "script": {
+                "chapters": [
+                    {
+                        "id": ch["id"],
+                        "title": ch["title"],
+                        "narration": "",
+                        "time": {"duration_sec": 0},
+                        "audio": {"bgm_tag": os.path.splitext(ch["bgm"])[0]},
+                    }
+                    for ch in chapters
+                ]
+            },
+        }
+    }
+
+
+def script_task(job: PromptJob, gemini, journal: Optional[RunJournal], ch: dict) -> str:
+    """1章分の台本を生成し（既にあれば使い回す）、master の章にナレーションと仮の尺を入れる"""
+    result = run_job(job, gemini, journal=journal)
+    if result.status == "failed":
+        raise RuntimeError(f"{job.section}: {result.error}")
+    with open(job.output, encoding="utf-8") as f:
+        narration = f.read().strip()
+    ch["time"] = {"duration_sec": round(len(narration) / NARRATION_CHARS_PER_SEC, 1)}
+    ch["narration"] = narration
+    print(f"⏩ 台本を再利用: {job.output}" if result.status == "skipped" else f"✅ 台本: {job.output}")
+    return job.output
+
+
+def package_task(generator, master: dict) -> str:
+    """全章分の画像プロンプト（とパッケージ一式）を 1 回の LLM 呼び出しで作り、master の thumbnails・emotion_curve を埋める"""
+    pkg = master["package"]
+    chapters = pkg["script"]["chapters"]
+    result = generator.generate(pkg["person"], sections=[ch["title"] for ch in chapters])
+    sections = {s.get("title"): s for s in result.data.get("script", {}).get("sections", [])}
+    thumbnails, curve = [], []
+    for idx, ch in enumerate(chapters):
+        for entry in section_prompts(result.data, ch["title"]):
+            thumbnails.append({"slot": ch["id"], "still_prompt": entry["prompt"], "motion_prompt": ""})
+        level = sections.get(ch["title"], {}).get("emotion_level")
+        if level is not None:
+            curve.append({"chapter_index": idx, "level": level})
+    pkg["thumbnails"], pkg["emotion_curve"] = thumbnails, curve
+    print(f"📦 パッケージ: {result.package_dir}（画像プロンプト {len(thumbnails)} 件）")
+    return str(result.package_dir)
+
+
+def images_task(image_module, master: dict, chap_id: str, images_root: str, title: str, use_cache: bool = True) -> int:
+    """章の静止画プロンプトを images_root/<章>/ に描画し、保存できた枚数を返す（プロキシは build_master が作る）"""
+    prompts = [t["still_prompt"] for t in master["package"]["thumbnails"] if t.get("slot") == chap_id]
+    if not prompts:
+        print(f"⚠️ {chap_id} の画像プロンプトがありません（タイムラインは [MISSING] のまま組みます）")
+        return 0
+    return image_module.generate_images_from_prompts(
+        prompts,
+        title,
+        output_dir=os.path.join(images_root, chap_id),
+        groups=[chap_id] * len(prompts),
+        proxies=False,
+        use_cache=use_cache,
+    )
+
+
+def add_generation_tasks(
+    sched: Scheduler,
+    master: dict,
+    paths: "make_all.PackagePaths",
+    *,
+    gemini,
+    generator,
+    image_module=None,
+    journal: Optional[RunJournal] = None,
+    use_cache: bool = True,
+) -> Dict[str, List[str]]:
+    """台本・パッケージ・画像を生成するタスクを足し、章 id → その章の上流タスク名を返す（build_master の upstream）
+
+    image_module が None なら画像は描かず、章のバッチはパッケージ（画像プロンプト）だけを待つ。
+    """
+    pkg = master["package"]
+    chapters = pkg["script"]["chapters"]
+    jobs = script_jobs(pkg["person"], paths.scripts_dir)
+    if journal is not None:
+        add_jobs(journal, jobs)
+
+    package = sched.add("package", package_task, generator, master)
+    upstream = {}
+    for ch, job in zip(chapters, jobs):
+        chap_id = ch["id"]
+        script = sched.add(f"script:{chap_id}", script_task, job, gemini, journal, ch, chapter=chap_id)
+        images = package
+        if image_module is not None:
+            images = sched.add(f"images:{chap_id}", images_task, image_module, master, chap_id, paths.images_root,
+                               make_all.slugify(pkg["person"]), use_cache, deps=[package], chapter=chap_id)
+        upstream[chap_id] = [script, images]
+    if journal is not None:
+        sched.add("meta", write_meta, pkg["person"], paths.outputs_root, journal,
+                  deps=[tasks[0] for tasks in upstream.values()])
+    return upstream
+
+
+def run_person(person: str, *, model: Optional[str] = None, images: bool = True, proxies: bool = False,
+               force: bool = False, paths: Optional["make_all.PackagePaths"] = None) -> dict:
+    """1人分を台本生成から CapCut プロジェクトまで 1 つの DAG で作り、build_master の要約を返す"""
+    from gemini_cli.api import GeminiAPI
+    from zap2.shorts_pipeline import ShortsPackageGenerator, TextModelClient, load_image_module
+
+    paths = paths or make_all.PackagePaths()
+    gemini = GeminiAPI()
+    generator = ShortsPackageGenerator(TextModelClient(model=model))
+    image_module = None
+    if images:
+        try:
+            image_module, _ = load_image_module()
+        except RuntimeError as e:
+            print(f"⚠️ {e}（画像は描かず、タイムラインは [MISSING] のまま組みます）")
+
+    master = chapter_skeleton(person)
+    journal = RunJournal.create("script", {"person": person})
+    print(f"🎬 {person}: 台本・画像・ナレーションを章ごとに生成しながら組み立てます")
+    print(f"📒 ラン ID: {journal.run_id}")
+    try:
+        return make_all.build_master(
+            master, paths, force=force, reflow=True, tts=True, proxies=proxies,
+            upstream=lambda sched: add_generation_tasks(sched, master, paths, gemini=gemini, generator=generator,
+                                                        image_module=image_module, journal=journal),
+        )
+    finally:
+        print(journal.summary())
+        journal.close()
@@ -0,0 +1,331 @@
+"""パッケージ・章・アセット・タイムラインクリップを 1 つの SQLite（WAL）にまとめるプロジェクトストア
+
+章バッチ（make_all が組み立てる chapter_XX_<id>.json 相当）は章ごとに 1 行で持ち、
+後工程（BGM 割り当て・単章テストの演出など）が足すキーは chapter_fields に 1 キー 1 行で重ねる。
+どの工程も自分の行だけを更新するので、ドキュメント全体の読み直し・書き直しや、並行する工程どうしの上書きが起きない。
+読み出し時は章バッチに chapter_fields を重ねた dict を返す（"output_paths.bgm_path" のようにドット区切りで入れ子を指す）。
+
+ストアは章バッチの置き場（--scripts-dir）に project.sqlite3 として作る。
+従来の chapter_XX_<id>.json は export_chapters（make_all --export-json / python3 -m makeshorts.project_store export）で書き出せる。
+ストアの無い従来のワークスペースは、読む側（open_or_import）が最初の 1 回だけ chapter_*.json を
+パッケージ "legacy" として取り込むので、どの工程からも同じ章バッチが見える。
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from natsort import natsorted
+
+from makeshorts.run_journal import write_json_atomic
+
+DB_NAME = "project.sqlite3"
+LEGACY_PACKAGE = "legacy"  # 従来の chapter_*.json から取り込んだ章バッチのパッケージ名
+SCHEMA_VERSION = 1
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS packages ("
+    " slug TEXT PRIMARY KEY, person TEXT, master TEXT NOT NULL, updated REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS chapters ("
+    " package TEXT NOT NULL, chapter_id TEXT NOT NULL, chapter_index INTEGER NOT NULL,"
+    " data TEXT NOT NULL, digest TEXT, updated REAL NOT NULL,"
+    " PRIMARY KEY (package, chapter_id))",
+    "CREATE INDEX IF NOT EXISTS chapters_order ON chapters(package, chapter_index)",
+    "CREATE TABLE IF NOT EXISTS chapter_fields ("
+    " package TEXT NOT NULL, chapter_id TEXT NOT NULL, field TEXT NOT NULL,"
+    " value TEXT NOT NULL, stage TEXT, updated REAL NOT NULL,"
+    " PRIMARY KEY (package, chapter_id, field))",
+    "CREATE TABLE IF NOT EXISTS assets ("
+    " package TEXT NOT NULL, chapter_id TEXT NOT NULL, role TEXT NOT NULL, seq INTEGER NOT NULL,"
+    " path TEXT NOT NULL, size INTEGER, mtime_ns INTEGER, updated REAL NOT NULL,"
+    " PRIMARY KEY (package, chapter_id, role, seq))",
+    "CREATE INDEX IF NOT EXISTS assets_path ON assets(package, path)",
+    "CREATE TABLE IF NOT EXISTS clips ("
+    " package TEXT NOT NULL, track TEXT NOT NULL, seq INTEGER NOT NULL, chapter_id TEXT,"
+    " start REAL NOT NULL, duration REAL NOT NULL, path TEXT, data TEXT NOT NULL,"
+    " PRIMARY KEY (package, track, seq))",
+    "CREATE INDEX IF NOT EXISTS clips_chapter ON clips(package, chapter_id)",
+    "CREATE INDEX IF NOT EXISTS clips_time ON clips(package, track, start)",
+)
+
+
+def store_path(scripts_dir: str) -> str:
+    return os.path.join(scripts_dir, DB_NAME)
+
+
+def chapter_filename(chapter: dict) -> str:
+    """エクスポート時のファイル名（従来の章バッチJSONと同じ）"""
+    return f"chapter_{chapter['chapter_index']:02d}_{chapter['id']}.json"
+
+
+def read_legacy_chapters(scripts_dir: str) -> List[dict]:
+    """従来の chapter_*.json を chapter_index 順に読む"""
+    chapters = []
+    for path in natsorted(glob.glob(os.path.join(scripts_dir, "chapter_*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            chapters.append(json.load(f))
+    return sorted(chapters, key=lambda chapter: chapter.get("chapter_index", 0))
+
+
+def _apply_field(doc: Dict[str, Any], field: str, value: Any) -> None:
+    keys = field.split(".")
+    node = doc
+    for key in keys[:-1]:
+        child = node.get(key)
+        if not isinstance(child, dict):
+            child = node[key] = {}
+        node = child
+    node[keys[-1]] = value
+
+
+class ProjectStore:
+    """SQLite（WAL）のプロジェクトストア（スレッド・プロセス間で共有可。書き込みは 1 操作 1 トランザクション）"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_scripts_dir(cls, scripts_dir: str) -> "ProjectStore":
+        return cls(store_path(scripts_dir))
+
+    @classmethod
+    def open_existing(cls, scripts_dir: str) -> Optional["ProjectStore"]:
+        """ストアがあれば開く（無ければ None。読むだけの工程が空のストアを作らないように）"""
+        path = store_path(scripts_dir)
+        return cls(path) if os.path.exists(path) else None
+
+    @classmethod
+    def open_or_import(cls, scripts_dir: str) -> Optional["ProjectStore"]:
+        """ストアを開く。無くて従来の chapter_*.json があれば、それを取り込んだストアを作る（どちらも無ければ None）"""
+        store = cls.open_existing(scripts_dir)
+        if store is not None:
+            return store
+        chapters = read_legacy_chapters(scripts_dir)
+        if not chapters:
+            return None
+        store = cls.for_scripts_dir(scripts_dir)
+        store.put_package(LEGACY_PACKAGE, {})
+        for chapter in chapters:
+            store.put_chapter(LEGACY_PACKAGE, chapter)
+        print(f"📥 従来の章バッチJSON {len(chapters)}件をプロジェクトストアに取り込みました: {store.path}")
+        return store
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> "ProjectStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---------- パッケージ ----------
+    def put_package(self, slug: str, master: dict) -> None:
+        person = master.get("package", {}).get("person")
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO packages (slug, person, master, updated) VALUES (?, ?, ?, ?)",
+                (slug, person, json.dumps(master, ensure_ascii=False), time.time()),
+            )
+
+    def packages(self) -> List[str]:
+        """最近更新した順"""
+        with self._lock:
+            rows = self._db.execute("SELECT slug FROM packages ORDER BY updated DESC").fetchall()
+        return [slug for (slug,) in rows]
+
+    def latest_package(self) -> Optional[str]:
+        packages = self.packages()
+        return packages[0] if packages else None
+
+    # ---------- 章 ----------
+    def chapter_digest(self, package: str, chapter_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest FROM chapters WHERE package = ? AND chapter_id = ?", (package, chapter_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_chapter(self, package: str, batch: dict, digest: Optional[str] = None) -> None:
+        """章バッチを置き換える（他の工程が chapter_fields に重ねたキーはそのまま残る）"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chapters (package, chapter_id, chapter_index, data, digest, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (package, batch["id"], batch["chapter_index"], json.dumps(batch, ensure_ascii=False), digest, time.time()),
+            )
+
+    def prune_chapters(self, package: str, keep: Iterable[str]) -> int:
+        """台本から消えた章の行（章バッチ・重ねたキー・アセット・クリップ）を消し、消した章の数を返す"""
+        keep = set(keep)
+        with self._lock, self._db:
+            ids = [cid for (cid,) in self._db.execute("SELECT chapter_id FROM chapters WHERE package = ?", (package,))]
+            stale = [(package, cid) for cid in ids if cid not in keep]
+            for table in ("chapters", "chapter_fields", "assets", "clips"):
+                self._db.executemany(f"DELETE FROM {table} WHERE package = ? AND chapter_id = ?", stale)
+        return len(stale)
+
+    def set_field(self, package: str, chapter_id: str, field: str, value: Any, *, stage: str = "") -> None:
+        """章のキーを 1 つだけ更新する（field はドット区切りで入れ子を指せる）"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chapter_fields (package, chapter_id, field, value, stage, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (package, chapter_id, field, json.dumps(value, ensure_ascii=False), stage, time.time()),
+            )
+
+    def clear_field(self, package: str, chapter_id: str, field: str) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM chapter_fields WHERE package = ? AND chapter_id = ? AND field = ?",
+                (package, chapter_id, field),
+            )
+
+    def chapters(self, package: str) -> List[dict]:
+        """章バッチに重ねたキーを反映した dict を chapter_index 順に返す"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT chapter_id, data FROM chapters WHERE package = ? ORDER BY chapter_index", (package,)
+            ).fetchall()
+            fields = self._db.execute(
+                "SELECT chapter_id, field, value FROM chapter_fields WHERE package = ? ORDER BY field", (package,)
+            ).fetchall()
+        docs = {chapter_id: json.loads(data) for chapter_id, data in rows}
+        for chapter_id, field, value in fields:
+            if chapter_id in docs:
+                _apply_field(docs[chapter_id], field, json.loads(value))
+        return [docs[chapter_id] for chapter_id, _ in rows]
+
+    def chapter(self, package: str, chapter_id: str) -> Optional[dict]:
+        """1 章分だけを主キーで引き、その章に重ねたキーを反映して返す"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM chapters WHERE package = ? AND chapter_id = ?", (package, chapter_id)
+            ).fetchone()
+            if row is None:
+                return None
+            fields = self._db.execute(
+                "SELECT field, value FROM chapter_fields WHERE package = ? AND chapter_id = ? ORDER BY field",
+                (package, chapter_id),
+            ).fetchall()
+        doc = json.loads(row[0])
+        for field, value in fields:
+            _apply_field(doc, field, json.loads(value))
+        return doc
+
+    # ---------- アセット ----------
+    def put_assets(self, package: str, chapter_id: str, role: str, paths: Sequence[str]) -> None:
+        """章・役割（image / proxy / voice / subtitle など）ごとのファイル一覧を置き換える"""
+        now = time.time()
+        rows = []
+        for seq, path in enumerate(paths):
+            try:
+                st = os.stat(path)
+                size, mtime_ns = st.st_size, st.st_mtime_ns
+            except OSError:
+                size = mtime_ns = None
+            rows.append((package, chapter_id, role, seq, path, size, mtime_ns, now))
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM assets WHERE package = ? AND chapter_id = ? AND role = ?", (package, chapter_id, role)
+            )
+            self._db.executemany("INSERT INTO assets VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def assets(self, package: str, *, chapter_id: Optional[str] = None, role: Optional[str] = None) -> List[str]:
+        query, params = "SELECT path FROM assets WHERE package = ?", [package]
+        if chapter_id is not None:
+            query += " AND chapter_id = ?"
+            params.append(chapter_id)
+        if role is not None:
+            query += " AND role = ?"
+            params.append(role)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY chapter_id, role, seq", params).fetchall()
+        return [path for (path,) in rows]
+
+    # ---------- タイムライン ----------
+    def replace_clips(self, package: str, project: dict) -> int:
+        """.ccproj のトラックをクリップ単位の行に置き換え、行数を返す（トラック名は role があればそれ、無ければ type）"""
+        rows = [
+            (package, track.get("role") or track.get("type", str(t)), seq, clip.get("chapter"),
+             float(clip.get("start", 0)), float(clip.get("duration", 0)), clip.get("path"),
+             json.dumps(clip, ensure_ascii=False))
+            for t, track in enumerate(project.get("tracks", []))
+            for seq, clip in enumerate(track.get("clips", []))
+        ]
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM clips WHERE package = ?", (package,))
+            self._db.executemany("INSERT INTO clips VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def clips(self, package: str, *, track: Optional[str] = None, chapter_id: Optional[str] = None) -> List[dict]:
+        query, params = "SELECT data FROM clips WHERE package = ?", [package]
+        if track is not None:
+            query += " AND track = ?"
+            params.append(track)
+        if chapter_id is not None:
+            query += " AND chapter_id = ?"
+            params.append(chapter_id)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY track, start, seq", params).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    # ---------- エクスポート ----------
+    def export_chapters(self, package: str, out_dir: str) -> List[str]:
+        """章バッチを従来どおりの chapter_XX_<id>.json（indent=2）として書き出す"""
+        paths = []
+        for chapter in self.chapters(package):
+            path = os.path.join(out_dir, chapter_filename(chapter))
+            write_json_atomic(path, chapter)
+            paths.append(path)
+        return paths
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="プロジェクトストア（project.sqlite3）の確認と JSON 書き出し")
+    parser.add_argument("command", choices=["list", "export"], help="list: 中身の一覧 / export: 章バッチJSONを書き出す")
+    parser.add_argument("--scripts-dir", default="zap1/outputs/scripts", help="ストアのあるディレクトリ")
+    parser.add_argument("--package", help="パッケージのスラッグ（省略時は最後に更新したもの）")
+    parser.add_argument("--out", help="export の出力先（省略時は --scripts-dir）")
+    args = parser.parse_args(argv)
+
+    store = ProjectStore.open_existing(args.scripts_dir)
+    if store is None:
+        print(f"❌ ストアがありません: {store_path(args.scripts_dir)}")
+        return 1
+    with store:
+        if args.command == "list":
+            for slug in store.packages():
+                chapters = store.chapters(slug)
+                print(f"📦 {slug}: {len(chapters)}章 / アセット {len(store.assets(slug))} / クリップ {len(store.clips(slug))}")
+                for chapter in chapters:
+                    print(f"   {chapter['chapter_index']:02d} {chapter['id']}: {chapter.get('title', '')}")
+            return 0
+        package = args.package or store.latest_package()
+        if package is None:
+            print("❌ パッケージがありません")
+            return 1
+        paths = store.export_chapters(package, args.out or args.scripts_dir)
+        print(f"🗂  {package}: {len(paths)}章の章バッチJSONを書き出しました → {args.out or args.scripts_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,334 @@
+"""CapCut を使わずに .ccproj（make_timeline の JSON）から MP4 を書き出すヘッドレスレンダラ
+
+章ごとの区間を独立した ffmpeg プロセスで並列に描画し、最後に concat demuxer で無劣化連結する。
+各区間は静止画の Ken Burns（zoompan）・フェード・ボイスと BGM のミックス（ボイス中は BGM を下げる）・
+字幕の焼き込みまでを 1 回の ffmpeg で行い、全区間を同じコーデック設定で出力するので連結は -c copy で済む。
+
+使い方:
+    python3 -m makeshorts.render --project zap1/output/walt_capcut.ccproj --out final.mp4 --workers 4
+    python3 -m makeshorts.render --project ... --out ... --dry-run   # ffmpeg コマンドの確認のみ
+
+字幕のフォントは fontconfig のファミリー名で指定する（--font / 環境変数 MAKESHORTS_SUBTITLE_FONT）。
+既定はレンダリング機の Linux に入れやすい Noto Sans CJK JP（fonts-noto-cjk）で、無いと libass が
+別のフォントに置き換え、日本語が豆腐になることがある。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from makeshorts.timeline import frame2sec, sec2frame
+
+VIDEO_ARGS = ["-c:v", "libx264", "-preset", "medium", "-crf", "20", "-pix_fmt", "yuv420p"]
+AUDIO_ARGS = ["-c:a", "aac", "-b:a", "192k", "-ar", "48000", "-ac", "2"]
+DEFAULT_SUBTITLE_FONT = "Noto Sans CJK JP"
+
+# (開始ズーム, 終了ズーム, 横位置の開始, 横位置の終了)  横位置は 0=左端 / 0.5=中央 / 1=右端
+MOTIONS = {
+    "kenburns-zoom-in": (1.0, 1.2, 0.5, 0.5),
+    "kenburns-zoom-in-slow": (1.0, 1.1, 0.5, 0.5),
+    "kenburns-zoom-out": (1.2, 1.0, 0.5, 0.5),
+    "kenburns-zoom-out-slow": (1.1, 1.0, 0.5, 0.5),
+    "kenburns-pan-right": (1.15, 1.15, 0.0, 1.0),
+    "kenburns-pan-left": (1.15, 1.15, 1.0, 0.0),
+}
+
+
+class RenderError(RuntimeError):
+    pass
+
+
+@dataclass
+class Segment:
+    """1 章分の描画単位（時刻はタイムライン全体のフレーム）"""
+
+    index: int
+    name: str
+    start: int
+    end: int
+    video: List[dict] = field(default_factory=list)
+
+    @property
+    def frames(self) -> int:
+        return self.end - self.start
+
+
+def subtitle_font() -> str:
+    return os.getenv("MAKESHORTS_SUBTITLE_FONT") or DEFAULT_SUBTITLE_FONT
+
+
+def find_ffmpeg() -> str:
+    path = os.getenv("MAKESHORTS_FFMPEG") or shutil.which("ffmpeg")
+    if not path:
+        raise RenderError("ffmpeg が見つかりません（PATH に置くか MAKESHORTS_FFMPEG で指定してください）")
+    return path
+
+
+def plan_segments(project: dict) -> List[Segment]:
+    """映像クリップを章（chapter キー）ごとにまとめて区間にする。章情報が無ければ全体で 1 区間"""
+    fps = int(project["meta"]["fps"])
+    segments: List[Segment] = []
+    for clip in sorted(project["tracks"][0]["clips"], key=lambda c: c["start"]):
+        start = sec2frame(clip["start"], fps)
+        end = start + sec2frame(clip["duration"], fps)
+        name = clip.get("chapter", "all")
+        if not segments or segments[-1].name != name:
+            segments.append(Segment(len(segments), name, start, end))
+        segment = segments[-1]
+        segment.end = max(segment.end, end)
+        segment.video.append(clip)
+    return segments
+
+
+def _escape_filter_path(path: str) -> str:
+    return path.replace("\\", "/").replace(":", "\\:").replace("'", "\\'")
+
+
+def _srt_time(sec: float) -> str:
+    ms = int(round(max(0.0, sec) * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def write_segment_srt(project: dict, segment: Segment, path: str) -> int:
+    """区間に重なる字幕を区間先頭基準の時刻で書き出し、件数を返す"""
+    fps = int(project["meta"]["fps"])
+    seg_start, seg_end = frame2sec(segment.start, fps), frame2sec(segment.end, fps)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for clip in project["tracks"][3]["clips"]:
+            start, end = clip["start"], clip["start"] + clip["duration"]
+            if end <= seg_start or start >= seg_end:
+                continue
+            count += 1
+            f.write(f"{count}\n{_srt_time(max(start, seg_start) - seg_start)} --> "
+                    f"{_srt_time(min(end, seg_end) - seg_start)}\n{clip['text']}\n\n")
+    return count
+
+
+def motion_filter(preset: str, frames: int, width: int, height: int, fps: int) -> str:
+    z0, z1, x0, x1 = MOTIONS.get(preset, MOTIONS["kenburns-zoom-in-slow"])
+    progress = f"on/{max(1, frames - 1)}"
+    zoom = f"{z0}+({z1 - z0})*{progress}"
+    pos = f"({x0}+({x1 - x0})*{progress})"
+    return (
+        f"zoompan=z='{zoom}':x='(iw-iw/zoom)*{pos}':y='(ih-ih/zoom)/2'"
+        f":d={frames}:s={width}x{height}:fps={fps}"
+    )
+
+
+def segment_command(
+    project: dict,
+    segment: Segment,
+    out_path: str,
+    srt_path: Optional[str],
+    *,
+    ffmpeg: str = "ffmpeg",
+    threads: int = 0,
+    font: Optional[str] = None,
+) -> List[str]:
+    """1 区間を描画する ffmpeg コマンドを組み立てる（font は字幕のフォント名。省略時は subtitle_font()）"""
+    meta = project["meta"]
+    fps = int(meta["fps"])
+    width, height = (int(v) for v in meta.get("resolution", "1920x1080").split("x"))
+    seg_start = frame2sec(segment.start, fps)
+    seg_dur = frame2sec(segment.frames, fps)
+
+    args = [ffmpeg, "-hide_banner", "-loglevel", "error", "-y"]
+    filters: List[str] = []
+    video_labels: List[str] = []
+    n = 0
+
+    # --- 映像（静止画 → Ken Burns → フェード） ---
+    for clip in segment.video:
+        frames = sec2frame(clip["duration"], fps)
+        dur = frame2sec(frames, fps)
+        path = clip.get("master") or clip["path"]  # プロキシ参照のタイムラインでも元画像で描く
+        if path.startswith("[MISSING") or not os.path.exists(path):
+            args += ["-f", "lavfi", "-i", f"color=c=black:s={width}x{height}:r={fps}:d={dur}"]
+            chain = f"[{n}:v]setsar=1"
+        else:
+            args += ["-i", path]
+            # zoompan の揺れを抑えるため 2 倍の解像度で cover にしてから動かす
+            chain = (
+                f"[{n}:v]scale={width * 2}:{height * 2}:force_original_aspect_ratio=increase,"
+                f"crop={width * 2}:{height * 2},"
+                f"{motion_filter((clip.get('motion') or {}).get('preset', ''), frames, width, height, fps)},"
+                f"setsar=1"
+            )
+        if clip.get("transition_in"):
+            chain += f",fade=t=in:st=0:d={clip['transition_in']['duration']}"
+        if clip.get("transition_out"):
+            fade = clip["transition_out"]["duration"]
+            chain += f",fade=t=out:st={max(0.0, dur - fade):.3f}:d={fade}"
+        filters.append(f"{chain},trim=end_frame={frames}[v{n}]")
+        video_labels.append(f"[v{n}]")
+        n += 1
+
+    filters.append(f"{''.join(video_labels)}concat=n={len(video_labels)}:v=1:a=0[vcat]")
+    if srt_path:
+        filters.append(
+            f"[vcat]subtitles='{_escape_filter_path(srt_path)}'"
+            f":force_style='FontName={font or subtitle_font()},FontSize=22,Outline=2,MarginV=40'[vout]"
+        )
+    else:
+        filters.append("[vcat]null[vout]")
+
+    # --- 音声（区間に重なる部分だけを切り出して配置） ---
+    voice_spans: List[Tuple[float, float]] = []
+    audio_labels: Dict[str, List[str]] = {"voice": [], "bgm": []}
+    seg_end = seg_start + seg_dur
+    for track in project["tracks"][1:3]:
+        role = track.get("role")
+        if role not in audio_labels:
+            continue
+        for clip in track["clips"]:
+            start, end = clip["start"], clip["start"] + clip["duration"]
+            if end <= seg_start or start >= seg_end or not os.path.exists(clip["path"]):
+                continue
+            offset = max(0.0, seg_start - start)
+            length = min(end, seg_end) - max(start, seg_start)
+            args += ["-ss", f"{offset + clip.get('source_start', 0):.3f}", "-t", f"{length:.3f}", "-i", clip["path"]]
+            chain = f"[{n}:a]aresample=48000,aformat=channel_layouts=stereo"
+            if clip.get("fade_in") and start >= seg_start:
+                chain += f",afade=t=in:st=0:d={clip['fade_in']}"
+            if clip.get("fade_out") and end <= seg_end:
+                chain += f",afade=t=out:st={max(0.0, length - clip['fade_out']):.3f}:d={clip['fade_out']}"
+            delay = int(round((max(start, seg_start) - seg_start) * 1000))
+            chain += f",adelay={delay}|{delay}"
+            filters.append(f"{chain}[a{n}]")
+            audio_labels[role].append(f"[a{n}]")
+            if role == "voice":
+                voice_spans.append((max(start, seg_start) - seg_start, min(end, seg_end) - seg_start))
+            n += 1
+
+    mixed = []
+    for role, labels in audio_labels.items():
+        if not labels:
+            continue
+        label = f"[{role}]"
+        mix = f"amix=inputs={len(labels)}:duration=longest:normalize=0" if len(labels) > 1 else "anull"
+        filters.append(f"{''.join(labels)}{mix}{label}")
+        mixed.append(label)
+    ducking = (project.get("mix") or {}).get("ducking") or {}
+    if "[bgm]" in mixed and voice_spans and ducking.get("enable"):
+        # ボイスが鳴っている区間だけ BGM を gain_db 下げる
+        spans = "+".join(f"between(t,{a:.3f},{b:.3f})" for a, b in voice_spans)
+        gain = 10 ** (float(ducking.get("gain_db", -12)) / 20)
+        filters.append(f"[bgm]volume=volume={gain:.4f}:enable='{spans}'[bgmd]")
+        mixed[mixed.index("[bgm]")] = "[bgmd]"
+    if mixed:
+        mix = f"amix=inputs={len(mixed)}:duration=longest:normalize=0" if len(mixed) > 1 else "anull"
+        filters.append(f"{''.join(mixed)}{mix},apad,atrim=0:{seg_dur}[aout]")
+    else:
+        args += ["-f", "lavfi", "-t", f"{seg_dur}", "-i", "anullsrc=r=48000:cl=stereo"]
+        filters.append(f"[{n}:a]anull[aout]")
+
+    args += ["-filter_complex", ";".join(filters), "-map", "[vout]", "-map", "[aout]", "-r", str(fps)]
+    if threads:
+        args += ["-threads", str(threads)]
+    args += VIDEO_ARGS + AUDIO_ARGS + ["-t", f"{seg_dur}", out_path]
+    return args
+
+
+def concat_command(parts: Sequence[str], list_path: str, out_path: str, *, ffmpeg: str = "ffmpeg") -> List[str]:
+    with open(list_path, "w", encoding="utf-8") as f:
+        for part in parts:
+            escaped = os.path.abspath(part).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return [ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0",
+            "-i", list_path, "-c", "copy", "-movflags", "+faststart", out_path]
+
+
+def _run(cmd: List[str]) -> float:
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RenderError(f"ffmpeg が失敗しました ({proc.returncode}): {proc.stderr.strip()[-500:]}")
+    return time.perf_counter() - started
+
+
+def render_project(
+    project_path: str,
+    out_path: str,
+    *,
+    workers: Optional[int] = None,
+    work_dir: Optional[str] = None,
+    keep_segments: bool = False,
+    dry_run: bool = False,
+    font: Optional[str] = None,
+) -> str:
+    """.ccproj を章ごとに並列描画して 1 本の MP4 に連結する"""
+    with open(project_path, "r", encoding="utf-8") as f:
+        project = json.load(f)
+    segments = plan_segments(project)
+    if not segments:
+        raise RenderError(f"映像クリップがありません: {project_path}")
+    ffmpeg = "ffmpeg" if dry_run else find_ffmpeg()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(segments)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    tmp = work_dir or tempfile.mkdtemp(prefix="makeshorts-render-")
+    os.makedirs(tmp, exist_ok=True)
+    commands = []
+    parts = []
+    for segment in segments:
+        part = os.path.join(tmp, f"{segment.index:03d}_{segment.name}.mp4")
+        srt = os.path.join(tmp, f"{segment.index:03d}_{segment.name}.srt")
+        has_subs = write_segment_srt(project, segment, srt) > 0
+        commands.append(segment_command(project, segment, part, srt if has_subs else None,
+                                        ffmpeg=ffmpeg, threads=threads, font=font))
+        parts.append(part)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    concat = concat_command(parts, os.path.join(tmp, "segments.txt"), out_path, ffmpeg=ffmpeg)
+
+    if dry_run:
+        for cmd in commands + [concat]:
+            print(shlex.join(cmd))
+        return out_path
+
+    print(f"🎞  {len(segments)} 区間を {workers} 並列で描画します（ffmpeg threads={threads}）")
+    started = time.perf_counter()
+    fps = int(project["meta"]["fps"])
+    with ThreadPoolExecutor(max_workers=workers) as pool:  # 実処理は ffmpeg の子プロセス側
+        for segment, elapsed in zip(segments, pool.map(_run, commands)):
+            print(f"   ✅ {segment.name} ({frame2sec(segment.frames, fps):.1f}s 分を {elapsed:.1f}s)")
+    _run(concat)
+    total = time.perf_counter() - started
+    length = frame2sec(segments[-1].end - segments[0].start, fps)
+    print(f"🎬 書き出し完了: {out_path}（{length:.1f}s の動画を {total:.1f}s, x{length / total:.2f}）")
+    if not keep_segments and work_dir is None:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out_path
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=".ccproj を ffmpeg でヘッドレスに書き出す")
+    parser.add_argument("--project", required=True, help="make_timeline が出力した .ccproj")
+    parser.add_argument("--out", required=True, help="出力する MP4")
+    parser.add_argument("--workers", type=int, default=None, help="同時に描画する区間数（既定は CPU コア数）")
+    parser.add_argument("--work-dir", default=None, help="区間ファイルの置き場所（指定時は削除しない）")
+    parser.add_argument("--keep-segments", action="store_true", help="区間ファイルを残す")
+    parser.add_argument("--dry-run", action="store_true", help="ffmpeg コマンドを表示するだけ")
+    parser.add_argument("--font", default=None,
+                        help=f"字幕のフォント（既定は MAKESHORTS_SUBTITLE_FONT か {DEFAULT_SUBTITLE_FONT}）")
+    args = parser.parse_args(argv)
+    try:
+        render_project(args.project, args.out, workers=args.workers, work_dir=args.work_dir,
+                       keep_segments=args.keep_segments, dry_run=args.dry_run, font=args.font)
+    except RenderError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
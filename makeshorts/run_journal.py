@@ -0,0 +1,263 @@
+"""長い生成ラン（台本の章・画像のシーンなど）の先行書き込みジャーナル
+
+タスクの状態（pending / running / done / failed）・試行回数・出力のチェックサムを、
+作業の前後に 1 行ずつ JSONL へ追記して fsync する。途中で落ちても、
+--resume <ラン ID> でジャーナルを読み直せば「完了して出力が壊れていないタスク」以外だけをやり直せる。
+
+    journal = RunJournal.create("images", {"title": title, "prompts": prompts})
+    journal.add("scene:01", inputs=digest(prompt), output=path)
+    if not journal.is_done("scene:01"):
+        journal.start("scene:01")
+        ...  # 出力は write_atomic などで一時ファイル → rename
+        journal.finish("scene:01", path)
+
+出力ファイルは一時ファイルに書いてから os.replace で差し替えるので、中断しても途中までのファイルが
+「完了」として残ることはない。書き換えられた・消えた出力はチェックサムの不一致で未完了に戻る。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+try:  # ファイルロックは POSIX のみ（無い環境ではロック無しで共有する）
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+JOURNAL_VERSION = 1
+DEFAULT_RUN_DIR = os.path.join(os.path.expanduser("~"), ".cache", "makeshorts", "runs")
+STATES = ("pending", "running", "done", "failed")
+
+
+class JournalError(RuntimeError):
+    """ジャーナルが無い・壊れている・別のコマンドのもの"""
+
+
+def write_atomic(
+    path: str, data: Union[str, bytes], *, encoding: str = "utf-8", mode: Optional[int] = None
+) -> None:
+    """同じディレクトリの一時ファイルに書いて fsync してから差し替える（中断しても元のファイルか新しいファイルのどちらか）
+
+    mode を渡すと一時ファイルをそのパーミッションで作る（トークンなど本人だけが読めるファイル用）。
+    """
+    path = os.fspath(path)
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666 if mode is None else mode)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.encode(encoding) if isinstance(data, str) else data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_json_atomic(path: str, obj: Any, *, indent: Optional[int] = 2, mode: Optional[int] = None) -> None:
+    """indent=None なら区切りの空白も省いた 1 行の JSON にする（インデックス・マニフェスト用）"""
+    separators = (",", ":") if indent is None else None
+    write_atomic(path, json.dumps(obj, ensure_ascii=False, indent=indent, separators=separators), mode=mode)
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """<path>.lock を排他ロックする（複数プロセスで同じファイルを読み直して書き戻すときに使う）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def file_sha256(path: str) -> Optional[str]:
+    """内容の SHA-256（存在しなければ None）"""
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+def run_dir() -> str:
+    return os.getenv("MAKESHORTS_RUN_DIR", DEFAULT_RUN_DIR)
+
+
+@dataclass
+class TaskRecord:
+    name: str
+    state: str = "pending"
+    attempts: int = 0
+    inputs: Optional[str] = None
+    output: Optional[str] = None
+    sha256: Optional[str] = None
+    error: Optional[str] = None
+    updated: float = 0.0
+
+
+class RunJournal:
+    """1 ラン分のタスク状態。変更はすべて追記 + fsync してからメモリに反映する"""
+
+    def __init__(self, path: str, run_id: str, command: str, params: Dict[str, Any], *, resumed: bool = False) -> None:
+        self.path = path
+        self.run_id = run_id
+        self.command = command
+        self.params = params
+        self.resumed = resumed
+        self.tasks: Dict[str, TaskRecord] = {}
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._torn = False  # 最後の行が途中で切れている（次の追記は改行から始める）
+
+    # ---------- 作成・再開 ----------
+    @classmethod
+    def create(
+        cls, command: str, params: Optional[Dict[str, Any]] = None, *, root: Optional[str] = None
+    ) -> "RunJournal":
+        """新しいランを始める（params は再開時にそのまま使える形で保存する）"""
+        run_id = f"{command}-{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(2)}"
+        path = os.path.join(root or run_dir(), f"{run_id}.jsonl")
+        journal = cls(path, run_id, command, dict(params or {}))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        journal._append({
+            "type": "run",
+            "version": JOURNAL_VERSION,
+            "run_id": run_id,
+            "command": command,
+            "params": journal.params,
+            "created": time.time(),
+        })
+        return journal
+
+    @classmethod
+    def open(cls, run_id: str, *, command: Optional[str] = None, root: Optional[str] = None) -> "RunJournal":
+        """既存のランをジャーナルから復元する（command を渡すと別のコマンドのランを弾く）"""
+        path = run_id if run_id.endswith(".jsonl") else os.path.join(root or run_dir(), f"{run_id}.jsonl")
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except FileNotFoundError:
+            raise JournalError(f"ランが見つかりません: {run_id}（{path}）") from None
+
+        journal: Optional[RunJournal] = None
+        for line in text.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 書き込み途中で落ちた最後の行
+            if entry.get("type") == "run":
+                if entry.get("version") != JOURNAL_VERSION:
+                    raise JournalError(f"ジャーナルの形式が違います: {path}")
+                journal = cls(path, entry["run_id"], entry["command"], entry.get("params") or {}, resumed=True)
+            elif entry.get("type") == "params" and journal is not None:
+                journal.params = entry["params"]
+            elif entry.get("type") == "task" and journal is not None:
+                entry.pop("type")
+                journal.tasks[entry["name"]] = TaskRecord(**entry)
+        if journal is None:
+            raise JournalError(f"ジャーナルが壊れています: {path}")
+        if command is not None and journal.command != command:
+            raise JournalError(f"{run_id} は {journal.command} のランです（{command} では再開できません）")
+        journal._torn = bool(text) and not text.endswith("\n")
+        return journal
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def __enter__(self) -> "RunJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        # 呼び出し側でロック済み（create だけは生成直後で競合しない）
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        if self._torn:
+            line, self._torn = "\n" + line, False
+        os.write(self._fd, line.encode("utf-8"))
+        os.fsync(self._fd)
+
+    def _update(self, name: str, **changes: Any) -> TaskRecord:
+        with self._lock:
+            record = self.tasks.get(name) or TaskRecord(name)
+            updated = TaskRecord(**{**asdict(record), **changes, "updated": time.time()})
+            self._append({"type": "task", **asdict(updated)})
+            self.tasks[name] = updated
+            return updated
+
+    def update_params(self, **changes: Any) -> None:
+        """ラン開始時には決まっていなかった引数を確定する（再開時は最後に書いた値を使う）"""
+        with self._lock:
+            self.params = {**self.params, **changes}
+            self._append({"type": "params", "params": self.params})
+
+    # ---------- タスク ----------
+    def add(self, name: str, *, inputs: Optional[str] = None, output: Optional[str] = None) -> TaskRecord:
+        """タスクを登録する。既にあって入力が同じならそのまま、入力が変わっていたら pending に戻す"""
+        record = self.tasks.get(name)
+        if record is not None and record.inputs == inputs and record.output == output:
+            return record
+        return self._update(name, state="pending", inputs=inputs, output=output, sha256=None, error=None)
+
+    def is_done(self, name: str) -> bool:
+        """done と記録され、出力が記録時のチェックサムのまま残っているか"""
+        record = self.tasks.get(name)
+        if record is None or record.state != "done":
+            return False
+        return record.output is None or file_sha256(record.output) == record.sha256
+
+    def start(self, name: str) -> TaskRecord:
+        """作業に取りかかる前に running を書く（落ちたら再開時にやり直す）"""
+        record = self.tasks.get(name) or TaskRecord(name)
+        return self._update(name, state="running", attempts=record.attempts + 1, error=None)
+
+    def finish(self, name: str, output: Optional[str] = None) -> TaskRecord:
+        """出力を書き終えた（rename まで済んだ）あとに呼ぶ"""
+        output = output or (self.tasks[name].output if name in self.tasks else None)
+        return self._update(name, state="done", output=output, sha256=file_sha256(output) if output else None)
+
+    def fail(self, name: str, error: str) -> TaskRecord:
+        return self._update(name, state="failed", error=error)
+
+    # ---------- 集計 ----------
+    def unfinished(self) -> List[str]:
+        return [name for name in self.tasks if not self.is_done(name)]
+
+    def counts(self) -> Dict[str, int]:
+        counts = {state: 0 for state in STATES}
+        for record in self.tasks.values():
+            counts[record.state] += 1
+        return counts
+
+    def summary(self) -> str:
+        counts = self.counts()
+        text = f"📒 ラン {self.run_id}: 完了 {counts['done']} / 失敗 {counts['failed']}"
+        left = counts["pending"] + counts["running"]
+        if left:
+            text += f" / 未着手・中断 {left}"
+        if counts["done"] < len(self.tasks):
+            text += f"（--resume {self.run_id} で未完了分だけ再実行できます）"
+        return text
@@ -0,0 +1,271 @@
+"""章ごとのタスクを依存関係つきで並べて実行する DAG スケジューラ
+
+工程ごとに全章を待ち合わせる代わりに、依存が満たされたタスクから順に投入する。
+通信待ちのタスク（VOICEVOX・Imagen・ファイル書き出し）は I/O プール、計算のタスクは CPU プールで動かすので、
+遅い章の合成を待っている間に先の章の字幕やバッチが仕上がり、全体の所要時間は最も長い章の経路に近づく。
+
+    sched = Scheduler(io_workers=8)
+    sched.add("voice:ch1", synthesize, "ch1", chapter="ch1")
+    sched.add("measure:ch1", measure, "ch1", deps=["voice:ch1"], pool="cpu", chapter="ch1")
+    runs = sched.run()
+
+失敗したタスクに依存するタスクは実行せず skipped にする（他の章は最後まで進める）。
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+POOLS = ("io", "cpu")
+
+
+class SchedulerError(RuntimeError):
+    """タスク定義の誤り（重複・未定義の依存・循環）"""
+
+
+@dataclass
+class Task:
+    name: str
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+    deps: Tuple[str, ...] = ()
+    pool: str = "io"
+    chapter: Optional[str] = None
+    # 依存タスクの結果から引数を作る（スケジューラのスレッドで呼ばれる。fn はプロセスへ送れる形のまま保てる）
+    bind: Optional[Callable[[Dict[str, Any]], Tuple[Any, ...]]] = None
+
+
+@dataclass
+class TaskRun:
+    """1 タスク分の実行結果（時刻は run() 開始からの秒）"""
+
+    name: str
+    pool: str
+    chapter: Optional[str] = None
+    status: str = "pending"  # pending / running / done / failed / skipped
+    result: Any = None
+    error: Optional[str] = None
+    started: float = 0.0
+    finished: float = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return max(0.0, self.finished - self.started)
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "done"
+
+
+@dataclass
+class ScheduleReport:
+    runs: Dict[str, TaskRun]
+    wall: float
+    busy: float  # 全タスクの所要時間の合計（工程を直列に並べた場合の目安）
+    critical_path: List[str] = field(default_factory=list)
+    critical_sec: float = 0.0
+    chapters_ready: Dict[str, float] = field(default_factory=dict)  # 章 -> 全タスクが終わった時刻
+
+    @property
+    def failed(self) -> List[TaskRun]:
+        return [run for run in self.runs.values() if run.status in ("failed", "skipped")]
+
+    def summary(self) -> str:
+        first = min(self.chapters_ready.values()) if self.chapters_ready else None
+        text = (
+            f"⏱  DAG: {len(self.runs)} タスク {self.wall:.2f}s（タスク合計 {self.busy:.2f}s / "
+            f"最長経路 {self.critical_sec:.2f}s"
+        )
+        if first is not None:
+            text += f" / 最初の章 {first:.2f}s"
+        return text + "）"
+
+
+class Scheduler:
+    """依存が満たされたタスクを I/O・CPU の 2 つのプールへ投入する"""
+
+    def __init__(
+        self,
+        io_workers: int = 8,
+        cpu_workers: Optional[int] = None,
+        *,
+        cpu_processes: bool = False,
+        on_done: Optional[Callable[[TaskRun], None]] = None,
+        on_chapter_ready: Optional[Callable[[str, float], None]] = None,
+    ) -> None:
+        self.io_workers = max(1, io_workers)
+        self.cpu_workers = max(1, cpu_workers or os.cpu_count() or 1)
+        # cpu_processes=True なら CPU タスクは別プロセスで動かす（fn・引数・結果が pickle できること）
+        self.cpu_processes = cpu_processes
+        self.on_done = on_done
+        self.on_chapter_ready = on_chapter_ready
+        self.tasks: Dict[str, Task] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        deps: Sequence[str] = (),
+        pool: str = "io",
+        chapter: Optional[str] = None,
+        bind: Optional[Callable[[Dict[str, Any]], Tuple[Any, ...]]] = None,
+    ) -> str:
+        if name in self.tasks:
+            raise SchedulerError(f"タスク名が重複しています: {name}")
+        if pool not in POOLS:
+            raise SchedulerError(f"pool は {POOLS} のいずれか: {pool}")
+        # 同じ依存を 2 回書いても 1 回として扱う（完了通知で 2 回投入しないように）
+        self.tasks[name] = Task(name, fn, tuple(args), tuple(dict.fromkeys(deps)), pool, chapter, bind)
+        return name
+
+    def _check(self) -> List[str]:
+        """未定義の依存と循環を検出し、トポロジカル順を返す"""
+        for task in self.tasks.values():
+            missing = [dep for dep in task.deps if dep not in self.tasks]
+            if missing:
+                raise SchedulerError(f"{task.name} の依存が定義されていません: {', '.join(missing)}")
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = 訪問中, 2 = 済
+        for root in self.tasks:
+            if state.get(root):
+                continue
+            state[root] = 1
+            stack = [(root, iter(self.tasks[root].deps))]
+            while stack:
+                name, deps = stack[-1]
+                dep = next(deps, None)
+                if dep is None:
+                    stack.pop()
+                    state[name] = 2
+                    order.append(name)
+                elif state.get(dep) == 1:
+                    raise SchedulerError(f"依存が循環しています: {dep} <-> {name}")
+                elif not state.get(dep):
+                    state[dep] = 1
+                    stack.append((dep, iter(self.tasks[dep].deps)))
+        return order
+
+    def run(self) -> ScheduleReport:
+        order = self._check()
+        runs = {name: TaskRun(name, task.pool, task.chapter) for name, task in self.tasks.items()}
+        results: Dict[str, Any] = {}
+        waiting = {name: set(task.deps) for name, task in self.tasks.items()}
+        dependents: Dict[str, List[str]] = {name: [] for name in self.tasks}
+        for name, task in self.tasks.items():
+            for dep in task.deps:
+                dependents[dep].append(name)
+        chapter_left: Dict[str, int] = {}
+        for task in self.tasks.values():
+            if task.chapter is not None:
+                chapter_left[task.chapter] = chapter_left.get(task.chapter, 0) + 1
+        chapters_ready: Dict[str, float] = {}
+
+        cpu_pool: Executor = (
+            ProcessPoolExecutor(max_workers=self.cpu_workers)
+            if self.cpu_processes
+            else ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix="dag-cpu")
+        )
+        pools: Dict[str, Executor] = {
+            "io": ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="dag-io"),
+            "cpu": cpu_pool,
+        }
+        started = time.monotonic()
+        running: Dict[Future, str] = {}  # 投入・完了の処理はすべてこのスレッドで行う
+
+        def now() -> float:
+            return time.monotonic() - started
+
+        def finish(name: str) -> List[str]:
+            """完了（成功・失敗・スキップ）を反映し、新たに実行できるタスクを返す"""
+            run = runs[name]
+            run.finished = run.finished or now()
+            if self.on_done is not None:
+                self.on_done(run)
+            if run.chapter is not None:
+                chapter_left[run.chapter] -= 1
+                if chapter_left[run.chapter] == 0:
+                    chapters_ready[run.chapter] = run.finished
+                    if self.on_chapter_ready is not None:
+                        self.on_chapter_ready(run.chapter, run.finished)
+            ready = []
+            for child in dependents[name]:
+                if not run.ok:
+                    # 依存先が失敗したら実行しない（その先も連鎖してスキップ）
+                    if runs[child].status == "pending":
+                        runs[child].status = "skipped"
+                        runs[child].error = f"依存タスク {name} が失敗"
+                        runs[child].started = runs[child].finished = now()
+                        ready.extend(finish(child))
+                    continue
+                waiting[child].discard(name)
+                if not waiting[child] and runs[child].status == "pending":
+                    ready.append(child)
+            return ready
+
+        def submit(name: str) -> None:
+            task = self.tasks[name]
+            run = runs[name]
+            run.status = "running"
+            run.started = now()
+            try:
+                args = task.bind(results) if task.bind is not None else task.args
+            except Exception as exc:  # 引数の組み立てに失敗
+                run.status, run.error = "failed", f"{type(exc).__name__}: {exc}"
+                for child in finish(name):
+                    submit(child)
+                return
+            running[pools[task.pool].submit(task.fn, *args)] = name
+
+        try:
+            for name in order:
+                if not self.tasks[name].deps:
+                    submit(name)
+            while running:
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    run = runs[name]
+                    run.finished = now()
+                    try:
+                        results[name] = run.result = future.result()
+                        run.status = "done"
+                    except Exception as exc:
+                        run.status, run.error = "failed", f"{type(exc).__name__}: {exc}"
+                    for child in finish(name):
+                        submit(child)
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+
+        wall = now()
+        path, path_sec = self._critical_path(order, runs)
+        return ScheduleReport(
+            runs=runs,
+            wall=wall,
+            busy=sum(run.elapsed for run in runs.values()),
+            critical_path=path,
+            critical_sec=path_sec,
+            chapters_ready=chapters_ready,
+        )
+
+    def _critical_path(self, order: List[str], runs: Dict[str, TaskRun]) -> Tuple[List[str], float]:
+        """実測の所要時間で最も長い依存の連鎖（これより速くは終わらない）"""
+        best: Dict[str, Tuple[float, Optional[str]]] = {}
+        for name in order:
+            task = self.tasks[name]
+            prev = max(task.deps, key=lambda dep: best[dep][0], default=None)
+            best[name] = ((best[prev][0] if prev else 0.0) + runs[name].elapsed, prev)
+        if not best:
+            return [], 0.0
+        tail = max(best, key=lambda name: best[name][0])
+        total = best[tail][0]
+        path: List[str] = []
+        while tail is not None:
+            path.append(tail)
+            tail = best[tail][1]
+        return path[::-1], total
@@ -0,0 +1,301 @@
+"""ベンチマーク・動作確認用のローカルスタブサーバ群（ネットワーク不要）"""
+
+from __future__ import annotations
+
+import base64
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Sequence
+
+# 1x1 の透明 PNG
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+@dataclass
+class FaultPlan:
+    """スタブに注入する障害
+
+    先頭のリクエストから statuses を順に返し、その後は rate の確率で status_pool から選んで返す。
+    0 は正常応答、-1 は hang_sec だけ黙ってから接続を切る（クライアント側のタイムアウト）。
+    429 には retry_after 秒の Retry-After を付ける。
+    """
+
+    statuses: Sequence[int] = ()
+    rate: float = 0.0
+    status_pool: Sequence[int] = (429, 503)
+    retry_after: Optional[float] = 1.0
+    hang_sec: float = 5.0
+    seed: Optional[int] = None
+    injected: Counter = field(default_factory=Counter, init=False)
+    _served: int = field(default=0, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+
+    def next_status(self) -> int:
+        with self._lock:
+            index = self._served
+            self._served += 1
+            if index < len(self.statuses):
+                status = self.statuses[index]
+            elif self.rate and self._rng.random() < self.rate:
+                status = self._rng.choice(list(self.status_pool))
+            else:
+                status = 0
+            if status:
+                self.injected[status] += 1
+            return status
+
+
+class StubServer:
+    """ThreadingHTTPServer をバックグラウンドスレッドで動かすベースクラス"""
+
+    def __init__(self, handler_cls, host: str = "127.0.0.1", port: int = 0, faults: Optional[FaultPlan] = None) -> None:
+        self.httpd = ThreadingHTTPServer((host, port), handler_cls)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self  # ハンドラから設定値を参照するため
+        self.faults = faults
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self) -> int:
+        with self._count_lock:
+            self.request_count += 1
+            return self.request_count
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:  # noqa: A002 - BaseHTTPRequestHandler の署名に合わせる
+        pass
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body or b"{}")
+
+    def send_json(self, status: int, data: dict, headers: Optional[dict] = None) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def inject_fault(self) -> bool:
+        """stub.faults に従って障害を起こしたら True（呼び出し側は何も返さずに終える）"""
+        plan: Optional[FaultPlan] = self.server.stub.faults
+        status = plan.next_status() if plan is not None else 0
+        if not status:
+            return False
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)  # keep-alive の接続を次のリクエストで使えるように読み捨てる
+        if status < 0:
+            time.sleep(plan.hang_sec)
+            self.close_connection = True
+            return True
+        headers = {"Retry-After": f"{plan.retry_after:g}"} if status == 429 and plan.retry_after is not None else None
+        self.send_json(status, {"error": {"code": status, "message": "injected fault"}}, headers)
+        return True
+
+
+class _ImagenHandler(_QuietHandler):
+    def do_POST(self) -> None:  # noqa: N802 - http.server の命名規則
+        stub: MockImagenServer = self.server.stub
+        stub.count_request()
+        if self.inject_fault():
+            return
+        payload = self.read_json()
+        instances = payload.get("instances", [])
+        if stub.max_instances and len(instances) > stub.max_instances:
+            self.send_json(400, {"error": {"code": 400, "message": f"at most {stub.max_instances} instances"}})
+            return
+        sample_count = int(payload.get("parameters", {}).get("sampleCount", 1) or 1)
+        time.sleep(stub.latency + stub.per_image_latency * len(instances) * sample_count)
+
+        image_b64 = base64.b64encode(stub.image_bytes).decode("ascii")
+        # 安全フィルタに掛かった画像は、実際の API と同じく predictions から黙って抜け落ちる
+        predictions = [
+            {"bytesBase64Encoded": image_b64, "mimeType": "image/png"}
+            for instance in instances
+            if not any(word in instance.get("prompt", "") for word in stub.filtered_words)
+            for _ in range(sample_count)
+        ]
+        self.send_json(200, {"predictions": predictions})
+
+
+class MockImagenServer(StubServer):
+    """Vertex AI Imagen の :predict を模したスタブ（latency 秒だけ待ってから PNG を返す）
+
+    per_image_latency は 1 枚ごとに足す生成時間、max_instances を超える instances は 400、
+    filtered_words を含むプロンプトの画像は predictions から落とす（安全フィルタの再現）。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        *,
+        image_bytes: bytes = TINY_PNG,
+        per_image_latency: float = 0.0,
+        max_instances: int = 0,
+        filtered_words: Sequence[str] = (),
+        **kwargs,
+    ) -> None:
+        super().__init__(_ImagenHandler, **kwargs)
+        self.latency = latency
+        self.image_bytes = image_bytes
+        self.per_image_latency = per_image_latency
+        self.max_instances = max_instances
+        self.filtered_words = tuple(filtered_words)
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.url}/v1/projects/mock/locations/local/publishers/google/models/imagegeneration@006:predict"
+
+
+# ---------- VOICEVOX ----------
+_PAUSE_CHARS = "、，,。．！？!?"
+
+
+def mock_audio_query(text: str, *, mora_sec: float = 0.12, pause_sec: float = 0.3) -> dict:
+    """1 文字 = 1 モーラとして VOICEVOX 形式の audio_query を組み立てる（句読点はポーズ）"""
+    phrases = []
+    moras: list = []
+    for ch in text:
+        if ch in _PAUSE_CHARS:
+            if moras:
+                pause = {"text": "、", "consonant": None, "consonant_length": None,
+                         "vowel": "pau", "vowel_length": pause_sec, "pitch": 0.0}
+                phrases.append({"moras": moras, "accent": 1, "pause_mora": pause, "is_interrogative": False})
+                moras = []
+            continue
+        if ch.isspace():
+            continue
+        moras.append({"text": ch, "consonant": "k", "consonant_length": mora_sec / 3,
+                      "vowel": "a", "vowel_length": mora_sec * 2 / 3, "pitch": 5.5})
+    if moras:
+        phrases.append({"moras": moras, "accent": 1, "pause_mora": None, "is_interrogative": False})
+    return {
+        "accent_phrases": phrases,
+        "speedScale": 1.0,
+        "pitchScale": 0.0,
+        "intonationScale": 1.0,
+        "volumeScale": 1.0,
+        "prePhonemeLength": 0.1,
+        "postPhonemeLength": 0.1,
+        "outputSamplingRate": 24000,
+        "outputStereo": False,
+        "kana": text,
+    }
+
+
+def mock_synthesis(query: dict) -> bytes:
+    """audio_query の長さどおりの WAV（モーラ区間は正弦波、ポーズと前後は無音）を返す"""
+    import io
+    import math
+    import struct
+    import wave
+
+    rate = int(query.get("outputSamplingRate", 24000))
+    speed = float(query.get("speedScale", 1.0)) or 1.0
+    tone = b"".join(struct.pack("<h", int(6000 * math.sin(2 * math.pi * 440 * n / rate))) for n in range(rate))
+
+    def silence(sec: float) -> bytes:
+        return b"\0\0" * int(round(sec / speed * rate))
+
+    def voiced(sec: float) -> bytes:
+        n = int(round(sec / speed * rate))
+        return (tone * (n // rate + 1))[:2 * n]
+
+    pcm = [silence(query.get("prePhonemeLength", 0.1))]
+    for phrase in query.get("accent_phrases", []):
+        for mora in phrase["moras"]:
+            pcm.append(voiced((mora.get("consonant_length") or 0) + mora["vowel_length"]))
+        if phrase.get("pause_mora"):
+            pcm.append(silence(phrase["pause_mora"]["vowel_length"]))
+    pcm.append(silence(query.get("postPhonemeLength", 0.1)))
+
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"".join(pcm))
+    return buf.getvalue()
+
+
+class _VoicevoxHandler(_QuietHandler):
+    def _params(self) -> dict:
+        from urllib.parse import parse_qs, urlsplit
+
+        return {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server の命名規則
+        if self.path.startswith("/speakers"):
+            self.send_json(200, [{"name": "ずんだもん", "speaker_uuid": "mock",
+                                  "styles": [{"name": "ノーマル", "id": 3}, {"name": "あまあま", "id": 1}]}])
+        else:
+            self.send_json(404, {"detail": "Not Found"})
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server の命名規則
+        stub: MockVoicevoxServer = self.server.stub
+        stub.count_request()  # /audio_query と /synthesis の合計
+        if self.inject_fault():
+            return
+        params = self._params()
+        time.sleep(stub.latency)
+        if self.path.startswith("/audio_query"):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            self.send_json(200, mock_audio_query(params.get("text", "")))
+        elif self.path.startswith("/synthesis"):
+            body = mock_synthesis(self.read_json())
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/wav")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json(404, {"detail": "Not Found"})
+
+
+class MockVoicevoxServer(StubServer):
+    """VOICEVOX エンジンの /speakers・/audio_query・/synthesis を模したスタブ"""
+
+    def __init__(self, latency: float = 0.05, **kwargs) -> None:
+        super().__init__(_VoicevoxHandler, **kwargs)
+        self.latency = latency
@@ -0,0 +1,142 @@
+"""VOICEVOX の audio_query から字幕の表示タイミングを求める
+
+audio_query にはアクセント句ごとのモーラ長（子音 + 母音）と句読点のポーズ長が入っているので、
+音声を解析し直さなくても「どの時刻に何モーラ目を話しているか」が分かる。
+合成時に文ごとのタイミング情報（モーラ長・ポーズ長・章 WAV 内の開始位置）を
+<voice>.timing.json として残し、字幕生成ではそれを読んで割り付けるだけにする。
+
+句読点で区切った字幕の切れ目はポーズ位置にぴったり合い、
+1 つの区切りが長すぎる場合は禁則を守って分割し（makeshorts.subtitles）、文字数の比率に対応するモーラの境目で切る。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from makeshorts.run_journal import write_json_atomic
+from makeshorts.subtitles import segment_text
+
+TIMING_VERSION = 1
+_PAUSE_SPLIT = re.compile(r"[^、，,]*[、，,]+|[^、，,]+")
+
+Cue = Tuple[float, float, str]  # (開始秒, 終了秒, テキスト)
+
+
+@dataclass
+class SentenceTiming:
+    """1 文分のタイミング（秒・話速適用済み）"""
+
+    text: str
+    offset: float  # 章 WAV 内での文の開始位置
+    pre: float
+    phrases: List[Tuple[List[float], float]]  # (モーラ長の並び, 直後のポーズ長)
+
+    @classmethod
+    def from_query(cls, text: str, offset: float, query: dict) -> "SentenceTiming":
+        speed = float(query.get("speedScale", 1.0)) or 1.0
+        phrases = []
+        for phrase in query.get("accent_phrases", []):
+            moras = [((m.get("consonant_length") or 0) + (m.get("vowel_length") or 0)) / speed
+                     for m in phrase.get("moras", [])]
+            pause = phrase.get("pause_mora")
+            phrases.append((moras, (pause.get("vowel_length") or 0) / speed if pause else 0.0))
+        return cls(text, offset, float(query.get("prePhonemeLength", 0.1)) / speed, phrases)
+
+    def to_json(self) -> dict:
+        return {"text": self.text, "offset": round(self.offset, 4), "pre": round(self.pre, 4),
+                "phrases": [[[round(m, 4) for m in moras], round(pause, 4)] for moras, pause in self.phrases]}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "SentenceTiming":
+        return cls(data["text"], data["offset"], data["pre"],
+                   [(list(moras), pause) for moras, pause in data["phrases"]])
+
+    def pause_groups(self) -> List[Tuple[float, List[float]]]:
+        """ポーズで区切った発話のまとまりごとに (開始秒, モーラ終端秒の並び) を返す（文の先頭基準）"""
+        groups: List[Tuple[float, List[float]]] = []
+        t = self.pre
+        start, ends = t, []
+        for moras, pause in self.phrases:
+            for length in moras:
+                t += length
+                ends.append(t)
+            if pause > 0:
+                groups.append((start, ends))
+                t += pause
+                start, ends = t, []
+        if ends:
+            groups.append((start, ends))
+        return groups
+
+
+def sentence_cues(timing: SentenceTiming, max_chars: int = 24) -> List[Cue]:
+    """1 文の字幕を (開始, 終了, テキスト) で返す（時刻は章 WAV の先頭基準）"""
+    text = timing.text.strip()
+    segments = [s.strip() for s in _PAUSE_SPLIT.findall(text) if s.strip()]
+    groups = [g for g in timing.pause_groups() if g[1]]
+    if not groups:
+        return []
+    if len(segments) != len(groups):
+        # 句読点とポーズが対応しない（読み上げ側で句が結合された等）ときは文全体を 1 区切りとして扱う
+        segments = [text]
+        groups = [(groups[0][0], [end for _, ends in groups for end in ends])]
+
+    cues: List[Cue] = []
+    for segment, (start, ends) in zip(segments, groups):
+        pieces = segment_text(segment, max_chars) if len(segment) > max_chars else [segment]
+        if len(pieces) > len(ends):
+            pieces = [segment]
+        total = sum(len(p) for p in pieces)
+        chars = 0
+        mora = 0
+        piece_start = start
+        for i, piece in enumerate(pieces):
+            chars += len(piece)
+            # 文字数の比率に対応するモーラの終わりで切る（各字幕に最低 1 モーラ）
+            mora = max(mora + 1, min(len(ends) - (len(pieces) - 1 - i), round(chars / total * len(ends))))
+            piece_end = ends[-1] if i == len(pieces) - 1 else ends[mora - 1]
+            cues.append((piece_start, piece_end, piece))
+            piece_start = piece_end
+
+    # 文の途中のポーズでは次の字幕が出るまで前の字幕を残す
+    held = [(st, cues[i + 1][0], seg) for i, (st, _, seg) in enumerate(cues[:-1])]
+    held.append(cues[-1])
+    return [(timing.offset + st, timing.offset + en, seg) for st, en, seg in held]
+
+
+def chapter_cues(sentences: Iterable[SentenceTiming], max_chars: int = 24) -> List[Cue]:
+    cues: List[Cue] = []
+    for sentence in sentences:
+        cues.extend(sentence_cues(sentence, max_chars))
+    return cues
+
+
+# ---------- サイドカーファイル ----------
+def timing_path(wav_path: str) -> str:
+    return os.path.splitext(wav_path)[0] + ".timing.json"
+
+
+def write_timing(wav_path: str, sentences: Sequence[SentenceTiming]) -> None:
+    """合成直後の章 WAV に対応するタイミング情報を書き出す（WAV のサイズで対応を確認する）"""
+    data = {
+        "version": TIMING_VERSION,
+        "wav_size": os.path.getsize(wav_path),
+        "sentences": [s.to_json() for s in sentences],
+    }
+    write_json_atomic(timing_path(wav_path), data, indent=None)
+
+
+def read_timing(wav_path: str) -> Optional[List[SentenceTiming]]:
+    """WAV と対応するタイミング情報があれば返す（手で差し替えられた WAV なら None）"""
+    try:
+        with open(timing_path(wav_path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != TIMING_VERSION or data.get("wav_size") != os.path.getsize(wav_path):
+            return None
+        return [SentenceTiming.from_json(s) for s in data["sentences"]]
+    except (OSError, ValueError, KeyError):
+        return None
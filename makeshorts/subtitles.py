@@ -0,0 +1,229 @@
+"""日本語ナレーションの字幕分割と、SRT / WebVTT / CapCut 字幕クリップの一括出力
+
+1. 事前コンパイルした正規表現で 1 回だけトークン化する（漢字・ひらがな・カタカナ・英数字・約物の連なり）
+2. 禁則（行頭禁則：句読点・閉じ括弧・小書き仮名・長音、行末禁則：開き括弧）を満たす切れ目だけを候補にし、
+   文末 > 読点・括弧の前 > ひらがなから別の文字種へ変わる所（助詞の後）> その他 の優先度で選ぶ。
+   漢字と送り仮名の間（生|み）と、漢字に挟まれた送り仮名の後（生み|出す）では切らない。
+   切れ目の前後どちらかが MIN_CHARS 文字未満になる候補は選ばない（文末までの残りは先に数えておく）
+3. 表示時間は均等割りではなく推定モーラ数（＋句読点の間）の比で配分する
+
+どの処理も文字列を先頭から 1 回なめるだけなので、全体の計算量は文字数に対して線形。
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_MAX_CHARS = 24
+MIN_CHARS = 4  # これより短い字幕になる切れ目は選ばない（切れ目の前も、文末までの残りも）
+
+NO_LINE_START = set("、。，．,.！？!?・：；:;…‥ー々ゝゞヽヾ」』）)】〕〉》］]｝}”’ぁぃぅぇぉっゃゅょゎァィゥェォッャュョヮヵヶ")
+NO_LINE_END = set("「『（(【〔〈《［[｛{“‘")
+SMALL_KANA = set("ぁぃぅぇぉゃゅょゎァィゥェォャュョヮ")  # 直前の仮名と 1 モーラになる
+# 漢字に挟まれた 1 文字のひらがなは、これ以外なら複合語の送り仮名（生み出す・取り組む）とみなす
+PARTICLES = set("はがをにでとへものや")
+
+_TOKEN = re.compile(
+    r"(?P<open>[「『（(【〔〈《［\[｛{“‘])"
+    r"|(?P<close>[」』）)】〕〉》］\]｝}”’])"
+    r"|(?P<stop>[。．！？!?…‥]+|\.(?=\s|$))"
+    r"|(?P<comma>[、，,・：；:;])"
+    r"|(?P<kanji>[㐀-䶿一-鿿々〆〇]+)"
+    r"|(?P<hira>[ぁ-ゟー]+)"
+    r"|(?P<kata>[゠-ヿｦ-ﾟー]+)"
+    r"|(?P<latin>[0-9A-Za-z０-９Ａ-Ｚａ-ｚ][0-9A-Za-z０-９Ａ-Ｚａ-ｚ'’.%％\-]*)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>.)",
+    re.S,
+)
+
+# 切れ目の優先度（大きいほど優先）
+_BREAK_SENTENCE = 4
+_BREAK_COMMA = 3
+_BREAK_BRACKET = 2
+_BREAK_PARTICLE = 1
+_BREAK_ANY = 0
+
+# 推定モーラ数（1 文字あたり）と句読点の間（モーラ換算）
+_MORA_PER_CHAR = {"kanji": 1.8, "hira": 1.0, "kata": 1.0, "latin": 0.6, "other": 1.0}
+_PAUSE_MORAS = {"comma": 2.0, "stop": 4.0}
+
+
+@dataclass
+class Cue:
+    start: float
+    end: float
+    text: str
+
+
+def _tokens(text: str) -> Iterator[Tuple[str, str]]:
+    for m in _TOKEN.finditer(text):
+        yield m.lastgroup, m.group()
+
+
+def _break_priority(prev_kind: str, kind: str, token: str, prev: str, before: str = "") -> Optional[int]:
+    """prev と token の間で切れるなら優先度、禁則・送り仮名で切れないなら None（before は prev の前のトークンの種類）"""
+    if token[0] in NO_LINE_START or prev[-1] in NO_LINE_END or kind == "space":
+        return None
+    if prev_kind == "kanji" and kind == "hira":
+        return None  # 送り仮名・漢字語に付いた助詞
+    if before == "kanji" and prev_kind == "hira" and kind == "kanji" and len(prev) == 1 and prev not in PARTICLES:
+        return None  # 生み|出す・取り|組む のような複合語の途中
+    if prev_kind == "stop":
+        return _BREAK_SENTENCE
+    if prev_kind in ("comma", "space"):
+        return _BREAK_COMMA
+    if kind == "open" or (prev_kind == "close" and kind != "hira"):  # 閉じ括弧直後の助詞（」は 等）では切らない
+        return _BREAK_BRACKET
+    if prev_kind == "hira" and kind in ("kanji", "kata", "latin"):
+        return _BREAK_PARTICLE
+    return _BREAK_ANY
+
+
+def _sentence_rest(tokens: Sequence[Tuple[str, str]]) -> List[int]:
+    """各トークンから、必ず切れる所（文末・改行）までの文字数（そのトークン自身を含む）"""
+    rest = [0] * (len(tokens) + 1)
+    for j in range(len(tokens) - 1, -1, -1):
+        kind, token = tokens[j]
+        if kind == "space" and "\n" in token:
+            continue  # 改行の手前で切れる
+        after = rest[j + 1]
+        if kind == "stop" and j + 1 < len(tokens):
+            next_kind, next_token = tokens[j + 1]
+            if next_kind != "space" and next_token[0] not in NO_LINE_START:
+                after = 0
+        rest[j] = len(token) + after
+    return rest
+
+
+def estimate_moras(text: str) -> float:
+    """字幕 1 つ分の読み上げ量の目安（モーラ数 + 句読点の間）"""
+    total = 0.0
+    for kind, token in _tokens(text):
+        if kind in _PAUSE_MORAS:
+            total += _PAUSE_MORAS[kind]
+        elif kind in ("hira", "kata"):
+            total += len(token) - sum(1 for ch in token if ch in SMALL_KANA)
+        elif kind in _MORA_PER_CHAR:
+            total += len(token) * _MORA_PER_CHAR[kind]
+    return max(total, 1.0)
+
+
+def _split_long_token(token: str, max_chars: int) -> List[str]:
+    """1 トークンが上限を超えるときの最終手段（行頭禁則の文字は前の塊に寄せる）"""
+    pieces = []
+    start = 0
+    while len(token) - start > max_chars:
+        cut = start + max_chars
+        while cut > start + 1 and token[cut] in NO_LINE_START:
+            cut -= 1
+        pieces.append(token[start:cut])
+        start = cut
+    pieces.append(token[start:])
+    return pieces
+
+
+def segment_text(text: str, max_chars: int = DEFAULT_MAX_CHARS) -> List[str]:
+    """禁則を守りつつ max_chars 以内の字幕テキストに分割する（文末では必ず切る）"""
+    text = text.replace("\r", "")
+    pieces: List[str] = []
+    buf: List[str] = []  # 現在の字幕に入っているトークン
+    buf_len = 0
+    # (buf 内のトークン位置, そこまでの文字数, 優先度)
+    candidates: List[Tuple[int, int, int]] = []
+    prev_kind, prev, before = "", "", ""
+    tokens = list(_tokens(text))
+    rest = _sentence_rest(tokens)
+
+    def flush(upto: int) -> None:
+        nonlocal buf, buf_len, candidates
+        piece = "".join(buf[:upto]).strip()
+        if piece:
+            pieces.append(piece)
+        rest = buf[upto:]
+        cut_len = buf_len - sum(len(t) for t in rest)
+        buf = rest
+        buf_len -= cut_len
+        candidates = [(i - upto, n - cut_len, p) for i, n, p in candidates if i > upto]
+
+    for j, (kind, token) in enumerate(tokens):
+        if kind == "space" and "\n" in token:
+            # 改行は文の区切りとして扱う
+            flush(len(buf))
+            prev_kind, prev, before = "stop", "。", ""
+            continue
+        priority = _break_priority(prev_kind, kind, token, prev, before) if buf else None
+        if priority == _BREAK_SENTENCE:
+            flush(len(buf))
+        elif priority is not None:
+            candidates.append((len(buf), buf_len, priority))
+
+        chunks = _split_long_token(token, max_chars) if len(token) > max_chars else [token]
+        for i, chunk in enumerate(chunks):
+            if i > 0:
+                candidates.append((len(buf), buf_len, _BREAK_ANY))
+            while buf_len + len(chunk) > max_chars and buf:
+                # 切れ目から文末までの残りが短すぎる候補は使わない（「出す。」だけの字幕を作らない）
+                tail_ok = [c for c in candidates if buf_len - c[1] + rest[j] >= MIN_CHARS]
+                usable = [c for c in tail_ok if c[1] >= MIN_CHARS] or tail_ok
+                if usable:
+                    # 優先度が最も高い切れ目のうち、いちばん後ろのもの
+                    best = max(usable, key=lambda c: (c[2], c[1]))
+                    flush(best[0])
+                else:
+                    # 禁則で切れる所が無い（括弧内の長い語など）か、切ると文末が短く残る。上限を越えて延ばす
+                    break
+            buf.append(chunk)
+            buf_len += len(chunk)
+        prev_kind, prev, before = kind, token, prev_kind
+    flush(len(buf))
+    return pieces
+
+
+def time_cues(pieces: Sequence[str], start: float, duration: float) -> List[Cue]:
+    """推定モーラ数の比で start から duration 秒を配分する（最後の字幕は必ず終端まで）"""
+    if not pieces:
+        return []
+    weights = [estimate_moras(p) for p in pieces]
+    total = sum(weights)
+    cues = []
+    acc = 0.0
+    for i, (piece, weight) in enumerate(zip(pieces, weights)):
+        st = start + duration * acc / total
+        acc += weight
+        en = start + duration if i == len(pieces) - 1 else start + duration * acc / total
+        cues.append(Cue(st, en, piece))
+    return cues
+
+
+def segment_and_time(text: str, start: float, duration: float, max_chars: int = DEFAULT_MAX_CHARS) -> List[Cue]:
+    return time_cues(segment_text(text, max_chars), start, duration)
+
+
+# ---------- 出力 ----------
+def _clock(sec: float, sep: str) -> str:
+    ms = int(round(max(0.0, sec) * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}{sep}{ms % 1000:03d}"
+
+
+def render_cues(cues: Sequence[Cue], style: dict, fps: int) -> Tuple[str, str, List[dict]]:
+    """1 回の走査で SRT・WebVTT のテキストと CapCut 字幕クリップを作る
+
+    CapCut 用はフレーム境界にそろえ、隣り合う字幕が丸め誤差で重ならないようにする。
+    """
+    srt: List[str] = []
+    vtt: List[str] = ["WEBVTT", ""]
+    clips: List[dict] = []
+    for no, cue in enumerate(cues, 1):
+        srt.append(f"{no}\n{_clock(cue.start, ',')} --> {_clock(cue.end, ',')}\n{cue.text}\n")
+        vtt.append(f"{_clock(cue.start, '.')} --> {_clock(cue.end, '.')}\n{cue.text}\n")
+        st_f, en_f = int(round(cue.start * fps)), int(round(cue.end * fps))
+        clips.append({
+            "start": round(st_f / fps, 3),
+            "duration": round((en_f - st_f) / fps, 3),
+            "text": cue.text,
+            "style": style,
+        })
+    return "\n".join(srt) + ("\n" if srt else ""), "\n".join(vtt), clips
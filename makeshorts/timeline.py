@@ -0,0 +1,75 @@
+"""整数フレームで位置を持つタイムラインの基礎処理
+
+秒の浮動小数を足し込んでいくと章の境目で誤差がたまるため、
+クリップの開始・長さはすべて FPS 基準の整数フレームで計算し、書き出し直前に秒へ変換する。
+章の開始位置は累積和（prefix sum）で一度に求めるので、章数に対して線形で済む。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable, List, Sequence, Tuple
+
+
+def sec2frame(sec: float, fps: int) -> int:
+    return int(round(float(sec) * fps))
+
+
+def frame2sec(frame: int, fps: int) -> float:
+    return round(frame / fps, 3)
+
+
+def prefix_offsets(lengths: Sequence[int], lead: int = 0) -> List[int]:
+    """offsets[i] が i 番目の開始フレーム、offsets[-1] が全体の終端になる累積和"""
+    offsets = [lead]
+    for length in lengths:
+        offsets.append(offsets[-1] + length)
+    return offsets
+
+
+def split_frames(total: int, parts: int) -> List[int]:
+    """total フレームを parts 個に分け、端数は最後に吸収させる（合計は必ず total）"""
+    parts = max(1, parts)
+    base = total // parts
+    lengths = [base] * parts
+    lengths[-1] += total - base * parts
+    return lengths
+
+
+@dataclass
+class TimelineIssue:
+    track: str
+    kind: str  # "gap" / "overlap"
+    start_frame: int
+    end_frame: int
+
+    def describe(self, fps: int) -> str:
+        label = "すき間" if self.kind == "gap" else "重なり"
+        return (
+            f"{self.track}: {label} {frame2sec(self.start_frame, fps)}s - {frame2sec(self.end_frame, fps)}s"
+            f" ({self.end_frame - self.start_frame}f)"
+        )
+
+
+def validate_track(
+    track: str,
+    spans: Iterable[Tuple[int, int]],
+    *,
+    max_overlap: int = 0,
+    allow_gaps: bool = False,
+) -> List[TimelineIssue]:
+    """(開始フレーム, 長さ) の並びを開始順にソートし、1 回の走査ですき間と重なりを検出する
+
+    max_overlap まではクロスフェード等の意図した重なりとして許容する。
+    """
+    issues: List[TimelineIssue] = []
+    covered_end = None
+    for start, length in sorted(spans):
+        end = start + length
+        if covered_end is not None:
+            if start < covered_end and covered_end - start > max_overlap:
+                issues.append(TimelineIssue(track, "overlap", start, min(end, covered_end)))
+            elif start > covered_end and not allow_gaps:
+                issues.append(TimelineIssue(track, "gap", covered_end, start))
+        covered_end = end if covered_end is None else max(covered_end, end)
+    return issues
@@ -0,0 +1,396 @@
+"""Gemini・Vertex Imagen・VOICEVOX の各クライアントが共有する通信層
+
+- エンドポイントごとのトークンバケット（同じプロセス内の全クライアント・全スレッドで共有）
+- 429 / 5xx / タイムアウト / 接続断は指数バックオフ + ジッタで再試行（Retry-After があればそれに従う）
+- 429 を受けたら同じエンドポイントのバケット全体を止めるので、バッチ全体が減速する
+- 5xx・通信エラーが続いたらサーキットブレーカーを開き、一定時間は即座に失敗させる
+- 失敗は文字列ではなく型付きの例外（TransportError の派生）で返す
+
+HTTP は Transport.request()、SDK 呼び出し（vertexai など）は retry_call() で包む。
+"""
+
+from __future__ import annotations
+
+import email.utils
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+T = TypeVar("T")
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SEC = 30.0
+
+
+# ---------- 例外 ----------
+class TransportError(RuntimeError):
+    """通信層の失敗（retryable なものは再試行し尽くした後に送出される）"""
+
+    retryable = False
+    trips_breaker = False  # サーキットブレーカーの失敗として数えるか
+
+    def __init__(
+        self,
+        message: str,
+        *,
+        endpoint: str = "",
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        super().__init__(message)
+        self.endpoint = endpoint
+        self.status = status
+        self.retry_after = retry_after
+        self.attempts = 0
+
+    def __str__(self) -> str:
+        text = super().__str__()
+        where = f"{self.endpoint} " if self.endpoint else ""
+        status = f"HTTP {self.status}: " if self.status else ""
+        tries = f"（{self.attempts} 回試行）" if self.attempts > 1 else ""
+        return f"{where}{status}{text}{tries}"
+
+
+class ClientError(TransportError):
+    """4xx（認証・権限・リクエスト不正）。再試行しても直らない"""
+
+
+class RateLimitError(TransportError):
+    """429。Retry-After があればその秒数だけ待ってから再試行する"""
+
+    retryable = True
+
+
+class ServerError(TransportError):
+    """5xx"""
+
+    retryable = True
+    trips_breaker = True
+
+
+class NetworkError(TransportError):
+    """タイムアウト・接続断・応答の途中切れ"""
+
+    retryable = True
+    trips_breaker = True
+
+
+class CircuitOpenError(TransportError):
+    """失敗が続いたためエンドポイントへの送信を止めている"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After（秒数または HTTP 日付）を秒に直す"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def error_for_status(status: int, message: str, *, endpoint: str = "", retry_after: Optional[float] = None) -> TransportError:
+    if status == 429:
+        cls = RateLimitError
+    elif status in RETRY_STATUSES or status >= 500:
+        cls = ServerError
+    else:
+        cls = ClientError
+    return cls(message, endpoint=endpoint, status=status, retry_after=retry_after)
+
+
+def check_response(response: requests.Response, endpoint: str = "") -> requests.Response:
+    """2xx / 3xx ならそのまま返し、それ以外は本文の先頭を添えた TransportError にする"""
+    if response.status_code < 400:
+        return response
+    try:
+        body = response.text[:200]
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    finally:
+        response.close()
+    raise error_for_status(response.status_code, body or response.reason or "", endpoint=endpoint, retry_after=retry_after)
+
+
+def classify_exception(exc: BaseException, endpoint: str = "") -> Optional[TransportError]:
+    """例外を TransportError に分類する（通信と無関係な例外なら None）"""
+    if isinstance(exc, TransportError):
+        return exc
+    if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                        requests.exceptions.ChunkedEncodingError, TimeoutError, ConnectionError)):
+        return NetworkError(f"{type(exc).__name__}: {exc}", endpoint=endpoint)
+    # google.api_core の例外は HTTP ステータスを code に持つ（SDK を import せずに判定する）
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and 400 <= code < 600:
+        return error_for_status(code, f"{type(exc).__name__}: {exc}", endpoint=endpoint)
+    if type(exc).__name__ in ("DeadlineExceeded", "ServiceUnavailable", "RetryError"):
+        return NetworkError(f"{type(exc).__name__}: {exc}", endpoint=endpoint)
+    return None
+
+
+# ---------- レート制限・ブレーカー ----------
+class TokenBucket:
+    """毎秒 rate 個補充され、最大 burst 個まで貯まるトークンバケット（rate=0 なら無制限）
+
+    トークンが無ければ予約してから待つので、待ち行列の順に均等な間隔で送信される。
+    pause() を呼ぶとその時刻まで全員を止める（429 の Retry-After を全スレッドに効かせる）。
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = 1.0,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = max(0.0, rate)
+        self.capacity = max(1.0, burst)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """トークンを 1 つ予約し、送信してよい時刻までの待ち秒数を返す"""
+        with self._lock:
+            now = self.clock()
+            wait = max(0.0, self._paused_until - now)
+            if self.rate:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            self.sleep(wait)
+
+    def pause(self, sec: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, self.clock() + sec)
+
+
+class CircuitBreaker:
+    """連続失敗が threshold 回に達したら reset_sec の間は送信を止め、その後 1 件だけ試す（half-open）"""
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_sec: float = DEFAULT_RESET_SEC,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_sec = reset_sec
+        self.clock = clock
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if self.clock() - self._opened_at >= self.reset_sec else "open"
+
+    def allow(self, endpoint: str = "") -> bool:
+        """送信してよければ返り、half-open の試しの 1 件なら True を返す（止めている間は CircuitOpenError）"""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self.reset_sec - (self.clock() - self._opened_at)
+            if remaining <= 0 and not self._trial:
+                self._trial = True  # half-open: 1 件だけ通す
+                return True
+            raise CircuitOpenError(
+                f"連続 {self.failures} 回失敗したため送信を止めています（残り {max(0.0, remaining):.0f}s）",
+                endpoint=endpoint,
+            )
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+            self._trial = False
+
+    def release_trial(self, *, failed: bool) -> None:
+        """試しの 1 件が success() / failure() 以外で終わったときに呼ぶ（429・4xx・通信と無関係な例外・中断）
+
+        failed なら reset_sec 後にもう一度試す。送信先は応答した（4xx や応答の検証エラー）なら閉じる。
+        どちらでも試し中の印は外すので、ブレーカーが開いたまま固まることはない。
+        """
+        with self._lock:
+            if not self._trial:
+                return
+            self._trial = False
+            if failed:
+                self._opened_at = self.clock()
+            else:
+                self.failures = 0
+                self._opened_at = None
+
+
+class Endpoint:
+    """送信先 1 つ分のレート制限とブレーカー"""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        requests_per_minute: float = 0,
+        burst: float = 1.0,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_sec: float = DEFAULT_RESET_SEC,
+    ) -> None:
+        self.name = name
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_sec)
+
+
+_ENDPOINTS: Dict[str, Endpoint] = {}
+_ENDPOINTS_LOCK = threading.Lock()
+
+
+def get_endpoint(name: str, *, requests_per_minute: float = 0, burst: float = 1.0) -> Endpoint:
+    """プロセス内で共有される Endpoint を返す（制限値は最初に作られたときのものが使われる）"""
+    with _ENDPOINTS_LOCK:
+        endpoint = _ENDPOINTS.get(name)
+        if endpoint is None:
+            endpoint = _ENDPOINTS[name] = Endpoint(name, requests_per_minute=requests_per_minute, burst=burst)
+        return endpoint
+
+
+# ---------- 再試行 ----------
+@dataclass
+class RetryPolicy:
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    base_delay: float = DEFAULT_BASE_DELAY
+    max_delay: float = DEFAULT_MAX_DELAY
+    max_retry_after: float = 300.0  # これより長い Retry-After は待たずに失敗させる
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=int(os.getenv("MAKESHORTS_RETRY_MAX", DEFAULT_MAX_ATTEMPTS)),
+            base_delay=float(os.getenv("MAKESHORTS_RETRY_BASE_SEC", DEFAULT_BASE_DELAY)),
+        )
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """attempt 回目の失敗後に待つ秒数（Retry-After 優先。無ければ指数バックオフの半分 + ランダム）"""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def retry_call(
+    endpoint: Endpoint,
+    fn: Callable[[], T],
+    policy: Optional[RetryPolicy] = None,
+    *,
+    sleep: Callable[[float], None] = time.sleep,
+) -> T:
+    """fn() をレート制限・ブレーカー付きで呼び、再試行できる失敗なら繰り返す
+
+    通信と無関係な例外（応答の検証エラーなど）はそのまま送出し、再試行しない。
+    """
+    policy = policy or RetryPolicy.from_env()
+    attempt = 0
+    while True:
+        attempt += 1
+        trial = endpoint.breaker.allow(endpoint.name)
+        settled = False  # ブレーカーに success() / failure() を伝えたか
+        trial_failed = True  # 試しの 1 件が未決着で終わったとき、もう一度 reset_sec 待つか
+        try:
+            endpoint.bucket.acquire()
+            try:
+                result = fn()
+            except Exception as exc:
+                error = classify_exception(exc, endpoint.name)
+                if error is None:
+                    trial_failed = False  # 応答の検証エラーなど（送信先は応答している）
+                    raise
+                error.endpoint = error.endpoint or endpoint.name
+                error.attempts = attempt
+                if error.trips_breaker:
+                    endpoint.breaker.failure()
+                    settled = True
+                else:
+                    trial_failed = error.retryable  # 429 は待ち直し、4xx は送信先が応答している
+                if not error.retryable or attempt >= policy.max_attempts:
+                    raise error from (None if error is exc else exc)
+                if error.retry_after is not None and error.retry_after > policy.max_retry_after:
+                    raise error from (None if error is exc else exc)
+                wait = policy.delay(attempt, error.retry_after)
+                if isinstance(error, RateLimitError):
+                    endpoint.bucket.pause(wait)  # 同じ送信先を使う他のスレッドも一緒に待たせる
+                print(f"⚠️ {error} → {wait:.1f}s 後に再試行（{attempt}/{policy.max_attempts}）")
+            else:
+                endpoint.breaker.success()
+                settled = True
+                return result
+        finally:
+            if trial and not settled:
+                endpoint.breaker.release_trial(failed=trial_failed)
+        sleep(wait)
+
+
+class Transport:
+    """requests.Session に retry_call を被せた HTTP クライアント"""
+
+    def __init__(
+        self,
+        endpoint: Endpoint,
+        *,
+        session: Optional[requests.Session] = None,
+        policy: Optional[RetryPolicy] = None,
+        pool_maxsize: int = 4,
+    ) -> None:
+        self.endpoint = endpoint
+        self.policy = policy or RetryPolicy.from_env()
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_maxsize))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+    def call(self, fn: Callable[[], T]) -> T:
+        return retry_call(self.endpoint, fn, self.policy)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """成功した応答だけを返す（失敗は TransportError）"""
+        return self.call(lambda: check_response(self.session.request(method, url, **kwargs), self.endpoint.name))
+
+    def close(self) -> None:
+        self.session.close()
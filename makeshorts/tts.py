@@ -0,0 +1,270 @@
+"""VOICEVOX エンジンで章ナレーションを合成する TTS クライアント
+
+ナレーションを文単位に分け、/audio_query → /synthesis を文ごとにスレッドプールで並列に実行する。
+合成結果（WAV とその audio_query）は (テキスト, 話者, 話速) のハッシュでディスクにキャッシュするので、
+章を一部書き換えても合成し直すのは変わった文だけで済む。
+章の WAV は各文の PCM フレームをそのまま連結して 1 つのヘッダを付け直すだけで、再エンコードはしない。
+連結と同時に各文の開始位置とモーラ長を <id>.timing.json に残し、字幕のタイミングに使う。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from makeshorts.image_cache import ImageCache
+from makeshorts.subtitle_timing import SentenceTiming, write_timing
+from makeshorts.transport import Transport, get_endpoint
+
+DEFAULT_ENGINE_URL = "http://127.0.0.1:50021"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "makeshorts", "voice")
+DEFAULT_MAX_MB = 1024
+
+_SENTENCE_END = re.compile(r"[^。．！？!?\n]*[。．！？!?]+[」』）)]*|[^。．！？!?\n]+")
+
+
+def split_sentences(text: str) -> List[str]:
+    """句点・感嘆符・疑問符・改行で文に分ける（閉じ括弧は前の文に含める）"""
+    return [s.strip() for s in _SENTENCE_END.findall(text.replace("\r", "")) if s.strip()]
+
+
+def sentence_key(text: str, speaker: int, speed: float) -> str:
+    return hashlib.sha256(f"{speaker}\n{speed:.3f}\n{text}".encode("utf-8")).hexdigest()
+
+
+class VoiceCache(ImageCache):
+    """文ごとの合成 WAV と audio_query（.json）を保存する LRU キャッシュ"""
+
+    suffix = ".wav"
+
+    def __init__(self, root: Optional[str] = None, *, max_bytes: Optional[int] = None) -> None:
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("MAKESHORTS_VOICE_CACHE_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        super().__init__(root or os.getenv("MAKESHORTS_VOICE_CACHE", DEFAULT_CACHE_DIR), max_bytes=max_bytes)
+
+    def load(self, key: str) -> Optional[Tuple[bytes, dict]]:
+        wav_path = self.path_for(key)
+        try:
+            os.utime(wav_path)  # LRU 更新
+            with open(wav_path.with_suffix(".json"), "r", encoding="utf-8") as f:
+                query = json.load(f)
+            return wav_path.read_bytes(), query
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key: str, wav: bytes, query: dict) -> None:
+        wav_path = self.path_for(key)
+        wav_path.parent.mkdir(parents=True, exist_ok=True)
+        suffix = f".{threading.get_ident()}.tmp"
+        # クエリを先に置き、WAV の出現をもって完成とみなす
+        tmp = wav_path.with_suffix(".json" + suffix)
+        tmp.write_text(json.dumps(query, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, wav_path.with_suffix(".json"))
+        tmp = wav_path.with_suffix(".wav" + suffix)
+        tmp.write_bytes(wav)
+        os.replace(tmp, wav_path)
+
+    def _remove(self, entry: Path) -> None:
+        super()._remove(entry)
+        super()._remove(entry.with_suffix(".json"))
+
+
+@dataclass
+class Sentence:
+    """1 文分の合成結果"""
+
+    text: str
+    wav: bytes
+    query: dict
+    cached: bool = False
+
+
+@dataclass
+class ChapterVoice:
+    """章 1 つ分の合成結果"""
+
+    path: str
+    sentences: List[Sentence] = field(default_factory=list)
+    duration: float = 0.0
+    elapsed: float = 0.0
+
+    @property
+    def cached(self) -> int:
+        return sum(1 for s in self.sentences if s.cached)
+
+
+def stitch_wavs(parts: Sequence[bytes], out_path: str) -> List[float]:
+    """同一形式の WAV を PCM フレームのまま連結して out_path に書く
+
+    各パートの開始位置（秒）と末尾を並べた累積和（長さ len(parts) + 1）を返す。
+    """
+    params = None
+    frames = 0
+    starts = []
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp_path = f"{out_path}.part"
+    with wave.open(tmp_path, "wb") as out:
+        for part in parts:
+            with wave.open(io.BytesIO(part), "rb") as src:
+                current = (src.getnchannels(), src.getsampwidth(), src.getframerate())
+                if params is None:
+                    params = current
+                    out.setnchannels(current[0])
+                    out.setsampwidth(current[1])
+                    out.setframerate(current[2])
+                elif current != params:
+                    raise ValueError(f"WAV の形式が一致しません: {current} != {params}")
+                n = src.getnframes()
+                starts.append(frames)
+                out.writeframesraw(src.readframes(n))
+                frames += n
+        if params is None:
+            raise ValueError("連結する WAV がありません")
+    os.replace(tmp_path, out_path)
+    return [f / params[2] for f in starts + [frames]]
+
+
+class VoicevoxClient:
+    """スレッドプール + コネクションプール付き Session で VOICEVOX エンジンに合成を依頼する"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        *,
+        max_workers: int = 4,
+        timeout: float = 60,
+        cache: Optional[VoiceCache] = None,
+        refresh: bool = False,
+    ) -> None:
+        self.base_url = (base_url or os.getenv("MAKESHORTS_VOICEVOX_URL", DEFAULT_ENGINE_URL)).rstrip("/")
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.cache = cache
+        self.refresh = refresh
+        self._speakers: Optional[Dict[str, int]] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()  # 章ごとのタスクから同時に呼ばれても話者一覧・プールは 1 つだけ作る
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # エンジンが混んでいる（5xx・接続断）ときは待って再試行し、落ちていればブレーカーで早めに諦める
+        self.transport = Transport(get_endpoint(f"voicevox:{self.base_url}"), session=self.session)
+
+    def close(self) -> None:
+        """プールの完了を待ってからキャッシュの容量調整を行い、Session を閉じる"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            if self.cache is not None:
+                self.cache.evict()
+        self.session.close()
+
+    def __enter__(self) -> "VoicevoxClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---------- エンジン API ----------
+    def speaker_id(self, speaker: Union[int, str]) -> int:
+        """話者名（"ずんだもん" / "ずんだもん:あまあま"）またはスタイル ID を ID に解決する"""
+        if isinstance(speaker, int) or str(speaker).isdigit():
+            return int(speaker)
+        if self._speakers is None:
+            response = self.transport.request("GET", f"{self.base_url}/speakers", timeout=self.timeout)
+            speakers: Dict[str, int] = {}
+            for entry in response.json():
+                for index, style in enumerate(entry.get("styles", [])):
+                    speakers[f"{entry['name']}:{style['name']}"] = style["id"]
+                    if index == 0:
+                        speakers[entry["name"]] = style["id"]
+            self._speakers = speakers
+        try:
+            return self._speakers[speaker]
+        except KeyError:
+            raise ValueError(f"VOICEVOX に話者がいません: {speaker}") from None
+
+    def audio_query(self, text: str, speaker: int) -> dict:
+        response = self.transport.request(
+            "POST",
+            f"{self.base_url}/audio_query",
+            params={"text": text, "speaker": speaker},
+            timeout=self.timeout,
+        )
+        return response.json()
+
+    def synthesis(self, query: dict, speaker: int) -> bytes:
+        response = self.transport.request(
+            "POST",
+            f"{self.base_url}/synthesis",
+            params={"speaker": speaker},
+            json=query,
+            timeout=self.timeout,
+        )
+        return response.content
+
+    # ---------- 合成 ----------
+    def synthesize(self, text: str, speaker: Union[int, str], speed: float = 1.0) -> Sentence:
+        """1 文を合成する（キャッシュにあればエンジンを使わない）"""
+        speaker_id = self.speaker_id(speaker)
+        key = sentence_key(text, speaker_id, speed) if self.cache is not None else None
+        if key and not self.refresh:
+            hit = self.cache.load(key)
+            if hit is not None:
+                return Sentence(text, hit[0], hit[1], cached=True)
+
+        query = self.audio_query(text, speaker_id)
+        query["speedScale"] = speed
+        wav = self.synthesis(query, speaker_id)
+        if key:
+            self.cache.save(key, wav, query)
+        return Sentence(text, wav, query)
+
+    def synthesize_chapters(
+        self,
+        chapters: Sequence[Tuple[str, str]],
+        speaker: Union[int, str],
+        speed: float = 1.0,
+    ) -> List[ChapterVoice]:
+        """(ナレーション, 出力パス) の並びを合成する
+
+        全章の文をまとめてプールに投入し、章ごとに揃ったところで連結して書き出す。
+        複数のスレッドから章ごとに呼んでもよく、その場合も文はすべて同じプールで合成する。
+        """
+        with self._lock:
+            self.speaker_id(speaker)  # 話者一覧の取得をワーカー間で競合させない
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        started = time.monotonic()
+        pending = [
+            (out_path, [self._pool.submit(self.synthesize, s, speaker, speed) for s in split_sentences(text)])
+            for text, out_path in chapters
+        ]
+        voices = []
+        for out_path, futures in pending:
+            sentences = [future.result() for future in futures]
+            voice = ChapterVoice(out_path, sentences)
+            if sentences:
+                offsets = stitch_wavs([s.wav for s in sentences], out_path)
+                voice.duration = offsets[-1]
+                write_timing(out_path, [
+                    SentenceTiming.from_query(s.text, offset, s.query) for s, offset in zip(sentences, offsets)
+                ])
+            voice.elapsed = time.monotonic() - started
+            voices.append(voice)
+        return voices
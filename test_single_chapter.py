@@ -2,6 +2,9 @@
 import json, argparse, os, subprocess
 from pathlib import Path
 
+from makeshorts.project_store import ProjectStore
+from makeshorts.run_journal import write_json_atomic
+
 # ========= ユーティリティ =========
 def ensure_dir(p: Path):
     p.mkdir(parents=True, exist_ok=True)
@@ -36,17 +39,14 @@ def extract_single_chapter(master: dict, chapter_index: int = 0) -> dict:
     pkg["emotion_curve"] = [{"chapter_index": 0, "level": emotion_level}] # テスト用なので0章として扱う
     return {"package": pkg}
 
-def inject_visual_meta(chapter_json: Path, grade: str, fade: float):
-    with open(chapter_json, "r", encoding="utf-8") as f:
-        ch = json.load(f)
-    ch["visual_style"] = {
+def inject_visual_meta(store: ProjectStore, package: str, chapter_id: str, grade: str, fade: float):
+    """章の visual_style だけをプロジェクトストアで更新する（章バッチの他のキーは触らない）"""
+    store.set_field(package, chapter_id, "visual_style", {
         "grade": grade,            # "warm" / "cool" / "desaturated"
         "subtitle_fade_in": fade,  # 秒数
         "subtitle_fade_out": fade
-    }
-    with open(chapter_json, "w", encoding="utf-8") as f:
-        json.dump(ch, f, ensure_ascii=False, indent=2)
-    print(f"✨ グレーディング({grade})＋字幕フェード({fade}s)を付与 → {chapter_json}")
+    }, stage="test_single_chapter")
+    print(f"✨ グレーディング({grade})＋字幕フェード({fade}s)を付与 → {package}/{chapter_id}（{store.path}）")
 
 # ========= メイン処理 =========
 def main():
@@ -64,8 +64,7 @@ def main():
     out_dir = Path("zap1/test_output")
     ensure_dir(out_dir)
     test_json = out_dir / "test_master.json"
-    with open(test_json, "w", encoding="utf-8") as f:
-        json.dump(single_master, f, ensure_ascii=False, indent=2)
+    write_json_atomic(str(test_json), single_master)
     print(f"🧩 テスト用 master.json 作成: {test_json}")
 
     # 一章だけバッチ生成
@@ -84,12 +83,16 @@ def main():
     subprocess.run(cmd, check=True)
 
     # グレーディング・フェード追加
-    # make_all.py が生成したバッチJSONは scripts_out_dir にある
-    chapter_files = sorted(scripts_out_dir.glob("chapter_*.json"))
-    if chapter_files:
-        inject_visual_meta(chapter_files[0], args.grade, args.fade)
+    # make_all.py が生成した章バッチは scripts_out_dir のプロジェクトストアにある
+    store = ProjectStore.open_existing(str(scripts_out_dir))
+    package = store.latest_package() if store is not None else None
+    chapters = store.chapters(package) if package else []
+    if chapters:
+        inject_visual_meta(store, package, chapters[0]["id"], args.grade, args.fade)
     else:
-        print("⚠ バッチJSONが見つかりませんでした。")
+        print("⚠ 章バッチが見つかりませんでした。")
+    if store is not None:
+        store.close()
 
     print("\n✅ テスト完了。CapCutで zap1/output/test_capcut.ccproj を確認してください。")
 
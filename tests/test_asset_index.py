@@ -0,0 +1,52 @@
+import json
+import os
+
+from makeshorts import asset_index
+from makeshorts.asset_index import AssetIndex
+
+
+def make_dir(root, name, files):
+    directory = root / name
+    directory.mkdir(parents=True)
+    for file in files:
+        (directory / file).write_bytes(b"")
+    return str(directory)
+
+
+def test_saves_from_separate_processes_merge(tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_index, "RACY_NS", 0)
+    path = str(tmp_path / "asset_index.json")
+    a = make_dir(tmp_path, "pkg_a", ["1.png"])
+    b = make_dir(tmp_path, "pkg_b", ["1.png", "2.png"])
+
+    first, second = AssetIndex(path), AssetIndex(path)  # どちらも空のインデックスを読んだ 2 プロセス
+    assert first.role_files(a, "image") == [os.path.join(a, "1.png")]
+    assert second.role_files(b, "image") == [os.path.join(b, "1.png"), os.path.join(b, "2.png")]
+    first.save()
+    second.save()
+
+    with open(path, encoding="utf-8") as f:
+        assert set(json.load(f)) == {a, b}
+    reloaded = AssetIndex(path)
+    assert reloaded.role_files(b, "image") == [os.path.join(b, "1.png"), os.path.join(b, "2.png")]
+    assert reloaded.rescans == 0
+
+
+def test_save_drops_directories_removed_in_this_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_index, "RACY_NS", 0)
+    path = str(tmp_path / "asset_index.json")
+    a = make_dir(tmp_path, "pkg_a", ["1.png"])
+    b = make_dir(tmp_path, "pkg_b", ["1.png"])
+    index = AssetIndex(path)
+    index.files(a)
+    index.files(b)
+    index.save()
+
+    other = AssetIndex(path)
+    os.remove(os.path.join(b, "1.png"))
+    os.rmdir(b)
+    assert other.files(b) == []
+    other.save()
+
+    with open(path, encoding="utf-8") as f:
+        assert set(json.load(f)) == {a}
@@ -0,0 +1,77 @@
+import array
+import math
+import struct
+
+import pytest
+
+from makeshorts import audio_reflow
+from makeshorts.audio_reflow import speech_span
+
+RATE = 8000
+
+
+def tone(sec, amplitude):
+    return [amplitude * math.sin(2 * math.pi * 440 * i / RATE) for i in range(int(sec * RATE))]
+
+
+def write_wav(path, samples, *, fmt="h"):
+    """-1.0〜1.0 のサンプル列をモノラル WAV にする"""
+    if fmt == "h":
+        data = array.array("h", [int(x * 32767) for x in samples]).tobytes()
+        tag, bits = 1, 16
+    elif fmt == "B":
+        data = array.array("B", [128 + int(x * 127) for x in samples]).tobytes()
+        tag, bits = 1, 8
+    else:
+        data = array.array("f", samples).tobytes()
+        tag, bits = 3, 32
+    block_align = bits // 8
+    header = struct.pack("<4sI4s", b"RIFF", 36 + len(data), b"WAVE")
+    header += struct.pack("<4sIHHIIHH", b"fmt ", 16, tag, 1, RATE, RATE * block_align, block_align, bits)
+    header += struct.pack("<4sI", b"data", len(data))
+    path.write_bytes(header + data)
+    return str(path)
+
+
+def clicked_speech():
+    click = [0.0] * int(0.5 * RATE)
+    click[100] = 0.02  # 一瞬のポップノイズ（ピークは -34dBFS だがブロックの RMS は -45dBFS を下回る）
+    return click + [0.0] * int(0.5 * RATE) + tone(1.0, 0.3) + [0.0] * int(0.5 * RATE)
+
+
+@pytest.mark.parametrize("fmt", ["h", "B", "f"])
+def test_click_is_not_speech(tmp_path, fmt):
+    span = speech_span(write_wav(tmp_path / "v.wav", clicked_speech(), fmt=fmt))
+    assert span.start == pytest.approx(1.0, abs=0.011)
+    assert span.end == pytest.approx(2.0, abs=0.011)
+    assert span.total == pytest.approx(2.5)
+
+
+def python_sumprod(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+@pytest.mark.parametrize("sumprod", [None, getattr(math, "sumprod", python_sumprod)], ids=["loop", "sumprod"])
+@pytest.mark.parametrize("fmt", ["h", "B"])
+def test_fallbacks_without_audioop_match(tmp_path, monkeypatch, fmt, sumprod):
+    path = write_wav(tmp_path / "v.wav", clicked_speech(), fmt=fmt)
+    expected = speech_span(path)
+    monkeypatch.setattr(audio_reflow, "audioop", None)
+    monkeypatch.setattr(audio_reflow, "_sumprod", sumprod)
+    assert speech_span(path) == expected
+
+
+def test_audioop_is_only_loaded_without_sumprod():
+    if hasattr(math, "sumprod"):  # 3.12 以降は非推奨（3.13 で削除）の audioop を読まない
+        assert audio_reflow.audioop is None
+    else:
+        assert audio_reflow._sumprod is None
+
+
+def test_centered_sum_of_squares():
+    chunk = memoryview(array.array("B", [128, 130, 126, 200]))
+    assert audio_reflow._sum_of_squares(chunk, 128) == 0 + 4 + 4 + 72 * 72
+
+
+def test_silence_returns_none(tmp_path):
+    assert speech_span(write_wav(tmp_path / "v.wav", [0.0] * RATE)) is None
@@ -0,0 +1,64 @@
+import os
+
+from makeshorts import build_manifest
+from makeshorts.build_manifest import BuildManifest, digest
+
+
+def built(tmp_path, content=b"srt"):
+    out = tmp_path / "chapter1.srt"
+    out.write_bytes(content)
+    manifest = BuildManifest(str(tmp_path / "m.json"))
+    inputs = digest("chapter1", {"text": "a"})
+    assert manifest.needs_build("srt:chapter1", inputs, [str(out)])
+    manifest.record("srt:chapter1", inputs, [str(out)])
+    manifest.save()
+    return out, inputs
+
+
+def test_unchanged_target_is_skipped_after_reload(tmp_path):
+    out, inputs = built(tmp_path)
+    manifest = BuildManifest(str(tmp_path / "m.json"))
+    assert not manifest.needs_build("srt:chapter1", inputs, [str(out)])
+    assert manifest.decisions == [("srt:chapter1", "skip", "入力・出力とも前回と同一")]
+
+
+def test_rebuild_reasons(tmp_path):
+    out, inputs = built(tmp_path)
+    manifest = BuildManifest(str(tmp_path / "m.json"))
+    assert manifest.stale_reason("srt:chapter2", inputs) == "初回ビルド"
+    assert manifest.stale_reason("srt:chapter1", digest("chapter1", {"text": "b"}), [str(out)]) == "入力が変更されました"
+
+    out.write_bytes(b"edited by hand")
+    assert manifest.stale_reason("srt:chapter1", inputs, [str(out)]) == f"出力が外部で変更されました: {out}"
+    os.remove(out)
+    assert manifest.stale_reason("srt:chapter1", inputs, [str(out)]) == f"出力がありません: {out}"
+    assert BuildManifest(str(tmp_path / "m.json"), force=True).stale_reason("srt:chapter1", inputs) == "--force 指定"
+
+
+def test_digest_is_order_insensitive_for_dict_keys():
+    assert digest({"a": 1, "b": 2}) == digest({"b": 2, "a": 1})
+    assert digest("x", 1) != digest("x", "1")
+
+
+def test_file_hash_is_reused_while_size_and_mtime_match(tmp_path, monkeypatch):
+    asset = tmp_path / "01.png"
+    asset.write_bytes(b"png")
+    manifest = BuildManifest(str(tmp_path / "m.json"))
+    first = manifest.files_digest([str(asset)])
+
+    calls = []
+    monkeypatch.setattr(build_manifest, "_sha256_file", lambda path: calls.append(path) or "rehashed")
+    assert manifest.files_digest([str(asset)]) == first
+    assert calls == []
+
+    asset.write_bytes(b"png2")
+    assert manifest.file_digest(str(asset)) == "rehashed"
+    assert manifest.file_digest(str(tmp_path / "missing.png")) is None
+
+
+def test_corrupt_or_old_manifest_starts_fresh(tmp_path):
+    path = tmp_path / "m.json"
+    path.write_text("{torn", encoding="utf-8")
+    assert BuildManifest(str(path)).data["targets"] == {}
+    path.write_text('{"version": 0, "targets": {"x": {}}, "files": {}}', encoding="utf-8")
+    assert BuildManifest(str(path)).data["targets"] == {}
@@ -0,0 +1,62 @@
+import json
+import os
+import stat
+import time
+
+from makeshorts.credentials import CachedToken, TokenProvider
+
+
+class FakeProvider(TokenProvider):
+    """OAuth を使わず、取り直すたびに新しいトークンを発行する"""
+
+    lifetime = 3600
+
+    def _refresh(self):
+        self.refresh_count += 1
+        return CachedToken(f"token-{id(self)}-{self.refresh_count}", time.time() + self.lifetime)
+
+
+def test_token_is_reused_in_memory_until_near_expiry():
+    provider = FakeProvider("sa.json")
+    first = provider.token()
+    assert provider.token() == first
+    assert provider.refresh_count == 1
+
+    provider._cached = CachedToken(first, time.time() + 60)  # 期限 5 分前を切った
+    assert provider.token() != first
+    assert provider.refresh_count == 2
+
+
+def test_token_file_is_shared_between_processes(tmp_path):
+    token_file = str(tmp_path / "tokens.json")
+    first = FakeProvider("sa.json", token_file=token_file)
+    second = FakeProvider("sa.json", token_file=token_file)  # 別プロセスのワーカー
+
+    token = first.token()
+    assert second.token() == token
+    assert (first.refresh_count, second.refresh_count) == (1, 0)
+    assert stat.S_IMODE(os.stat(token_file).st_mode) == 0o600
+
+
+def test_expired_file_entries_are_refreshed_and_pruned(tmp_path):
+    token_file = tmp_path / "tokens.json"
+    provider = FakeProvider("sa.json", token_file=str(token_file))
+    token_file.write_text(json.dumps({
+        provider._key: {"token": "stale", "expiry": time.time() + 60},
+        "other-account": {"token": "old", "expiry": time.time() - 1},
+        "live-account": {"token": "live", "expiry": time.time() + 3600},
+    }), encoding="utf-8")
+
+    assert provider.token() != "stale"
+    assert provider.refresh_count == 1
+    data = json.loads(token_file.read_text(encoding="utf-8"))
+    assert set(data) == {provider._key, "live-account"}
+    assert data[provider._key]["token"] == provider.token()
+
+
+def test_unreadable_token_file_falls_back_to_refresh(tmp_path):
+    token_file = tmp_path / "tokens.json"
+    token_file.write_text("{torn", encoding="utf-8")
+    provider = FakeProvider("sa.json", token_file=str(token_file))
+    assert provider.token().startswith("token-")
+    assert json.loads(token_file.read_text(encoding="utf-8"))[provider._key]["token"] == provider.token()
@@ -0,0 +1,86 @@
+import struct
+
+import pytest
+
+from makeshorts.export_queue import (
+    ExportJob,
+    Exporter,
+    ExportQueue,
+    FakeExporter,
+    OutputWatcher,
+    mp4_finalized,
+)
+
+
+class FakeClock:
+    """sleep で進む時計（タイムアウトを実時間で待たない）"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, sec):
+        self.now += sec
+
+
+def fast_watcher():
+    return OutputWatcher(stable_sec=0.05, poll_sec=0.01)
+
+
+def test_exporter_requires_start():
+    with pytest.raises(TypeError):
+        Exporter()
+
+
+def test_mp4_finalized_needs_closed_boxes(tmp_path):
+    path = tmp_path / "a.mp4"
+    ftyp = struct.pack(">I4s", 16, b"ftyp") + b"isom\0\0\0\0"
+    path.write_bytes(ftyp + struct.pack(">I4s", 0, b"mdat") + b"\0" * 8)
+    assert not mp4_finalized(str(path))  # 書き込み中の mdat
+    path.write_bytes(ftyp + struct.pack(">I4s", 16, b"mdat") + b"\0" * 8 + struct.pack(">I4s", 8, b"moov"))
+    assert mp4_finalized(str(path))
+    path.write_bytes(ftyp + struct.pack(">I4s", 16, b"mdat") + b"\0" * 8)
+    assert not mp4_finalized(str(path))  # moov がまだ無い
+
+
+def test_queue_exports_each_job_once_the_file_is_finalized(tmp_path):
+    out = tmp_path / "out" / "a.mp4"
+    out.parent.mkdir()
+    out.write_bytes(b"stale")  # 前回の出力は消してから待つ
+    queue = ExportQueue(FakeExporter(speed=0.001, chunk=1024), watcher=fast_watcher())
+
+    results = queue.run([ExportJob("a.ccproj", str(out), duration=10), ExportJob("b.ccproj", str(tmp_path / "b.mp4"), duration=3)])
+
+    assert [r.ok for r in results] == [True, True]
+    assert results[0].size == out.stat().st_size == 16 + 8 + 10 * 1024 + 8
+    assert mp4_finalized(str(out))
+
+
+def test_stalled_export_times_out_in_proportion_to_duration(tmp_path):
+    clock = FakeClock()
+    watcher = OutputWatcher(stable_sec=3, poll_sec=0.5, clock=clock, sleep=clock.sleep)
+    queue = ExportQueue(FakeExporter(speed=0, chunk=16, stall=["a.ccproj"]), timeout_base=10, timeout_factor=2, watcher=watcher)
+    job = ExportJob("a.ccproj", str(tmp_path / "a.mp4"), duration=40)
+
+    result = queue.run_one(job)
+
+    assert queue.timeout_for(job) == 10 + 40 * 2
+    assert not result.ok
+    assert result.error.startswith("TimeoutError: 90s 以内に完了しませんでした")
+    assert clock.now == pytest.approx(90)
+
+
+def test_reported_failure_ends_the_wait_early(tmp_path):
+    exporter = FakeExporter(speed=0.001, chunk=16, fail=["a.ccproj"])
+    finished = []
+    exporter.finish = lambda job, ok: finished.append((job.project, ok))
+    queue = ExportQueue(exporter, timeout_base=60, watcher=fast_watcher())
+
+    result = queue.run_one(ExportJob("a.ccproj", str(tmp_path / "a.mp4"), duration=10))
+
+    assert not result.ok
+    assert result.error == "RuntimeError: a.ccproj の書き出しに失敗しました"
+    assert result.elapsed < 10  # 上限 75 秒を待たずに打ち切る
+    assert finished == [("a.ccproj", False)]
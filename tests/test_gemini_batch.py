@@ -0,0 +1,75 @@
+import json
+import threading
+
+import pytest
+
+from gemini_cli.batch import PromptJob, load_jobs, render_prompt, run_jobs
+from makeshorts.run_journal import RunJournal
+
+
+class FakeGemini:
+    """プロンプトに「失敗」を含むジョブだけ例外を投げる"""
+
+    def __init__(self):
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate_text(self, prompt, max_tokens, temperature):
+        with self._lock:
+            self.prompts.append(prompt)
+        if "失敗" in prompt:
+            raise RuntimeError("quota")
+        return f"text for {len(prompt)}"
+
+
+def jobs(tmp_path):
+    return [
+        PromptJob(str(tmp_path / "ch1.txt"), "ウォルト", section="第1章", id="ch1"),
+        PromptJob(str(tmp_path / "ch2.txt"), "ウォルト", section="失敗する章", id="ch2"),
+        PromptJob(str(tmp_path / "ch3.txt"), "ウォルト", section="第3章", id="ch3"),
+    ]
+
+
+def test_load_jobs_skips_comments_and_validates_keys(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text(
+        "# comment\n\n"
+        + json.dumps({"person": "P", "output": "a.txt", "task": "seo", "length": 300}) + "\n",
+        encoding="utf-8",
+    )
+    [job] = load_jobs(str(path))
+    assert (job.person, job.task, job.length, job.name) == ("P", "seo", 300, "a.txt")
+
+    path.write_text(json.dumps({"person": "P", "output": "a.txt", "lenght": 1}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="未知のキー"):
+        load_jobs(str(path))
+    path.write_text(json.dumps({"output": "a.txt"}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="必須"):
+        load_jobs(str(path))
+
+
+def test_results_keep_input_order_and_failures_write_nothing(tmp_path):
+    (tmp_path / "ch3.txt").write_text("existing", encoding="utf-8")
+    finished = []
+    results = run_jobs(jobs(tmp_path), FakeGemini(), workers=3, on_result=lambda r: finished.append(r.job.id))
+
+    assert [(r.job.id, r.status) for r in results] == [("ch1", "done"), ("ch2", "failed"), ("ch3", "skipped")]
+    assert results[1].error == "RuntimeError: quota"
+    assert sorted(finished) == ["ch1", "ch2", "ch3"]
+    assert (tmp_path / "ch1.txt").read_text(encoding="utf-8").startswith("text for ")
+    assert not (tmp_path / "ch2.txt").exists()
+    assert (tmp_path / "ch3.txt").read_text(encoding="utf-8") == "existing"
+
+
+def test_resumed_run_only_trusts_the_journal(tmp_path):
+    journal = RunJournal.create("batch", root=str(tmp_path / "runs"))
+    run_jobs(jobs(tmp_path), FakeGemini(), journal=journal)
+    journal.close()
+    (tmp_path / "ch2.txt").write_text("partial from another tool", encoding="utf-8")
+
+    gemini = FakeGemini()
+    resumed = RunJournal.open(journal.run_id, command="batch", root=str(tmp_path / "runs"))
+    results = run_jobs(jobs(tmp_path), gemini, journal=resumed)
+
+    assert [r.status for r in results] == ["skipped", "failed", "skipped"]
+    assert gemini.prompts == [render_prompt(jobs(tmp_path)[1])]
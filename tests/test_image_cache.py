@@ -0,0 +1,32 @@
+import os
+
+from makeshorts.image_cache import ImageCache
+
+
+def test_outputs_do_not_share_the_cache_entry(tmp_path):
+    cache = ImageCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    first = tmp_path / "out" / "01.png"
+    first.parent.mkdir()
+    first.write_bytes(b"original")
+    cache.store("ab" * 32, str(first))
+
+    second = tmp_path / "out" / "02.png"
+    assert cache.fetch("ab" * 32, str(second))
+    assert os.stat(second).st_ino != os.stat(cache.path_for("ab" * 32)).st_ino
+
+    with open(first, "r+b") as f:  # レタッチなどでその場で書き換える
+        f.write(b"RETOUCH!")
+    assert cache.path_for("ab" * 32).read_bytes() == b"original"
+    assert second.read_bytes() == b"original"
+
+
+def test_fetch_does_not_touch_existing_outputs(tmp_path):
+    cache = ImageCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    src = tmp_path / "01.png"
+    src.write_bytes(b"png")
+    cache.store("cd" * 32, str(src))
+    os.utime(src, (1_000_000, 1_000_000))
+
+    assert cache.fetch("cd" * 32, str(tmp_path / "02.png"))
+    assert os.stat(src).st_mtime == 1_000_000
+    assert not cache.fetch("ef" * 32, str(tmp_path / "03.png"))
@@ -0,0 +1,104 @@
+import base64
+import io
+import os
+
+import pytest
+
+from makeshorts import image_post
+from makeshorts.image_post import (
+    ImagePostError,
+    PostOptions,
+    process_image,
+    proxy_path,
+    resolve_backend,
+    stream_base64_field,
+    stream_base64_fields,
+    transcoded_path,
+)
+
+PNG_A = bytes(range(256)) * 40
+PNG_B = b"\x89PNG" + b"\xfe" * 5000
+
+
+def response(*images):
+    encoded = [base64.b64encode(img).decode("ascii") for img in images]
+    # JSON エンコーダによっては "/" を "\/" にエスケープし、長い文字列を改行しない
+    encoded[0] = encoded[0].replace("/", "\\/")
+    body = ", ".join(f'{{"mimeType": "image/png", "bytesBase64Encoded": "{e}"}}' for e in encoded)
+    return f'{{"predictions": [{body}]}}'.encode("ascii")
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 100, 1 << 20])
+def test_fields_are_decoded_across_chunk_boundaries(size):
+    outs = [io.BytesIO(), io.BytesIO()]
+    sizes = stream_base64_fields(chunked(response(PNG_A, PNG_B), size), "bytesBase64Encoded", lambda i: outs[i])
+    assert sizes == [len(PNG_A), len(PNG_B)]
+    assert [o.getvalue() for o in outs] == [PNG_A, PNG_B]
+
+
+def test_sink_can_skip_values_and_limit_stops_early():
+    out = io.BytesIO()
+    sizes = stream_base64_fields(chunked(response(PNG_A, PNG_B), 64), "bytesBase64Encoded",
+                                 lambda i: out if i == 1 else None)
+    assert sizes == [0, len(PNG_B)] and out.getvalue() == PNG_B
+
+    first = io.BytesIO()
+    assert stream_base64_field(chunked(response(PNG_A, PNG_B), 64), "bytesBase64Encoded", first) == len(PNG_A)
+    assert first.getvalue() == PNG_A
+    assert stream_base64_field([b'{"error": "blocked"}'], "bytesBase64Encoded", io.BytesIO()) == 0
+
+
+def test_truncated_response_raises():
+    data = response(PNG_A)
+    with pytest.raises(ImagePostError):
+        stream_base64_field(chunked(data[:len(data) // 2], 100), "bytesBase64Encoded", io.BytesIO())
+
+
+def test_variant_paths_live_in_subfolders():
+    assert proxy_path("/p/ch1/01_a.png") == "/p/ch1/proxy/01_a.jpg"
+    assert transcoded_path("/p/ch1/01_a.png", "webp") == "/p/ch1/webp/01_a.webp"
+    assert transcoded_path("/p/ch1/01_a.png", "jpeg") == "/p/ch1/jpeg/01_a.jpg"
+
+
+def test_process_image_skips_up_to_date_variants(tmp_path, monkeypatch):
+    master = tmp_path / "01.png"
+    master.write_bytes(b"png")
+    written = []
+
+    def fake_write(src, out_path, fmt, quality, max_size, backend):
+        written.append((os.path.relpath(out_path, tmp_path), fmt, max_size))
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        open(out_path, "wb").close()
+
+    monkeypatch.setattr(image_post, "_write_variant", fake_write)
+    options = PostOptions(transcode="webp")
+    first = process_image(str(master), options, "pillow")
+    assert first.ok and not first.skipped
+    assert written == [("proxy/01.jpg", "jpeg", 960), ("webp/01.webp", "webp", None)]
+
+    assert process_image(str(master), options, "pillow").skipped
+    os.utime(master, ns=(os.stat(master).st_atime_ns, os.stat(first.proxy).st_mtime_ns + 10**9))
+    written.clear()
+    assert not process_image(str(master), options, "pillow").skipped
+    assert len(written) == 2
+
+
+def test_process_image_reports_errors_instead_of_raising(tmp_path):
+    result = process_image(str(tmp_path / "missing.png"), PostOptions(), "pillow")
+    assert not result.ok and result.error.startswith("FileNotFoundError")
+
+
+def test_resolve_backend_without_pillow_or_ffmpeg(monkeypatch):
+    monkeypatch.setattr(image_post, "Image", None)
+    monkeypatch.delenv("MAKESHORTS_FFMPEG", raising=False)
+    monkeypatch.setattr(image_post.shutil, "which", lambda name: None)
+    with pytest.raises(ImagePostError):
+        resolve_backend()
+    monkeypatch.setenv("MAKESHORTS_FFMPEG", "/opt/ffmpeg")
+    assert resolve_backend() == "ffmpeg"
+    with pytest.raises(ImagePostError):
+        resolve_backend("pillow")
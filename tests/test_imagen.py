@@ -0,0 +1,54 @@
+import pytest
+
+from makeshorts.imagen import ImageJob, ImagenEngine, plan_batches
+from makeshorts.transport import ClientError, ServerError
+
+
+def jobs(tmp_path, groups):
+    return [ImageJob(i, f"prompt {i}", str(tmp_path / f"{i:02d}.png"), group=g) for i, g in enumerate(groups, 1)]
+
+
+@pytest.fixture
+def engine():
+    engine = ImagenEngine("https://example.invalid/predict", "token", project_id="test-imagen", batch_size=4)
+    engine.transport.call = lambda fn: fn()  # 再試行・ブレーカーは test_transport で確認する
+    yield engine
+    engine.close()
+
+
+def test_plan_batches_keeps_groups_apart(tmp_path):
+    batches = plan_batches(jobs(tmp_path, ["a", "a", "b", "a", "b"]), 2)
+    assert [[job.index for job in batch] for batch in batches] == [[1, 2], [4], [3, 5]]
+
+
+def test_transport_failure_fails_whole_batch_without_splitting(engine, tmp_path):
+    calls = []
+
+    def download(payload, tmp_paths, *, samples):
+        calls.append(len(tmp_paths))
+        raise ServerError("unavailable", status=503)
+
+    engine._download_many = download
+    results = engine.render_batch(jobs(tmp_path, [None] * 4))
+    assert calls == [4]
+    assert all(not r.ok and "ServerError" in r.error for r in results)
+    assert engine._batch_limit == 4
+
+
+def test_client_error_splits_and_shrinks_limit(engine, tmp_path):
+    calls = []
+
+    def download(payload, tmp_paths, *, samples):
+        calls.append(len(tmp_paths))
+        if len(tmp_paths) > 2:
+            raise ClientError("too many instances", status=400)
+        for path in tmp_paths:
+            with open(path, "wb") as f:
+                f.write(b"png")
+        return [3] * len(tmp_paths)
+
+    engine._download_many = download
+    results = engine.render_batch(jobs(tmp_path, [None] * 4))
+    assert calls == [4, 2, 2]
+    assert all(r.ok for r in results)
+    assert engine.batch_size == 4 and engine._batch_limit == 2
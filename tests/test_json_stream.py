@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from makeshorts.json_stream import ArrayItemStream
+
+ITEMS = [
+    {"id": 1, "prompt": "a castle {at} night", "tags": ["x", "y"]},
+    {"id": 2, "prompt": 'she said "hi" \\ and left', "meta": {"thumbnail_prompts": [{"id": 99}]}},
+    {"id": 3, "prompt": "閉じ括弧 } と ] を含む"},
+]
+DOC = "```json\n" + json.dumps({
+    "title": "T",
+    "other": [{"id": 0}],
+    "thumbnail_prompts": ITEMS,
+    "after": [{"id": 4}],
+}, ensure_ascii=False) + "\n```"
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(DOC)])
+def test_items_are_emitted_across_chunk_boundaries(size):
+    scanner = ArrayItemStream("thumbnail_prompts")
+    emitted = []
+    for at in range(0, len(DOC), size):
+        emitted.extend(scanner.feed(DOC[at:at + size]))
+    assert emitted == ITEMS
+    assert scanner.text == DOC
+
+
+def test_item_is_emitted_as_soon_as_it_closes():
+    scanner = ArrayItemStream("thumbnail_prompts")
+    first_end = DOC.index('"tags": ["x", "y"]}') + len('"tags": ["x", "y"]}')
+    assert scanner.feed(DOC[:first_end - 1]) == []
+    assert scanner.feed(DOC[first_end - 1:first_end]) == [ITEMS[0]]
+
+
+def test_key_text_inside_strings_is_not_a_key():
+    scanner = ArrayItemStream("thumbnail_prompts")
+    doc = '{"note": "\\"thumbnail_prompts\\": [{\\"id\\": 1}]", "thumbnail_prompts": [{"id": 2}]}'
+    assert scanner.feed(doc) == [{"id": 2}]
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from makeshorts.llm_cache import ResponseCache, cache_key, cached_generate
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm.sqlite3"), ttl_sec=60, max_entries=10)
+    yield cache
+    cache.close()
+
+
+def test_concurrent_callers_compute_once(cache):
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("m", "p", None, compute)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1]
+    assert results == ["answer"] * 8
+
+
+def test_caller_that_missed_just_before_leader_finished_uses_stored_response(cache, monkeypatch):
+    # 1 回目の get で外れたあと、先行の呼び出しが保存して in-flight から抜けた状態を作る
+    cache.put(cache_key("m", "p", None), "m", "answer")
+    original_get = cache.get
+    missed = []
+
+    def get(key):
+        if not missed:
+            missed.append(key)
+            return None
+        return original_get(key)
+
+    monkeypatch.setattr(cache, "get", get)
+
+    def compute():
+        raise AssertionError("モデルを呼び直した")
+
+    assert cache.get_or_compute("m", "p", None, compute) == "answer"
+
+
+def test_failures_are_not_cached(cache):
+    def fail():
+        raise RuntimeError("quota")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("m", "p", None, fail)
+    assert cache.get_or_compute("m", "p", None, lambda: "ok") == "ok"
+    assert cache.get(cache_key("m", "p", None)) == "ok"
+
+
+def test_expired_entries_are_recomputed(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm.sqlite3"), ttl_sec=0)
+    cache.put(cache_key("m", "p", None), "m", "old")
+    assert cached_generate(cache, "m", "p", None, lambda: "new") == "new"
+    cache.close()
+
+
+def test_key_depends_on_config():
+    assert cache_key("m", "p", {"temperature": 0}) != cache_key("m", "p", {"temperature": 1})
+    assert cache_key("m", "p", {"a": 1, "b": 2}) == cache_key("m", "p", {"b": 2, "a": 1})
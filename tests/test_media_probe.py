@@ -0,0 +1,94 @@
+import json
+import struct
+import wave
+
+import pytest
+
+from makeshorts import media_probe
+from makeshorts.media_probe import MediaIndex, ProbeError, probe
+
+
+def write_wav(path, seconds, rate=24000, channels=1):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\0\0" * channels * int(rate * seconds))
+
+
+def box(kind, body):
+    return struct.pack(">I4s", 8 + len(body), kind) + body
+
+
+def test_wav_with_extra_chunks(tmp_path):
+    path = tmp_path / "a.wav"
+    write_wav(path, 1.5, channels=2)
+    raw = path.read_bytes()
+    # fmt と data の間に LIST チャンク（奇数長）を挟む
+    listing = b"LIST" + struct.pack("<I", 5) + b"INFO\0\0"
+    path.write_bytes(raw[:36] + listing + raw[36:])
+    info = probe(str(path))
+    assert (info.duration, info.sample_rate, info.channels, info.codec) == (1.5, 24000, 2, "pcm")
+
+
+def test_cbr_mp3_without_vbr_header_sums_frames(tmp_path):
+    header = b"\xff\xfb\x90\x00"  # MPEG1 Layer III 128kbps 44.1kHz ステレオ、417 バイト/フレーム
+    id3 = b"ID3\x03\x00\x00\x00\x00\x00\x0a" + b"\0" * 10
+    path = tmp_path / "a.mp3"
+    path.write_bytes(id3 + (header + b"\0" * 413) * 100)
+    info = probe(str(path))
+    assert info.duration == pytest.approx(100 * 1152 / 44100)
+    assert (info.sample_rate, info.channels, info.codec) == (44100, 2, "mp3")
+
+
+def test_flac_streaminfo(tmp_path):
+    packed = (48000 << 44) | (1 << 41) | (15 << 36) | 96000  # 48kHz 2ch 16bit 96000 サンプル
+    streaminfo = b"\0" * 10 + packed.to_bytes(8, "big") + b"\0" * 16
+    path = tmp_path / "a.flac"
+    path.write_bytes(b"fLaC" + b"\x80\x00\x00\x22" + streaminfo)
+    info = probe(str(path))
+    assert (info.duration, info.sample_rate, info.channels) == (2.0, 48000, 2)
+
+
+def test_m4a_reads_mdhd_and_stsd(tmp_path):
+    mdhd = box(b"mdhd", b"\0" * 12 + struct.pack(">II", 44100, 44100 * 3) + b"\0" * 4)
+    entry = box(b"mp4a", b"\0" * 16 + struct.pack(">HHHHI", 1, 16, 0, 0, 44100 << 16))
+    stsd = box(b"stsd", b"\0" * 4 + struct.pack(">I", 1) + entry)
+    trak = box(b"trak", box(b"mdia", mdhd + box(b"minf", box(b"stbl", stsd))))
+    path = tmp_path / "a.m4a"
+    path.write_bytes(box(b"ftyp", b"M4A \0\0\0\0") + box(b"moov", trak) + box(b"mdat", b"\0" * 32))
+    info = probe(str(path))
+    assert (info.duration, info.sample_rate, info.channels, info.codec) == (3.0, 44100, 1, "mp4a")
+
+
+def test_unsupported_and_broken_files_raise_probe_error(tmp_path):
+    (tmp_path / "a.ogg").write_bytes(b"OggS")
+    (tmp_path / "b.wav").write_bytes(b"RIFF\0\0\0\0WAVE")
+    with pytest.raises(ProbeError):
+        probe(str(tmp_path / "a.ogg"))
+    with pytest.raises(ProbeError):
+        probe(str(tmp_path / "b.wav"))
+
+
+def test_index_probes_each_file_once_until_it_changes(tmp_path, monkeypatch):
+    wav = tmp_path / "voice.wav"
+    write_wav(wav, 2.0)
+    (tmp_path / "broken.wav").write_bytes(b"junk")
+    index_path = str(tmp_path / "index.json")
+    index = MediaIndex(index_path)
+    assert index.duration(str(wav)) == 2.0
+    assert index.duration(str(tmp_path / "broken.wav")) is None
+    assert index.get(str(tmp_path / "missing.wav")) is None
+    index.save()
+
+    calls = []
+    monkeypatch.setattr(media_probe, "probe", lambda path: calls.append(path))
+    reloaded = MediaIndex(index_path)
+    assert reloaded.duration(str(wav)) == 2.0
+    assert reloaded.duration(str(tmp_path / "broken.wav")) is None
+    assert calls == []
+    assert len(json.loads(open(index_path, encoding="utf-8").read())) == 2
+
+    write_wav(wav, 3.0)
+    reloaded.get(str(wav))
+    assert calls == [str(wav)]
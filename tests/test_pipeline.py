@@ -0,0 +1,104 @@
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import build_capcut_project
+import make_all
+from makeshorts import asset_index
+from makeshorts.asset_index import AssetIndex
+from makeshorts.pipeline import add_generation_tasks, chapter_skeleton
+from zap1.zap1_auto_generate import CHAPTERS
+
+
+class FakeGemini:
+    """エピローグの台本だけ、最初の章の区間プレビューが書き出されるまで返さない"""
+
+    def __init__(self, segment):
+        self.segment = segment
+
+    def generate_text(self, prompt, max_tokens, temperature):
+        if "エピローグ" in prompt:
+            deadline = time.monotonic() + 10
+            while not os.path.exists(self.segment):
+                if time.monotonic() > deadline:
+                    raise TimeoutError("後の章の台本を待たずに最初の章の区間が組まれていません")
+                time.sleep(0.01)
+        return "一九〇一年、物語が始まる。彼は絵を描き続けた。" * 3
+
+
+class FakeGenerator:
+    def generate(self, person, sections):
+        data = {
+            "thumbnail_prompts": [{"chapter": title, "prompt": f"{title} scene {i}"} for title in sections for i in (1, 2)],
+            "script": {"sections": [{"title": title, "emotion_level": 7} for title in sections]},
+        }
+        return SimpleNamespace(data=data, package_dir="packages/fake")
+
+
+class FakeImages:
+    def __init__(self):
+        self.calls = []
+
+    def generate_images_from_prompts(self, prompts, title, *, output_dir, groups, proxies, use_cache):
+        self.calls.append((os.path.basename(output_dir), len(prompts), set(groups), proxies))
+        os.makedirs(output_dir, exist_ok=True)
+        for index, _ in enumerate(prompts, start=1):
+            open(os.path.join(output_dir, f"{index:02d}_{title}.png"), "wb").close()
+        return len(prompts)
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_index, "_shared", AssetIndex(str(tmp_path / "asset_index.json")))
+    monkeypatch.setenv("MAKESHORTS_MEDIA_INDEX", str(tmp_path / "media_index.json"))
+    monkeypatch.setattr(build_capcut_project, "copy_to_capcut_for", lambda config: None)
+    return make_all.PackagePaths.for_workspace(tmp_path / "ws", str(tmp_path / "bgm"))
+
+
+def test_first_chapter_reaches_its_segment_while_later_scripts_generate(paths):
+    master = chapter_skeleton("ウォルト")
+    slug = make_all.slugify("ウォルト")
+    opening = os.path.join(paths.outdir, "segments", f"{slug}_opening.ccproj")
+    images = FakeImages()
+
+    built = make_all.build_master(
+        master, paths, cpu_processes=False,
+        upstream=lambda sched: add_generation_tasks(sched, master, paths, gemini=FakeGemini(opening),
+                                                    generator=FakeGenerator(), image_module=images),
+    )
+
+    assert built["chapters"] == len(CHAPTERS)
+    assert sorted(images.calls) == sorted((ch["id"], 2, {ch["id"]}, False) for ch in CHAPTERS)
+    segment = json.load(open(opening, encoding="utf-8"))
+    video, subtitles = segment["tracks"][0]["clips"], segment["tracks"][3]["clips"]
+    assert [os.path.basename(c["path"]) for c in video] == [f"01_{slug}.png", f"02_{slug}.png", f"01_{slug}.png"]
+    assert video[0]["motion"]["emotion_level"] == 7
+    assert subtitles and subtitles[0]["start"] < 1.0  # 章の先頭を 0 秒に寄せた字幕
+
+    saved = json.load(open(os.path.join(paths.outputs_root, f"{slug}_master.json"), encoding="utf-8"))
+    chapters = saved["package"]["script"]["chapters"]
+    assert all(ch["narration"] and ch["time"]["duration_sec"] > 0 for ch in chapters)
+    assert len(saved["package"]["thumbnails"]) == 2 * len(CHAPTERS)
+    assert os.path.exists(built["ccproj"])
+
+
+def test_failed_script_skips_only_that_chapter_and_the_timeline(paths):
+    class FailingGemini(FakeGemini):
+        def generate_text(self, prompt, max_tokens, temperature):
+            if "挑戦と失敗" in prompt:
+                raise RuntimeError("quota")
+            return "短い台本です。"
+
+    master = chapter_skeleton("ウォルト")
+    with pytest.raises(RuntimeError, match="完了しませんでした"):
+        make_all.build_master(
+            master, paths, cpu_processes=False,
+            upstream=lambda sched: add_generation_tasks(sched, master, paths, gemini=FailingGemini(None),
+                                                        generator=FakeGenerator()),
+        )
+    segments = sorted(os.listdir(os.path.join(paths.outdir, "segments")))
+    assert segments == sorted(f"{make_all.slugify('ウォルト')}_{ch['id']}.ccproj" for ch in CHAPTERS[:2])
+    assert not os.path.exists(os.path.join(paths.outdir, f"{make_all.slugify('ウォルト')}_capcut.ccproj"))
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from makeshorts.project_store import LEGACY_PACKAGE, ProjectStore, chapter_filename, store_path
+
+
+def batch(index, chapter_id, **extra):
+    return {"chapter_index": index, "id": chapter_id, "title": f"title {index}", "output_paths": {"voice_dir": "v"}, **extra}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProjectStore.for_scripts_dir(str(tmp_path))
+    store.put_package("pkg", {})
+    store.put_chapter("pkg", batch(1, "opening"))
+    store.put_chapter("pkg", batch(2, "chapter1"))
+    yield store
+    store.close()
+
+
+def test_fields_overlay_nested_keys_and_survive_batch_rewrites(store):
+    store.set_field("pkg", "chapter1", "output_paths.bgm_path", "bgm/a.mp3", stage="bgm")
+    store.set_field("pkg", "chapter1", "bgm.volume", 0.4)
+    store.put_chapter("pkg", batch(2, "chapter1", title="rewritten"))
+
+    doc = store.chapter("pkg", "chapter1")
+    assert doc["title"] == "rewritten"
+    assert doc["output_paths"] == {"voice_dir": "v", "bgm_path": "bgm/a.mp3"}
+    assert doc["bgm"] == {"volume": 0.4}
+    assert store.chapters("pkg")[1] == doc
+    assert "bgm_path" not in store.chapter("pkg", "opening")["output_paths"]
+
+    store.clear_field("pkg", "chapter1", "bgm.volume")
+    assert "bgm" not in store.chapter("pkg", "chapter1")
+
+
+def test_chapter_lookup_is_scoped_to_package(store):
+    store.put_package("other", {})
+    store.put_chapter("other", batch(1, "chapter1", title="other"))
+    store.set_field("other", "chapter1", "title", "overlaid")
+    assert store.chapter("pkg", "chapter1")["title"] == "title 2"
+    assert store.chapter("other", "chapter1")["title"] == "overlaid"
+    assert store.chapter("pkg", "missing") is None
+
+
+def test_prune_removes_fields_assets_and_clips_of_dropped_chapters(store, tmp_path):
+    store.set_field("pkg", "chapter1", "output_paths.bgm_path", "bgm/a.mp3")
+    store.put_assets("pkg", "chapter1", "image", [str(tmp_path / "01.png")])
+    store.replace_clips("pkg", {"tracks": [{"type": "video", "clips": [
+        {"chapter": "opening", "start": 0, "duration": 1},
+        {"chapter": "chapter1", "start": 1, "duration": 1},
+    ]}]})
+
+    assert store.prune_chapters("pkg", ["opening"]) == 1
+    assert [doc["id"] for doc in store.chapters("pkg")] == ["opening"]
+    assert store.chapter("pkg", "chapter1") is None
+    assert store.assets("pkg", chapter_id="chapter1") == []
+    assert [clip["chapter"] for clip in store.clips("pkg")] == ["opening"]
+
+    store.put_chapter("pkg", batch(2, "chapter1"))
+    assert "bgm_path" not in store.chapter("pkg", "chapter1")["output_paths"]
+
+
+def test_open_or_import_reads_legacy_json_once(tmp_path):
+    for chapter in (batch(10, "chapter9"), batch(2, "chapter1"), batch(1, "opening")):
+        (tmp_path / chapter_filename(chapter)).write_text(json.dumps(chapter), encoding="utf-8")
+
+    with ProjectStore.open_or_import(str(tmp_path)) as store:
+        assert store.latest_package() == LEGACY_PACKAGE
+        assert [doc["id"] for doc in store.chapters(LEGACY_PACKAGE)] == ["opening", "chapter1", "chapter9"]
+        store.set_field(LEGACY_PACKAGE, "opening", "output_paths.bgm_path", "bgm/a.mp3")
+
+    with ProjectStore.open_or_import(str(tmp_path)) as store:
+        assert store.chapter(LEGACY_PACKAGE, "opening")["output_paths"]["bgm_path"] == "bgm/a.mp3"
+
+
+def test_open_or_import_without_batches_creates_nothing(tmp_path):
+    assert ProjectStore.open_or_import(str(tmp_path)) is None
+    assert not (tmp_path / "project.sqlite3").exists()
+    assert store_path(str(tmp_path)) == str(tmp_path / "project.sqlite3")
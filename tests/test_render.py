@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from makeshorts import render
+from makeshorts.render import plan_segments, segment_command, write_segment_srt
+
+
+def project(tmp_path, *, voice=True, subtitles=True):
+    image = tmp_path / "01.png"
+    image.write_bytes(b"png")
+    wav = tmp_path / "opening.wav"
+    wav.write_bytes(b"wav")
+    mp3 = tmp_path / "bgm.mp3"
+    mp3.write_bytes(b"mp3")
+    video = [
+        {"chapter": "opening", "path": str(image), "start": 0.0, "duration": 2.0,
+         "motion": {"preset": "kenburns-pan-left"}, "transition_out": {"duration": 0.5}},
+        {"chapter": "opening", "path": "[MISSING] 02.png", "start": 2.0, "duration": 1.0},
+        {"chapter": "chapter1", "path": str(image), "start": 3.0, "duration": 1.333},
+    ]
+    voices = [{"path": str(wav), "start": 0.5, "duration": 3.0, "source_start": 0.25}] if voice else []
+    bgm = [{"path": str(mp3), "start": 0.0, "duration": 4.333, "fade_in": 1.0}]
+    subs = [{"start": 0.5, "duration": 1.0, "text": "こんにちは"},
+            {"start": 2.8, "duration": 0.4, "text": "またいで"}] if subtitles else []
+    return {
+        "meta": {"fps": 30, "resolution": "1080x1920"},
+        "tracks": [
+            {"type": "video", "clips": video},
+            {"type": "audio", "role": "voice", "clips": voices},
+            {"type": "audio", "role": "bgm", "clips": bgm},
+            {"type": "subtitles", "clips": subs},
+        ],
+        "mix": {"ducking": {"enable": True, "gain_db": -12}},
+    }
+
+
+def filters(cmd):
+    return cmd[cmd.index("-filter_complex") + 1]
+
+
+def test_plan_segments_groups_chapters_on_frame_boundaries(tmp_path):
+    segments = plan_segments(project(tmp_path))
+    assert [(s.name, s.start, s.end, len(s.video)) for s in segments] == [("opening", 0, 90, 2), ("chapter1", 90, 130, 1)]
+    assert segments[1].frames == 40  # 1.333s は 40 フレームに丸める
+
+
+def test_plan_segments_without_chapters_is_one_segment(tmp_path):
+    p = project(tmp_path)
+    for clip in p["tracks"][0]["clips"]:
+        del clip["chapter"]
+    assert [(s.name, s.start, s.end) for s in plan_segments(p)] == [("all", 0, 130)]
+
+
+def test_segment_srt_is_clipped_and_rebased(tmp_path):
+    p = project(tmp_path)
+    second = plan_segments(p)[1]
+    assert write_segment_srt(p, second, str(tmp_path / "s.srt")) == 1
+    assert (tmp_path / "s.srt").read_text(encoding="utf-8") == "1\n00:00:00,000 --> 00:00:00,200\nまたいで\n\n"
+
+
+def test_segment_command_video_audio_and_ducking(tmp_path):
+    p = project(tmp_path)
+    opening = plan_segments(p)[0]
+    cmd = segment_command(p, opening, "out.mp4", str(tmp_path / "s.srt"), ffmpeg="ffmpeg", threads=2, font="Test Font")
+    graph = filters(cmd)
+    assert "color=c=black:s=1080x1920:r=30:d=1.0" in cmd  # 欠けた画像は黒で埋める
+    assert "zoompan=" in graph and "fade=t=out:st=1.500:d=0.5" in graph
+    assert "concat=n=2:v=1:a=0[vcat]" in graph
+    assert "FontName=Test Font," in graph
+    # ボイスは区間に重なる部分を元ファイルの source_start から切り出す
+    voice = cmd.index(str(tmp_path / "opening.wav"))
+    assert cmd[voice - 5:voice] == ["-ss", "0.250", "-t", "2.500", "-i"]
+    assert "adelay=500|500" in graph
+    assert "volume=volume=0.2512:enable='between(t,0.500,3.000)'" in graph
+    assert cmd[cmd.index("-threads") + 1] == "2"
+    assert cmd[-3:] == ["-t", "3.0", "out.mp4"]
+
+
+def test_segment_command_defaults_font_and_fills_silence(tmp_path, monkeypatch):
+    p = project(tmp_path, voice=False)
+    p["tracks"][2]["clips"] = []
+    monkeypatch.delenv("MAKESHORTS_SUBTITLE_FONT", raising=False)
+    cmd = segment_command(p, plan_segments(p)[1], "out.mp4", "/tmp/a:b.srt")
+    assert f"FontName={render.DEFAULT_SUBTITLE_FONT}," in filters(cmd)
+    assert "subtitles='/tmp/a\\:b.srt'" in filters(cmd)
+    assert "anullsrc=r=48000:cl=stereo" in cmd
+
+    monkeypatch.setenv("MAKESHORTS_SUBTITLE_FONT", "IPAexGothic")
+    assert "FontName=IPAexGothic," in filters(segment_command(p, plan_segments(p)[1], "out.mp4", "s.srt"))
+
+
+@pytest.mark.parametrize("subtitles", [True, False])
+def test_dry_run_prints_commands(tmp_path, capsys, subtitles):
+    ccproj = tmp_path / "p.ccproj"
+    ccproj.write_text(json.dumps(project(tmp_path, subtitles=subtitles)), encoding="utf-8")
+    render.render_project(str(ccproj), str(tmp_path / "final.mp4"), work_dir=str(tmp_path / "w"), dry_run=True)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 3 and "concat" in lines[-1]
+    assert ("subtitles=" in lines[0]) is subtitles
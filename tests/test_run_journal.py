@@ -0,0 +1,62 @@
+import json
+import os
+import stat
+
+from makeshorts.run_journal import RunJournal, write_json_atomic
+
+
+def test_params_settled_after_start_are_used_on_resume(tmp_path):
+    journal = RunJournal.create("images", {"title": None, "prompts": [], "output_dir": "out"}, root=str(tmp_path))
+    journal.add("scene:01", inputs="a", output=str(tmp_path / "01_.png"))
+    journal.update_params(title="T", prompts=["p1"])
+    journal.close()
+
+    resumed = RunJournal.open(journal.run_id, command="images", root=str(tmp_path))
+    assert resumed.params == {"title": "T", "prompts": ["p1"], "output_dir": "out"}
+    assert list(resumed.tasks) == ["scene:01"]
+
+
+def test_resume_ignores_torn_final_line_and_appends_after_it(tmp_path):
+    out = tmp_path / "01.png"
+    journal = RunJournal.create("images", {"title": "T"}, root=str(tmp_path))
+    journal.add("scene:01", inputs="a", output=str(out))
+    journal.add("scene:02", inputs="b", output=str(tmp_path / "02.png"))
+    journal.start("scene:01")
+    out.write_bytes(b"png")
+    journal.finish("scene:01", str(out))
+    journal.start("scene:02")
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"type": "task", "name": "scene:02", "state": "do')  # 書き込み途中で落ちた
+
+    resumed = RunJournal.open(journal.run_id, command="images", root=str(tmp_path))
+    assert resumed.is_done("scene:01")
+    assert resumed.tasks["scene:02"].state == "running"
+    assert resumed.unfinished() == ["scene:02"]
+
+    resumed.fail("scene:02", "boom")
+    resumed.close()
+    again = RunJournal.open(journal.run_id, command="images", root=str(tmp_path))
+    assert again.tasks["scene:02"].state == "failed"
+    assert again.tasks["scene:02"].attempts == 1
+
+
+def test_changed_output_is_not_done(tmp_path):
+    out = tmp_path / "01.png"
+    journal = RunJournal.create("images", root=str(tmp_path))
+    journal.add("scene:01", inputs="a", output=str(out))
+    out.write_bytes(b"png")
+    journal.finish("scene:01")
+    out.write_bytes(b"retouched")
+    journal.close()
+    assert not RunJournal.open(journal.run_id, root=str(tmp_path)).is_done("scene:01")
+
+
+def test_write_json_atomic_replaces_without_leftovers(tmp_path):
+    path = tmp_path / "sub" / "token.json"
+    write_json_atomic(str(path), {"a": 1}, indent=None, mode=0o600)
+    write_json_atomic(str(path), {"a": 2}, indent=None, mode=0o600)
+    assert path.read_text(encoding="utf-8") == '{"a":2}'
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert os.listdir(path.parent) == ["token.json"]
+    assert json.loads(path.read_text(encoding="utf-8")) == {"a": 2}
@@ -0,0 +1,57 @@
+import pytest
+
+from makeshorts.subtitle_timing import SentenceTiming, chapter_cues, read_timing, sentence_cues, write_timing
+
+
+def query(phrases, speed=1.0):
+    """phrases: (モーラ数, ポーズ秒) の並び。1 モーラ 0.1 秒"""
+    return {
+        "speedScale": speed,
+        "prePhonemeLength": 0.2,
+        "accent_phrases": [
+            {"moras": [{"consonant_length": 0.04, "vowel_length": 0.06}] * n,
+             "pause_mora": {"vowel_length": pause} if pause else None}
+            for n, pause in phrases
+        ],
+    }
+
+
+def test_cues_follow_pauses_and_hold_until_next_cue():
+    timing = SentenceTiming.from_query("むかしむかし、あるところに。", 10.0, query([(6, 0.3), (6, 0)]))
+    cues = sentence_cues(timing)
+    assert [c[2] for c in cues] == ["むかしむかし、", "あるところに。"]
+    # 1 つ目はポーズの間も表示し続け、2 つ目はポーズ明けに出る
+    assert cues[0] == pytest.approx((10.2, 11.1, "むかしむかし、"))
+    assert cues[1] == pytest.approx((11.1, 11.7, "あるところに。"))
+
+
+def test_speed_scale_shortens_timing():
+    timing = SentenceTiming.from_query("はやい。", 0.0, query([(3, 0)], speed=2.0))
+    assert sentence_cues(timing) == [pytest.approx((0.1, 0.25, "はやい。"))]
+
+
+def test_mismatched_pauses_fall_back_to_whole_sentence():
+    timing = SentenceTiming.from_query("一、二、三。", 0.0, query([(6, 0)]))
+    assert [c[2] for c in sentence_cues(timing)] == ["一、二、三。"]
+
+
+def test_long_segment_is_split_on_mora_boundaries():
+    text = "ウォルトは新キャラクター「オズワルド・ザ・ラッキー・ラビット」を生み出す。"
+    timing = SentenceTiming.from_query(text, 0.0, query([(30, 0)]))
+    cues = chapter_cues([timing])
+    assert "".join(c[2] for c in cues) == text
+    assert all(a[1] == b[0] for a, b in zip(cues, cues[1:]))
+    assert cues[-1][1] == pytest.approx(0.2 + 3.0)
+
+
+def test_timing_sidecar_is_tied_to_wav_size(tmp_path):
+    wav = tmp_path / "chapter1.wav"
+    wav.write_bytes(b"RIFF" + b"\0" * 40)
+    timing = SentenceTiming.from_query("はい。", 1.5, query([(2, 0)]))
+    write_timing(str(wav), [timing])
+    [loaded] = read_timing(str(wav))
+    assert sentence_cues(loaded) == pytest.approx(sentence_cues(timing))
+
+    wav.write_bytes(b"RIFF" + b"\0" * 80)  # 手で差し替えた WAV
+    assert read_timing(str(wav)) is None
+    assert read_timing(str(tmp_path / "missing.wav")) is None
@@ -0,0 +1,90 @@
+import pytest
+
+from makeshorts.subtitles import (
+    MIN_CHARS,
+    NO_LINE_END,
+    NO_LINE_START,
+    estimate_moras,
+    render_cues,
+    segment_and_time,
+    segment_text,
+)
+
+DISNEY_CH3 = "1927年、ウォルトは新キャラクター「オズワルド・ザ・ラッキー・ラビット」を生み出す。長い耳を持つウサギのキャラクター。"
+
+
+def assert_kinsoku(pieces):
+    for piece in pieces:
+        assert piece[0] not in NO_LINE_START, pieces
+        assert piece[-1] not in NO_LINE_END, pieces
+
+
+def test_compound_verb_is_not_split_and_tail_is_not_orphaned():
+    pieces = segment_text(DISNEY_CH3)
+    assert pieces == [
+        "1927年、",
+        "ウォルトは新キャラクター",
+        "「オズワルド・ザ・ラッキー・ラビット」を",
+        "生み出す。",
+        "長い耳を持つウサギのキャラクター。",
+    ]
+
+
+@pytest.mark.parametrize("text, joined", [
+    ("彼はカンザスシティで商業美術家としての道を歩み始める。", "歩み始める。"),
+    ("ウォルトはカンザスシティ・フィルム・アド社に職を得た。", "職を得た。"),
+])
+def test_never_breaks_inside_okurigana(text, joined):
+    pieces = segment_text(text)
+    assert pieces[-1] == joined
+    assert all(len(p) >= MIN_CHARS for p in pieces)
+
+
+def test_short_remainder_moves_break_earlier():
+    pieces = segment_text("しかしウォルトは自分の人生保険を担保に資金を調達。")
+    assert pieces == ["しかしウォルトは自分の人生保険を担保に", "資金を調達。"]
+
+
+def test_sentences_always_break_even_if_short():
+    assert segment_text("酷暑。肺癌。やがて夏が来た。") == ["酷暑。", "肺癌。", "やがて夏が来た。"]
+
+
+@pytest.mark.parametrize("text", [
+    "それは「ミッキーマウス」という名の小さなネズミだった。誰もがその笑顔に夢中になったのだった。",
+    "ウォルトは、ついに、長編アニメーション『白雪姫』の制作に乗り出した！周囲は「ディズニーの道楽」と笑った。",
+    "スタジオにはチャーリー・チャップリンやメアリー・ピックフォードのような大スターが訪れるようになった……",
+    "ジャッジャッジャッジャッジャッジャッジャッジャッジャッジャッジャッジャッジャッジャッ",
+])
+def test_kinsoku_and_length(text):
+    pieces = segment_text(text, max_chars=16)
+    assert_kinsoku(pieces)
+    assert "".join(pieces) == text.replace(" ", "")
+    assert all(len(p) <= 16 + MIN_CHARS - 1 for p in pieces)
+
+
+def test_closing_punctuation_stays_with_the_sentence():
+    pieces = segment_text("彼は言った。「夢を見続けよう。」そして笑った。", max_chars=10)
+    assert_kinsoku(pieces)
+    assert "「夢を見続けよう。」" in pieces
+
+
+def test_newline_is_a_sentence_break():
+    assert segment_text("第一章\n始まりの物語") == ["第一章", "始まりの物語"]
+
+
+def test_moras_weight_timing():
+    assert estimate_moras("きょう") == 2  # 拗音は直前の仮名と 1 モーラ
+    assert estimate_moras("あ、い。") == 1 + 2 + 1 + 4
+    cues = segment_and_time("あ。ああああああああ。", 10.0, 11.0)
+    assert [c.text for c in cues] == ["あ。", "ああああああああ。"]
+    assert cues[0].start == 10.0 and cues[-1].end == 21.0
+    assert cues[0].end == pytest.approx(10.0 + 11.0 * 5 / 17)
+
+
+def test_render_cues_align_to_frames():
+    cues = segment_and_time("最初の字幕。次の字幕。", 0.0, 1.0)
+    srt, vtt, clips = render_cues(cues, {"font_family": "x"}, 30)
+    assert srt.startswith("1\n00:00:00,000 --> ")
+    assert vtt.startswith("WEBVTT\n\n00:00:00.000 --> ")
+    assert clips[0]["start"] + clips[0]["duration"] == pytest.approx(clips[1]["start"])
+    assert [round(c["duration"] * 30) for c in clips] == [16, 14]  # 0.540s は 16 フレームに丸める
@@ -0,0 +1,41 @@
+import pytest
+
+from makeshorts.timeline import frame2sec, prefix_offsets, sec2frame, split_frames, validate_track
+
+
+def test_prefix_offsets_start_at_lead_and_end_at_total():
+    assert prefix_offsets([90, 45, 0, 30], lead=15) == [15, 105, 150, 150, 180]
+    assert prefix_offsets([]) == [0]
+
+
+@pytest.mark.parametrize("total, parts, expected", [
+    (100, 3, [33, 33, 34]),
+    (2, 3, [0, 0, 2]),
+    (90, 0, [90]),  # 0 分割は 1 分割扱い
+])
+def test_split_frames_puts_remainder_last(total, parts, expected):
+    assert split_frames(total, parts) == expected
+    assert sum(expected) == total
+
+
+def test_chapter_boundaries_do_not_drift_over_many_chapters():
+    fps = 30
+    # 1.333s の章を 1000 個並べても、秒で足し込んだときの誤差は出ない
+    lengths = [sec2frame(1.333, fps)] * 1000
+    offsets = prefix_offsets(lengths)
+    assert lengths[0] == 40
+    assert offsets[-1] == 40_000
+    assert frame2sec(offsets[-1], fps) == 1333.333  # 秒への変換はミリ秒で丸める
+    assert frame2sec(offsets[1], fps) == 1.333
+
+
+def test_sec2frame_rounds_to_nearest_frame():
+    assert [sec2frame(s, 30) for s in (0.016, 0.017, 1.0, "2.5")] == [0, 1, 30, 75]
+
+
+def test_validate_track_reports_gaps_and_excess_overlap():
+    spans = [(100, 50), (0, 100), (140, 60), (250, 10)]
+    issues = validate_track("video", spans, max_overlap=5)
+    assert [(i.kind, i.start_frame, i.end_frame) for i in issues] == [("overlap", 140, 150), ("gap", 200, 250)]
+    assert issues[1].describe(25) == "video: すき間 8.0s - 10.0s (50f)"
+    assert validate_track("video", spans, max_overlap=10, allow_gaps=True) == []
@@ -0,0 +1,114 @@
+import pytest
+
+from makeshorts.transport import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ClientError,
+    Endpoint,
+    RateLimitError,
+    RetryPolicy,
+    ServerError,
+    retry_call,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def tripped_endpoint(clock, threshold=2, reset_sec=30.0):
+    endpoint = Endpoint("test", failure_threshold=threshold, reset_sec=reset_sec)
+    endpoint.breaker = CircuitBreaker(threshold, reset_sec, clock=clock)
+    for _ in range(threshold):
+        endpoint.breaker.failure()
+    return endpoint
+
+
+def call(endpoint, fn, attempts=1):
+    return retry_call(endpoint, fn, RetryPolicy(max_attempts=attempts), sleep=lambda _: None)
+
+
+def raise_(exc):
+    def fn():
+        raise exc
+    return fn
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_reset():
+    clock = FakeClock()
+    breaker = CircuitBreaker(2, 30.0, clock=clock)
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    clock.now += 30
+    assert breaker.state == "half-open"
+    assert breaker.allow() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()  # 試しは 1 件だけ
+
+
+def test_trial_success_closes_and_trial_failure_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(2, 30.0, clock=clock)
+    breaker.failure()
+    breaker.failure()
+    clock.now += 30
+    breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open"
+    clock.now += 30
+    breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed"
+    assert breaker.allow() is False
+
+
+def test_retry_call_trips_breaker_on_server_errors():
+    clock = FakeClock()
+    endpoint = Endpoint("test")
+    endpoint.breaker = CircuitBreaker(2, 30.0, clock=clock)
+    with pytest.raises(ServerError):
+        call(endpoint, raise_(ServerError("boom")), attempts=2)
+    with pytest.raises(CircuitOpenError):
+        call(endpoint, lambda: "ok")
+
+
+@pytest.mark.parametrize("exc", [ValueError("bad payload"), ClientError("forbidden", status=403)])
+def test_trial_answered_with_non_transport_error_closes_breaker(exc):
+    clock = FakeClock()
+    endpoint = tripped_endpoint(clock)
+    clock.now += 30
+    with pytest.raises(type(exc)):
+        call(endpoint, raise_(exc))
+    assert endpoint.breaker.state == "closed"
+    assert call(endpoint, lambda: "ok") == "ok"
+
+
+def test_trial_rate_limited_rearms_breaker():
+    clock = FakeClock()
+    endpoint = tripped_endpoint(clock)
+    clock.now += 30
+    with pytest.raises(RateLimitError):
+        call(endpoint, raise_(RateLimitError("slow down", status=429)))
+    assert endpoint.breaker.state == "open"
+    clock.now += 30
+    assert call(endpoint, lambda: "ok") == "ok"
+    assert endpoint.breaker.state == "closed"
+
+
+def test_interrupted_trial_does_not_stick_open():
+    clock = FakeClock()
+    endpoint = tripped_endpoint(clock)
+    clock.now += 30
+    with pytest.raises(KeyboardInterrupt):
+        call(endpoint, raise_(KeyboardInterrupt()))
+    clock.now += 10_000
+    assert call(endpoint, lambda: "ok") == "ok"
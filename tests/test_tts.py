@@ -0,0 +1,83 @@
+import io
+import threading
+import wave
+
+import pytest
+
+from makeshorts.subtitle_timing import read_timing
+from makeshorts.tts import VoiceCache, VoicevoxClient, split_sentences, stitch_wavs
+
+RATE = 24000
+
+
+def make_wav(frames, rate=RATE):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\1\0" * frames)
+    return buf.getvalue()
+
+
+class FakeEngine(VoicevoxClient):
+    """HTTP を使わず、文字数に比例した長さの WAV を返すエンジン"""
+
+    def __init__(self, **kwargs):
+        super().__init__("http://engine.invalid", **kwargs)
+        self.queried = []
+        self._calls = threading.Lock()
+
+    def speaker_id(self, speaker):
+        return 3
+
+    def audio_query(self, text, speaker):
+        with self._calls:
+            self.queried.append(text)
+        moras = [{"consonant_length": 0.05, "vowel_length": 0.05}] * len(text)
+        return {"accent_phrases": [{"moras": moras, "pause_mora": None}], "prePhonemeLength": 0.1}
+
+    def synthesis(self, query, speaker):
+        return make_wav(int(RATE * 0.1 * len(query["accent_phrases"][0]["moras"])))
+
+
+def test_split_sentences_keeps_closing_brackets():
+    assert split_sentences("「行こう！」と言った。\nそして 歩いた") == ["「行こう！」", "と言った。", "そして 歩いた"]
+
+
+def test_only_changed_sentences_are_resynthesized(tmp_path):
+    cache = VoiceCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    out = str(tmp_path / "voice" / "chapter1.wav")
+
+    with FakeEngine(cache=cache) as engine:
+        [voice] = engine.synthesize_chapters([("最初の文。二番目の文。三番目。", out)], "ずんだもん")
+    assert sorted(engine.queried) == ["三番目。", "二番目の文。", "最初の文。"]
+    assert voice.cached == 0
+    assert voice.duration == pytest.approx(0.1 * (5 + 6 + 4))
+
+    with FakeEngine(cache=cache) as engine:
+        [voice] = engine.synthesize_chapters([("最初の文。書き換えた文。三番目。", out)], "ずんだもん")
+    assert engine.queried == ["書き換えた文。"]
+    assert [s.cached for s in voice.sentences] == [True, False, True]
+
+    timing = read_timing(out)
+    assert [s.text for s in timing] == ["最初の文。", "書き換えた文。", "三番目。"]
+    assert [s.offset for s in timing] == pytest.approx([0.0, 0.5, 1.2])
+
+
+def test_refresh_and_speed_bypass_the_cache(tmp_path):
+    cache = VoiceCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    with FakeEngine(cache=cache) as engine:
+        engine.synthesize("同じ文。", 3)
+        assert engine.synthesize("同じ文。", 3).cached
+        assert not engine.synthesize("同じ文。", 3, speed=1.2).cached
+    with FakeEngine(cache=cache, refresh=True) as engine:
+        assert not engine.synthesize("同じ文。", 3).cached
+        assert engine.queried == ["同じ文。"]
+
+
+def test_stitch_rejects_mismatched_formats(tmp_path):
+    out = str(tmp_path / "a.wav")
+    assert stitch_wavs([make_wav(RATE), make_wav(RATE // 2)], out) == [0.0, 1.0, 1.5]
+    with pytest.raises(ValueError):
+        stitch_wavs([make_wav(10), make_wav(10, rate=RATE * 2)], out)
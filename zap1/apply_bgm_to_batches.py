@@ -1,43 +1,43 @@
 import os
-import json
-import glob
+import sys
+
+# Add project root to Python path to allow importing from makeshorts
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from makeshorts.asset_index import shared_index
+from makeshorts.project_store import ProjectStore
 
 BGM_DIR = "zap1/bgm"
 SCRIPT_DIR = "zap1/outputs/scripts"
 
 def get_bgm_files():
-    """BGMフォルダ内のmp3/wav/m4aをソートして取得"""
-    bgm_files = sorted(
-        [f for f in os.listdir(BGM_DIR) if f.lower().endswith((".mp3", ".wav", ".m4a"))]
-    )
+    """BGMフォルダ内の曲（mp3/wav/m4a/flac）をタイムラインと同じ自然順で取得"""
+    assets = shared_index()
+    bgm_files = [os.path.basename(p) for p in assets.role_files(BGM_DIR, "bgm")]
+    assets.save()
     if not bgm_files:
         raise FileNotFoundError("⚠️ BGMフォルダが空です。zap1/bgm/ に曲を配置してください。")
     return bgm_files
 
 def assign_bgm_to_chapters():
-    """各章JSONに順番でBGMファイルを追加"""
+    """各章に順番でBGMファイルを割り当てる（プロジェクトストアの output_paths.bgm_path だけを更新）"""
     bgm_files = get_bgm_files()
-    batch_files = sorted(glob.glob(os.path.join(SCRIPT_DIR, "chapter_*.json")))
-
-    print(f"🎬 {len(bgm_files)}曲のBGMを {len(batch_files)}章に割り当てます。\n")
-
-    for i, batch_path in enumerate(batch_files):
-        with open(batch_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        bgm_file = bgm_files[i % len(bgm_files)]
-        bgm_path = os.path.join(BGM_DIR, bgm_file)
-
-        if "output_paths" not in data:
-            data["output_paths"] = {}
-        data["output_paths"]["bgm_path"] = bgm_path.replace("\\\\", "/") # Ensure forward slashes for paths
-
-        with open(batch_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-
-        print(f"✅ {os.path.basename(batch_path)} → 🎵 {bgm_file}")
-
-    print(f"\n🎶 全 {len(batch_files)}章へのBGM割り当て完了！")
+    store = ProjectStore.open_or_import(SCRIPT_DIR)  # 従来の chapter_*.json だけのワークスペースは取り込む
+    if store is None:
+        raise FileNotFoundError("⚠️ 章バッチがありません。先に make_all.py で章バッチを生成してください。")
+
+    with store:
+        package = store.latest_package()
+        chapters = store.chapters(package) if package else []
+        print(f"🎬 {len(bgm_files)}曲のBGMを {len(chapters)}章に割り当てます。\n")
+
+        for i, chapter in enumerate(chapters):
+            bgm_file = bgm_files[i % len(bgm_files)]
+            bgm_path = os.path.join(BGM_DIR, bgm_file)
+            store.set_field(package, chapter["id"], "output_paths.bgm_path",
+                            bgm_path.replace("\\\\", "/"), stage="bgm")  # Ensure forward slashes for paths
+            print(f"✅ {chapter['id']} → 🎵 {bgm_file}")
+
+    print(f"\n🎶 全 {len(chapters)}章へのBGM割り当て完了！")
 
 
 if __name__ == "__main__":
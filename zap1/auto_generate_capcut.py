@@ -1,28 +1,34 @@
 import os
-import json
-import glob
+import sys
+
+# Add project root to Python path to allow importing from makeshorts
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from makeshorts.asset_index import IMAGE_EXTS, shared_index
+from makeshorts.project_store import ProjectStore, chapter_filename
+from makeshorts.run_journal import write_json_atomic
 
 SCRIPT_DIR = "zap1/outputs/scripts"
 OUTPUT_DIR = "zap1/outputs/capcut_projects"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 def load_batches():
-    return sorted(glob.glob(os.path.join(SCRIPT_DIR, "chapter_*.json")))
-
-def make_capcut_project(chapter_json):
-    """各章JSONからCapCutプロジェクトJSONを構築"""
-    with open(chapter_json, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    """プロジェクトストアから最後に更新したパッケージの章バッチを章順に読む（従来の chapter_*.json は取り込む）"""
+    store = ProjectStore.open_or_import(SCRIPT_DIR)
+    if store is None:
+        raise FileNotFoundError("⚠️ 章バッチがありません。先に make_all.py で章バッチを生成してください。")
+    with store:
+        package = store.latest_package()
+        return store.chapters(package) if package else []
 
+def make_capcut_project(data):
+    """章バッチ（dict）からCapCutプロジェクトJSONを構築"""
     cid = data["id"]
     title = data["title"]
     duration = data.get("duration_sec", 150)
     
-    # Ensure image_dir exists and list files
+    # 章の画像一覧はアセットインデックスから引く（フォルダが無ければ空）
     image_dir_path = data["output_paths"]["image_dir"]
-    img_files = []
-    if os.path.exists(image_dir_path):
-        img_files = sorted([f for f in os.listdir(image_dir_path) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))])
+    img_files = shared_index().files(image_dir_path, IMAGE_EXTS + (".webp",))
     
     voice = data["output_paths"]["voice_path"]
     bgm = data["output_paths"].get("bgm_path")
@@ -43,7 +49,7 @@ def make_capcut_project(chapter_json):
         segment = duration / len(img_files)
         for i, img in enumerate(img_files):
             image_clips.append({
-                "path": os.path.join(image_dir_path, img).replace("\\\\", "/"), # Ensure forward slashes
+                "path": img.replace("\\\\", "/"), # Ensure forward slashes
                 "start": i * segment,
                 "duration": segment
             })
@@ -74,14 +80,13 @@ def make_capcut_project(chapter_json):
 
 def generate_all_capcut_projects():
     """全章分のCapCutプロジェクトを生成"""
-    files = load_batches()
-    for fpath in files:
-        ccproj = make_capcut_project(fpath)
-        out_name = os.path.basename(fpath).replace(".json", ".ccproj.json")
+    for chapter in load_batches():
+        ccproj = make_capcut_project(chapter)
+        out_name = chapter_filename(chapter).replace(".json", ".ccproj.json")
         out_path = os.path.join(OUTPUT_DIR, out_name)
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(ccproj, f, ensure_ascii=False, indent=2)
+        write_json_atomic(out_path, ccproj)
         print(f"🎞 {out_name} 生成完了")
+    shared_index().save()
 
 if __name__ == "__main__":
     generate_all_capcut_projects()
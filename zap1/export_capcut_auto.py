@@ -1,19 +1,33 @@
-import pyautogui
+try:
+    import pyautogui
+except Exception:  # GUIの無い環境でも --fake で待ち合わせ処理を確認できるようにする
+    pyautogui = None
 import subprocess
+import sys
 import time
 import os
 import argparse
 from pathlib import Path
 
+# Add project root to Python path to allow importing from makeshorts
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from makeshorts.export_queue import Exporter, ExportJob, ExportQueue, FakeExporter
+
 def parse_args():
     p = argparse.ArgumentParser()
-    p.add_argument("--project", required=True, help="Path to the CapCut project file (.ccproj)")
-    p.add_argument("--out",     required=True, help="Output path for the exported MP4 file")
-    return p.parse_args()
+    p.add_argument("--project", required=True, action="append", help="Path to the CapCut project file (.ccproj). 複数指定で順番に書き出し")
+    p.add_argument("--out",     required=True, action="append", help="Output path for the exported MP4 file（--project と同じ数だけ）")
+    p.add_argument("--timeout-factor", type=float, default=1.5, help="タイムライン1秒あたりに許す書き出し時間（秒）")
+    p.add_argument("--fake", action="store_true", help="GUIを操作せず FakeExporter で待ち合わせ処理だけ確認する")
+    a = p.parse_args()
+    if len(a.project) != len(a.out):
+        p.error("--project と --out は同じ数だけ指定してください")
+    return a
 
 # ========= 設定 =========
 CAPCUT_PATH = "/Applications/CapCut.app/Contents/MacOS/CapCut"
-EXPORT_WAIT_SEC = 60  # 書き出し時間（動画長に応じて調整）
+OPEN_WAIT_SEC = 15  # CapCutがプロジェクトを開くまでの待ち
+# 書き出し完了は出力MP4のサイズが安定し、コンテナが閉じたことで判定する（固定待ちはしない）
 # ========================
 
 def open_capcut(project_path):
@@ -27,8 +41,8 @@ def open_capcut(project_path):
         return False
         
     subprocess.Popen([CAPCUT_PATH, os.path.abspath(project_path)])
-    print("⏳ CapCutがプロジェクトを開くまで15秒待機します...")
-    time.sleep(15)  # CapCutがプロジェクトを開くまで待つ
+    print(f"⏳ CapCutがプロジェクトを開くまで{OPEN_WAIT_SEC}秒待機します...")
+    time.sleep(OPEN_WAIT_SEC)  # CapCutがプロジェクトを開くまで待つ
     return True
 
 def export_project(output_mp4_path):
@@ -62,13 +76,42 @@ def export_project(output_mp4_path):
 
     print(f"🖱️ 「エクスポート」確定ボタンをクリックします: {CONFIRM_BTN}")
     pyautogui.click(CONFIRM_BTN)
-    
-    print(f"💾 書き出し中... ({EXPORT_WAIT_SEC}秒待機します)")
-    time.sleep(EXPORT_WAIT_SEC)
-    
-    print(f"✅ エクスポート完了！保存先: {output_mp4_path}")
+    print(f"💾 書き出し中...（完了を監視します）: {output_mp4_path}")
+
+class CapCutGuiExporter(Exporter):
+    """CapCutを起動してGUI操作で書き出しを開始する（完了待ちは ExportQueue 側）"""
+    name = "CapCut"
+
+    def __init__(self):
+        self._error = None
+        self._launched = False
+
+    def start(self, job):
+        self._error = None
+        self._launched = False
+        if pyautogui is None:
+            self._error = "pyautogui を読み込めません（GUI環境で実行してください）"
+            return
+        if not open_capcut(job.project):
+            self._error = "CapCutでプロジェクトを開けませんでした"
+            return
+        self._launched = True
+        export_project(job.out)
+
+    def error(self):
+        return self._error
+
+    def finish(self, job, ok):
+        # 次のジョブのために閉じる（起動していなければ前面のアプリを終了させてしまうので何もしない）
+        if pyautogui is None or not self._launched:
+            return
+        self._launched = False
+        pyautogui.hotkey('command', 'q')
+        time.sleep(2)
 
 if __name__ == "__main__":
     args = parse_args()
-    if open_capcut(args.project):
-        export_project(args.out)
+    exporter = FakeExporter() if args.fake else CapCutGuiExporter()
+    queue = ExportQueue(exporter, timeout_factor=args.timeout_factor)
+    results = queue.run([ExportJob(project, out) for project, out in zip(args.project, args.out)])
+    sys.exit(0 if all(r.ok for r in results) else 1)
@@ -1,9 +1,12 @@
 import os
+import sys
 import json
-import base64
-import requests
-from google.oauth2 import service_account
-from google.auth.transport.requests import Request
+
+# Add project root to Python path to allow importing from makeshorts
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from makeshorts.credentials import get_token_provider
+from makeshorts.image_post import ImagePostError, ImagePostProcessor, summarize_variants
+from makeshorts.imagen import ImageJob, ImagenEngine
 
 # ========= 設定 =========
 # ダウンロードしたJSONファイルのパスを指定
@@ -23,123 +26,110 @@ MODEL = "imagegeneration@006"  # Imagen 3.0
 
 # Vertex AI エンドポイント
 ENDPOINT = f"https://{LOCATION}-aiplatform.googleapis.com/v1/projects/{PROJECT_ID}/locations/{LOCATION}/publishers/google/models/{MODEL}:predict"
+
+# 並列数と 1 分あたりのリクエスト上限（プロジェクトのクォータに合わせて調整）
+MAX_WORKERS = 4
+REQUESTS_PER_MINUTE = 60
+# 1 回の predict にまとめるシーン数（1 なら従来どおり 1 枚ずつ。エンドポイントが拒めば自動で縮める）
+BATCH_SIZE = 1
 # ========================
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # 認証
 def get_access_token():
-    """サービスアカウントキーからアクセストークンを取得"""
-    credentials = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE,
-        scopes=["https://www.googleapis.com/auth/cloud-platform"]
-    )
-    credentials.refresh(Request())
-    return credentials.token
-
-if not os.path.exists(META_PATH):
-    raise FileNotFoundError(f"❌ meta.jsonが見つかりません: {META_PATH}")
-
-with open(META_PATH, "r", encoding="utf-8") as f:
-    meta = json.load(f)
-
-title = meta.get("title", "untitled")
-prompts = meta.get("image_prompts", [])
-
-if not prompts:
-    raise ValueError("❌ meta.json に image_prompts が含まれていません。")
-
-print(f"\n==============================")
-print(f"🎬 タイトル: {title}")
-print(f"🖼 生成シーン数: {len(prompts)} 枚")
-print(f"🧠 使用モデル: Imagen 3.0 (Vertex AI)")
-print(f"📍 プロジェクト: {PROJECT_ID}")
-print(f"🌐 リージョン: {LOCATION}")
-print("==============================\n")
-
-# アクセストークン取得
-try:
-    access_token = get_access_token()
-    print("✅ 認証成功\n")
-except Exception as e:
-    print(f"❌ 認証エラー: {e}")
-    print("\n📝 確認事項:")
-    print("   1. SERVICE_ACCOUNT_FILE のパスが正しいか")
-    print("   2. JSONファイルが有効か")
-    print("   3. サービスアカウントに適切なロールが付与されているか")
-    exit(1)
-
-headers = {
-    "Authorization": f"Bearer {access_token}",
-    "Content-Type": "application/json"
-}
-
-for i, prompt in enumerate(prompts, start=1):
-    print(f"\n🧩 Scene {i} を生成中...")
-    
-    full_prompt = (
+    """サービスアカウントキーからアクセストークンを取得（期限の少し前までプロセス内で使い回す）"""
+    return get_token_provider(SERVICE_ACCOUNT_FILE).token()
+
+def build_full_prompt(prompt):
+    return (
         f"Cinematic ultra-realistic vertical 9:16 image. "
         f"{prompt} "
         f"Dynamic lighting, dramatic colors, detailed textures, 4K quality."
     )
-    
-    payload = {
-        "instances": [
-            {
-                "prompt": full_prompt
-            }
-        ],
-        "parameters": {
-            "sampleCount": 1,
-            "aspectRatio": "9:16",
-            "mode": "generate"
-        }
-    }
-    
-    print(f"📝 プロンプト: {prompt[:80]}...")
-    
-    try:
-        response = requests.post(
-            ENDPOINT,
-            headers=headers,
-            json=payload,
-            timeout=120
-        )
-        
-        print(f"📥 ステータスコード: {response.status_code}")
-        
-        if response.status_code != 200:
-            print("❌ エラー:")
-            print(json.dumps(response.json(), indent=2, ensure_ascii=False))
-            continue
-        
-        data = response.json()
-        
-        # 画像データを抽出
-        predictions = data.get("predictions", [])
-        if not predictions:
-            print("⚠️ 画像が生成されませんでした")
-            continue
-        
-        image_data = predictions[0].get("bytesBase64Encoded")
-        if not image_data:
-            print("⚠️ 画像データが見つかりませんでした")
-            print(json.dumps(data, indent=2, ensure_ascii=False))
-            continue
-        
-        # 画像を保存
-        file_name = os.path.join(OUTPUT_DIR, f"{i:02d}_{title}_scene.png")
-        with open(file_name, "wb") as f:
-            f.write(base64.b64decode(image_data))
-        
-        print(f"✅ 画像保存完了: {file_name}")
-        
-    except Exception as e:
-        print(f"⚠️ Scene {i} で例外発生: {e}")
 
-print("\n🎉 全シーンの生成が完了しました!")
-print(f"📁 出力フォルダ: {os.path.abspath(OUTPUT_DIR)}")
+def main():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    if not os.path.exists(META_PATH):
+        raise FileNotFoundError(f"❌ meta.jsonが見つかりません: {META_PATH}")
+
+    with open(META_PATH, "r", encoding="utf-8") as f:
+        meta = json.load(f)
 
-# コスト概算を表示
-cost = len(prompts) * 0.04
-print(f"\n💰 概算コスト: ${cost:.2f} USD")
\ No newline at end of file
+    title = meta.get("title", "untitled")
+    prompts = meta.get("image_prompts", [])
+
+    if not prompts:
+        raise ValueError("❌ meta.json に image_prompts が含まれていません。")
+
+    print(f"\n==============================")
+    print(f"🎬 タイトル: {title}")
+    print(f"🖼 生成シーン数: {len(prompts)} 枚")
+    print(f"🧠 使用モデル: Imagen 3.0 (Vertex AI)")
+    print(f"📍 プロジェクト: {PROJECT_ID}")
+    print(f"🌐 リージョン: {LOCATION}")
+    print(f"⚡ 並列数: {MAX_WORKERS}")
+    print("==============================\n")
+
+    # アクセストークン取得
+    try:
+        get_access_token()
+        print("✅ 認証成功\n")
+    except Exception as e:
+        print(f"❌ 認証エラー: {e}")
+        print("\n📝 確認事項:")
+        print("   1. SERVICE_ACCOUNT_FILE のパスが正しいか")
+        print("   2. JSONファイルが有効か")
+        print("   3. サービスアカウントに適切なロールが付与されているか")
+        exit(1)
+
+    # image_groups（章・slot）があれば、違う章のシーンは同じ predict にまとめない
+    groups = list(meta.get("image_groups") or [])
+    groups += [None] * (len(prompts) - len(groups))
+    jobs = [
+        ImageJob(i, build_full_prompt(prompt), os.path.join(OUTPUT_DIR, f"{i:02d}_{title}_scene.png"), group=group)
+        for i, (prompt, group) in enumerate(zip(prompts, groups), start=1)
+    ]
+
+    # 保存できた画像から順に、編集用プロキシ（proxy/*.jpg）を別プロセスで作る
+    try:
+        post = ImagePostProcessor()
+    except ImagePostError as e:
+        print(f"⚠️ {e}（プロキシは作りません）")
+        post = None
+
+    def report(result):
+        print(f"\n🧩 Scene {result.job.index} ({result.elapsed:.1f}s)")
+        if result.ok:
+            print(f"✅ 画像保存完了: {result.path}")
+            if post is not None:
+                post.submit(result.path)
+        else:
+            print(f"⚠️ Scene {result.job.index} で失敗: {result.error}")
+
+    engine = ImagenEngine(
+        ENDPOINT,
+        get_token_provider(SERVICE_ACCOUNT_FILE).token,
+        project_id=PROJECT_ID,
+        max_workers=MAX_WORKERS,
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        aspect_ratio="9:16",
+        parameters={"mode": "generate"},
+        batch_size=BATCH_SIZE,
+    )
+    with engine:
+        results = engine.render(jobs, on_result=report)
+    if post is not None:
+        with post:
+            summarize_variants(post.wait())
+    success_count = sum(1 for r in results if r.ok)
+
+    print(f"\n🎉 全シーンの生成が完了しました! ({success_count}/{len(prompts)} 枚)")
+    print(f"📁 出力フォルダ: {os.path.abspath(OUTPUT_DIR)}")
+
+    # コスト概算を表示
+    cost = success_count * 0.04
+    print(f"\n💰 概算コスト: ${cost:.2f} USD")
+
+if __name__ == "__main__":
+    main()
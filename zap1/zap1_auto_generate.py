@@ -1,66 +1,46 @@
 import sys
 import os
 import argparse
-import json
 from tqdm import tqdm
 
 # Add project root to Python path to allow importing from gemini_cli
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from gemini_cli.api import GeminiAPI
+from gemini_cli.batch import PromptJob, run_jobs
+from makeshorts.build_manifest import digest
+from makeshorts.run_journal import JournalError, RunJournal, write_json_atomic
 
-def main():
-    """
-    Generates scripts for each chapter of a person's story and creates a meta.json file.
-    """
-    parser = argparse.ArgumentParser(description="Generate scripts and meta.json for a person's story.")
-    parser.add_argument("--person", required=True, help="The name of the person to generate a story about.")
-    args = parser.parse_args()
-    person = args.person
+OUTPUT_DIR = "zap1/outputs"
+SCRIPT_LENGTH = 1100  # characters per chapter
 
-    gemini = GeminiAPI()
-    output_dir = "zap1/outputs"
-    scripts_dir = os.path.join(output_dir, "scripts")
-    os.makedirs(scripts_dir, exist_ok=True)
+# Chapter information (ids are shared with the voice/images folders and the timeline)
+CHAPTERS = [
+    {"id": "opening", "title": "プロローグ", "bgm": "dramatic.mp3"},
+    {"id": "chapter1", "title": "少年時代", "bgm": "calm.mp3"},
+    {"id": "chapter2", "title": "挑戦と失敗", "bgm": "tense.mp3"},
+    {"id": "chapter3", "title": "新たなる希望", "bgm": "inspiring.mp3"},
+    {"id": "chapter4", "title": "栄光と代償", "bgm": "tense.mp3"},
+    {"id": "ending", "title": "エピローグ", "bgm": "inspiring.mp3"}
+]
 
-    # 1. Define chapter information
-    chapters_config = [
-        {"id": "opening", "title": "プロローグ", "bgm": "dramatic.mp3"},
-        {"id": "chapter1", "title": "少年時代", "bgm": "calm.mp3"},
-        {"id": "chapter2", "title": "挑戦と失敗", "bgm": "tense.mp3"},
-        {"id": "chapter3", "title": "新たなる希望", "bgm": "inspiring.mp3"},
-        {"id": "chapter4", "title": "栄光と代償", "bgm": "tense.mp3"},
-        {"id": "ending", "title": "エピローグ", "bgm": "inspiring.mp3"}
+def script_jobs(person, scripts_dir):
+    """One PromptJob per chapter, writing <scripts_dir>/<chapter id>.txt."""
+    return [
+        PromptJob(
+            id=ch["id"],
+            output=os.path.join(scripts_dir, f"{ch['id']}.txt"),
+            person=person,
+            task="script",
+            section=ch["title"],
+            length=SCRIPT_LENGTH,
+        )
+        for ch in CHAPTERS
     ]
 
-    prompt_template = open("gemini_cli/prompts/script.txt", "r", encoding="utf-8").read()
-
-    print(f"🎬 {person}の物語の生成を開始します...")
-
-    # 2. & 3. Loop through chapters with a progress bar
-    for ch in tqdm(chapters_config, desc="各章の台本を生成中"):
-        chapter_id = ch["id"]
-        chapter_title = ch["title"]
-        
-        chapter_path = os.path.join(scripts_dir, f"{chapter_id}.txt")
-
-        if os.path.exists(chapter_path):
-            tqdm.write(f"⏩ スキップ: {chapter_title} ({chapter_id}.txt は既に存在します)")
-            continue
-
-        tqdm.write(f"⏳ 生成中: {chapter_title}")
-        
-        # Generate script text
-        prompt = prompt_template.format(person=person, section=chapter_title, length=1100)
-        text = gemini.generate_text(prompt)
-        
-        with open(chapter_path, "w", encoding="utf-8") as f:
-            f.write(text)
-        
-        tqdm.write(f"✅ 保存完了: {chapter_path}")
-
-    # 4. Create meta.json after all chapters are processed
+def write_meta(person, output_dir, journal):
+    """Writes meta.json once every chapter script exists and returns its path."""
     meta_chapters = []
-    for ch in chapters_config:
+    for ch in CHAPTERS:
         meta_chapters.append({
             "id": ch["id"],
             "title": ch["title"],
@@ -74,8 +54,70 @@ def main():
     }
 
     meta_path = os.path.join(output_dir, "meta.json")
-    with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump(meta_content, f, ensure_ascii=False, indent=2)
+    journal.add("meta", inputs=digest(meta_content), output=meta_path)
+    if not journal.is_done("meta"):
+        journal.start("meta")
+        write_json_atomic(meta_path, meta_content)
+        journal.finish("meta")
+    return meta_path
+
+def main(argv=None):
+    """
+    Generates scripts for each chapter of a person's story and creates a meta.json file.
+    """
+    parser = argparse.ArgumentParser(description="Generate scripts and meta.json for a person's story.")
+    parser.add_argument("--person", help="The name of the person to generate a story about.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of chapters generated concurrently.")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Resume an interrupted run; only unfinished chapters are regenerated.")
+    args = parser.parse_args(argv)
+    if args.resume:
+        try:
+            journal = RunJournal.open(args.resume, command="script")
+        except JournalError as e:
+            parser.error(str(e))
+        person = journal.params["person"]
+    elif args.person:
+        person = args.person
+        journal = RunJournal.create("script", {"person": person})
+    else:
+        parser.error("--person or --resume is required")
+
+    gemini = GeminiAPI()
+    output_dir = OUTPUT_DIR
+    scripts_dir = os.path.join(output_dir, "scripts")
+    os.makedirs(scripts_dir, exist_ok=True)
+
+    print(f"🎬 {person}の物語の生成を開始します...")
+    print(f"📒 ラン ID: {journal.run_id}")
+
+    # 1. - 3. Generate all chapters (CHAPTERS) concurrently through one GeminiAPI
+    jobs = script_jobs(person, scripts_dir)
+
+    with tqdm(total=len(jobs), desc="各章の台本を生成中") as progress:
+        def report(result):
+            job = result.job
+            if result.status == "skipped":
+                tqdm.write(f"⏩ スキップ: {job.section} ({job.id}.txt は既に存在します)")
+            elif result.status == "done":
+                tqdm.write(f"✅ 保存完了: {job.output}")
+            else:
+                tqdm.write(f"❌ 生成失敗: {job.section} ({result.error})")
+            progress.update(1)
+
+        results = run_jobs(jobs, gemini, workers=args.workers, on_result=report, journal=journal)
+
+    failed = [r.job.id for r in results if r.status == "failed"]
+    if failed:
+        # 欠けた台本を参照する meta.json は作らない（--resume で未生成の章だけ再試行します）
+        print(f"❌ 生成に失敗した章があります: {', '.join(failed)}")
+        print(journal.summary())
+        journal.close()
+        raise SystemExit(1)
+
+    # 4. Create meta.json after all chapters are processed
+    meta_path = write_meta(person, output_dir, journal)
+    print(journal.summary())
+    journal.close()
 
     # 6. Display final message
     print(f"\n✨ すべての章が生成され、{meta_path}を出力しました。")
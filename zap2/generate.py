@@ -1,11 +1,16 @@
 import os
+import sys
 import json
-import base64
 from typing import Iterable, List, Optional, Sequence, Tuple
 
-import requests
-from google.oauth2 import service_account
-from google.auth.transport.requests import Request
+# Add project root to Python path to allow importing from makeshorts
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from makeshorts.build_manifest import digest
+from makeshorts.credentials import get_token_provider
+from makeshorts.image_cache import ImageCache
+from makeshorts.image_post import ImagePostError, ImagePostProcessor, PostOptions, summarize_variants
+from makeshorts.imagen import ImageJob, ImageResult, ImagenEngine
+from makeshorts.run_journal import JournalError, RunJournal
 
 # config.py から設定を読み込み
 try:
@@ -19,14 +24,9 @@ except ImportError:
 
 
 def get_access_token() -> str:
-    """GCPアクセストークンを取得"""
+    """GCPアクセストークンを取得（期限の少し前までプロセス内で使い回す）"""
     try:
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE,
-            scopes=["https://www.googleapis.com/auth/cloud-platform"],
-        )
-        credentials.refresh(Request())
-        return credentials.token
+        return get_token_provider(SERVICE_ACCOUNT_FILE).token()
     except FileNotFoundError:
         print(f"❌ {SERVICE_ACCOUNT_FILE} が見つかりません")
         print("📝 GCPサービスアカウントキーを配置してください")
@@ -36,8 +36,11 @@ def get_access_token() -> str:
         exit(1)
 
 
-def load_meta(meta_file: Optional[str] = None) -> Tuple[str, List[str]]:
-    """meta.json からタイトルとプロンプト一覧を取得"""
+def load_meta(meta_file: Optional[str] = None) -> Tuple[str, List[str], List[Optional[str]]]:
+    """meta.json からタイトル・プロンプト一覧・プロンプトごとの group（章。無ければ None）を取得
+
+    make_all の入力パッケージ（master.json）を渡した場合は package.thumbnails の still_prompt を slot ごとにまとめる。
+    """
 
     meta_file = meta_file or META_FILE
 
@@ -47,13 +50,188 @@ def load_meta(meta_file: Optional[str] = None) -> Tuple[str, List[str]]:
     with open(meta_file, "r", encoding="utf-8") as f:
         meta = json.load(f)
 
+    package = meta.get("package")
+    if isinstance(package, dict) and package.get("thumbnails"):
+        thumbnails = [t for t in package["thumbnails"] if t.get("still_prompt")]
+        title = package.get("person") or "untitled"
+        return title, [t["still_prompt"] for t in thumbnails], [t.get("slot") for t in thumbnails]
+
     title = meta.get("title", "untitled")
     prompts = meta.get("image_prompts", [])
 
     if not isinstance(prompts, Sequence) or not prompts:
         raise ValueError("image_prompts が含まれていません")
 
-    return title, list(prompts)
+    groups = list(meta.get("image_groups") or [])
+    groups += [None] * (len(prompts) - len(groups))
+    return title, list(prompts), groups[:len(prompts)]
+
+
+def open_image_engine(
+    *,
+    aspect_ratio: str = "9:16",
+    sample_count: int = 1,
+    max_workers: int = 4,
+    requests_per_minute: float = 60,
+    use_cache: bool = True,
+    refresh: bool = False,
+    batch_size: int = 1,
+) -> ImagenEngine:
+    """認証を済ませ、config.py の設定で ImagenEngine を作る"""
+
+    print("🔑 GCP認証中...")
+    get_access_token()
+    print("✅ 認証成功\n")
+
+    return ImagenEngine(
+        ENDPOINT,
+        get_token_provider(SERVICE_ACCOUNT_FILE).token,
+        project_id=PROJECT_ID,
+        max_workers=max_workers,
+        requests_per_minute=requests_per_minute,
+        aspect_ratio=aspect_ratio,
+        sample_count=sample_count,
+        cache=ImageCache() if use_cache else None,
+        refresh=refresh,
+        batch_size=batch_size,
+    )
+
+
+def report_image_result(result: ImageResult, total: Optional[int] = None) -> None:
+    """1 枚分の結果を表示（total が未確定なら分母を省略）"""
+    job = result.job
+    print(f"\n{'─' * 70}")
+    print(f"🎨 Scene {job.index}{f'/{total}' if total else ''} ({result.elapsed:.1f}s)")
+    print(f"📝 プロンプト: {job.prompt[:100]}...")
+    if result.cached:
+        print(f"♻️  キャッシュから配置: {result.path}")
+    elif result.ok:
+        print(f"✅ 保存完了: {result.path}")
+    else:
+        print(f"❌ エラー: {result.error}")
+
+
+def summarize_image_results(results: List[ImageResult], output_dir: str) -> int:
+    """完了サマリを表示して成功枚数を返す"""
+    success_count = sum(1 for result in results if result.ok)
+    rendered_count = sum(1 for result in results if result.ok and not result.cached)
+
+    print(f"\n{'=' * 70}")
+    print(f"🎉 完了！ {success_count}/{len(results)} 枚生成（うちキャッシュ {success_count - rendered_count} 枚）")
+    print(f"📁 保存先: {os.path.abspath(output_dir)}")
+    print(f"💰 概算コスト: ${rendered_count * 0.04:.2f} USD")
+    print(f"{'=' * 70}\n")
+
+    return success_count
+
+
+def scene_task(job: ImageJob) -> str:
+    """ジャーナル上のタスク名（シーン番号。保存ファイル名と同じく 1 始まり）"""
+    return f"scene:{job.index:02d}"
+
+
+def add_scene(journal: RunJournal, job: ImageJob) -> bool:
+    """シーンをジャーナルに登録し、描く必要があるか（完了済みで出力も無事なら False）を返す"""
+    params = journal.params
+    journal.add(scene_task(job), inputs=digest(job.prompt, params["aspect_ratio"], params["sample_count"]), output=job.filename)
+    return not journal.is_done(scene_task(job))
+
+
+class ImageRun:
+    """描画結果をジャーナル・進捗表示・プロキシ作成へ流す（通常モードと shorts_pipeline のストリーミングで共用）
+
+    hold_post=True なら保存先が仮の名前なので、on_result ではプロキシを作らず、最終名へ付け替えてから post_process する。
+    """
+
+    def __init__(
+        self,
+        journal: RunJournal,
+        *,
+        total: Optional[int] = None,
+        proxies: bool = True,
+        transcode: Optional[str] = None,
+        hold_post: bool = False,
+    ) -> None:
+        self.journal = journal
+        self.total = total
+        self.hold_post = hold_post
+        self.post = None
+        if proxies or transcode:
+            try:
+                self.post = ImagePostProcessor(PostOptions(proxy=proxies, transcode=transcode))
+            except ImagePostError as exc:
+                print(f"⚠️ {exc}（プロキシは作らずマスターのみ保存します）")
+
+    def start(self, job: ImageJob) -> None:
+        self.journal.start(scene_task(job))  # 投入した時点で running（落ちたら再開時に描き直す）
+
+    def on_result(self, result: ImageResult) -> None:
+        if result.ok:
+            self.journal.finish(scene_task(result.job), result.path)
+        else:
+            self.journal.fail(scene_task(result.job), result.error or "")
+        report_image_result(result, self.total)
+        if result.ok and not self.hold_post:
+            self.post_process(result.path)
+
+    def post_process(self, path: str) -> None:
+        if self.post is not None:
+            self.post.submit(path)
+
+    def close(self) -> None:
+        """プロキシの作成を待ってジャーナルを閉じる（2 回呼んでもよい）"""
+        post, self.post = self.post, None
+        if post is not None:
+            with post:
+                summarize_variants(post.wait())
+        self.journal.close()
+
+
+def open_streaming_run(
+    output_dir: str = OUTPUT_DIR,
+    *,
+    aspect_ratio: str = "9:16",
+    sample_count: int = 1,
+    proxies: bool = True,
+    transcode: Optional[str] = None,
+) -> ImageRun:
+    """プロンプトが出そろう前に始めるラン（タイトル・プロンプトは finish_streamed_run で確定する）"""
+    os.makedirs(output_dir, exist_ok=True)
+    journal = RunJournal.create("images", {
+        "title": None,
+        "prompts": [],
+        "groups": [],
+        "output_dir": output_dir,
+        "aspect_ratio": aspect_ratio,
+        "sample_count": sample_count,
+    })
+    print(f"📒 ラン ID: {journal.run_id}")
+    return ImageRun(journal, proxies=proxies, transcode=transcode, hold_post=True)
+
+
+def finish_streamed_run(run: ImageRun, results: List[ImageResult], title: str) -> int:
+    """仮の名前で保存した画像を通常モードと同じ名前に付け替え、ジャーナルとプロキシも最終名で確定する"""
+    output_dir = run.journal.params["output_dir"]
+    run.journal.update_params(
+        title=title,
+        prompts=[result.job.prompt for result in results],
+        groups=[result.job.group for result in results],
+    )
+    for result in results:
+        job = result.job
+        final = ImageJob(job.index, job.prompt, os.path.join(output_dir, f"{job.index:02d}_{title}.png"), group=job.group)
+        add_scene(run.journal, final)  # 出力先が変わるので pending に戻し、付け替えてから done / failed を書き直す
+        if result.ok:
+            os.replace(result.path, final.filename)
+            result.path = final.filename
+            run.journal.finish(scene_task(final), final.filename)
+            run.post_process(final.filename)
+        else:
+            run.journal.fail(scene_task(final), result.error or "")
+    run.close()
+    success_count = summarize_image_results(results, output_dir)
+    print(run.journal.summary())
+    return success_count
 
 
 def generate_images_from_prompts(
@@ -63,90 +241,124 @@ def generate_images_from_prompts(
     output_dir: str = OUTPUT_DIR,
     aspect_ratio: str = "9:16",
     sample_count: int = 1,
+    max_workers: int = 4,
+    requests_per_minute: float = 60,
+    use_cache: bool = True,
+    refresh: bool = False,
+    proxies: bool = True,
+    transcode: Optional[str] = None,
+    batch_size: int = 1,
+    journal: Optional[RunJournal] = None,
+    groups: Optional[Sequence[Optional[str]]] = None,
 ) -> int:
-    """指定したプロンプト一覧から画像を生成して保存"""
-
-    prompt_list = [prompt for prompt in prompts if prompt]
+    """指定したプロンプト一覧から画像を並列生成して保存
+
+    use_cache=True なら同一リクエストの画像はキャッシュから配置し、課金・通信を省く。
+    refresh=True ならキャッシュを読まずに再生成し、結果でキャッシュを上書きする。
+    proxies=True なら保存できた画像から順に編集用プロキシ（と transcode 形式の変換版）を別プロセスで作る。
+    batch_size > 1 なら最大その枚数のプロンプトを 1 回の predict にまとめる（保存ファイル名は同じ）。
+    groups（prompts と同じ並び・空のプロンプトの分も含む章・slot）を渡すと、違う group のプロンプトは同じ predict に入れない。
+    シーンごとの状態はランのジャーナルに記録する（途中で落ちたら resume_images / --resume で未完了分だけ描画）。
+    """
+
+    prompts = list(prompts)  # ジェネレータなど 1 回しか回せないものも受け取る
+    groups = list(groups or [])[:len(prompts)]
+    groups += [None] * (len(prompts) - len(groups))
+    # 先に group と組にしてから空のプロンプトを落とす（残したプロンプトと group の対応がずれない）
+    scenes = [(prompt, group) for prompt, group in zip(prompts, groups) if prompt]
+    prompt_list = [prompt for prompt, _ in scenes]
     if not prompt_list:
         raise ValueError("プロンプトが空です")
 
     os.makedirs(output_dir, exist_ok=True)
+    if journal is None:
+        # 再開時にプロンプトごと復元できるよう、ランの引数をすべてジャーナルに残す
+        journal = RunJournal.create("images", {
+            "title": title,
+            "prompts": prompt_list,
+            "groups": [group for _, group in scenes],
+            "output_dir": output_dir,
+            "aspect_ratio": aspect_ratio,
+            "sample_count": sample_count,
+        })
 
     print(f"\n{'=' * 70}")
     print(f"🎬 タイトル: {title}")
     print(f"🖼️  生成枚数: {len(prompt_list)} 枚")
     print(f"🧠 モデル: Imagen 3.0 (Vertex AI)")
     print(f"📍 プロジェクト: {PROJECT_ID}")
+    print(f"⚡ 並列数: {max_workers} / 上限 {requests_per_minute:g} req/min" + (f" / {batch_size} 枚ずつまとめて送信" if batch_size > 1 else ""))
+    print(f"📒 ラン ID: {journal.run_id}")
     print(f"{'=' * 70}\n")
 
-    print("🔑 GCP認証中...")
-    access_token = get_access_token()
-    print("✅ 認証成功\n")
-
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-    }
-
-    success_count = 0
-
-    for index, prompt in enumerate(prompt_list, start=1):
-        print(f"\n{'─' * 70}")
-        print(f"🎨 Scene {index}/{len(prompt_list)} 生成中...")
-        print(f"📝 プロンプト: {prompt[:100]}...")
-
-        payload = {
-            "instances": [{"prompt": prompt}],
-            "parameters": {
-                "sampleCount": sample_count,
-                "aspectRatio": aspect_ratio,
-            },
-        }
-
-        try:
-            response = requests.post(ENDPOINT, headers=headers, json=payload, timeout=120)
-
-            if response.status_code != 200:
-                print(f"❌ エラー (Status {response.status_code}):")
-                print(response.text[:200])
-                continue
-
-            data = response.json()
-            image_data = data.get("predictions", [{}])[0].get("bytesBase64Encoded")
-
-            if not image_data:
-                print("⚠️  画像データが見つかりませんでした")
-                continue
-
-            filename = os.path.join(output_dir, f"{index:02d}_{title}.png")
-
-            with open(filename, "wb") as file_obj:
-                file_obj.write(base64.b64decode(image_data))
-
-            print(f"✅ 保存完了: {filename}")
-            success_count += 1
-
-        except requests.exceptions.Timeout:
-            print("⏱️  タイムアウト")
-        except Exception as exc:  # pragma: no cover - runtime feedback only
-            print(f"⚠️  エラー: {exc}")
-
-    print(f"\n{'=' * 70}")
-    print(f"🎉 完了！ {success_count}/{len(prompt_list)} 枚生成")
-    print(f"📁 保存先: {os.path.abspath(output_dir)}")
-    print(f"💰 概算コスト: ${success_count * 0.04:.2f} USD")
-    print(f"{'=' * 70}\n")
-
-    return success_count
-
-
-def generate_images(meta_file: Optional[str] = None) -> int:
+    all_jobs = [
+        ImageJob(index, prompt, os.path.join(output_dir, f"{index:02d}_{title}.png"), group=group)
+        for index, (prompt, group) in enumerate(scenes, start=1)
+    ]
+    jobs = [job for job in all_jobs if add_scene(journal, job)]
+    finished = len(all_jobs) - len(jobs)
+    if finished:
+        print(f"⏩ 前回までに完了済み: {finished}/{len(all_jobs)} 枚（出力のチェックサムを確認済み）")
+    if not jobs:
+        print(journal.summary())
+        journal.close()
+        return finished
+
+    engine = open_image_engine(
+        aspect_ratio=aspect_ratio,
+        sample_count=sample_count,
+        max_workers=max_workers,
+        requests_per_minute=requests_per_minute,
+        use_cache=use_cache,
+        refresh=refresh,
+        batch_size=batch_size,
+    )
+    run = ImageRun(journal, total=len(all_jobs), proxies=proxies, transcode=transcode)
+    for job in jobs:
+        run.start(job)
+    with engine, journal:
+        results = engine.render(jobs, on_result=run.on_result)
+    run.close()
+
+    success_count = summarize_image_results(results, output_dir)
+    print(journal.summary())
+    return finished + success_count
+
+
+def resume_images(run_id: str, **options) -> int:
+    """中断した画像生成ランを、ジャーナルに残したプロンプトと保存先で再開する（完了済みのシーンは描かない）"""
+    journal = RunJournal.open(run_id, command="images")
+    params = journal.params
+    if not params.get("title") or not params.get("prompts"):
+        journal.close()
+        raise JournalError(f"{run_id} は台本の応答が終わる前に中断したランです（再開できません。生成し直してください）")
+    return generate_images_from_prompts(
+        params["prompts"],
+        params["title"],
+        output_dir=params["output_dir"],
+        aspect_ratio=params["aspect_ratio"],
+        sample_count=params["sample_count"],
+        journal=journal,
+        groups=params.get("groups"),
+        **options,
+    )
+
+
+def generate_images(
+    meta_file: Optional[str] = None,
+    *,
+    use_cache: bool = True,
+    refresh: bool = False,
+    proxies: bool = True,
+    transcode: Optional[str] = None,
+    batch_size: int = 1,
+) -> int:
     """meta.json を読み込み、画像を生成"""
 
     meta_file = meta_file or META_FILE
 
     try:
-        title, prompts = load_meta(meta_file)
+        title, prompts, groups = load_meta(meta_file)
     except FileNotFoundError:
         print(f"❌ {meta_file} が見つかりません")
         print("📝 create_meta.py を実行してプロンプトを作成してください")
@@ -155,8 +367,42 @@ def generate_images(meta_file: Optional[str] = None) -> int:
         print(f"❌ {exc}")
         exit(1)
 
-    return generate_images_from_prompts(prompts, title)
+    return generate_images_from_prompts(
+        prompts,
+        title,
+        use_cache=use_cache,
+        refresh=refresh,
+        proxies=proxies,
+        transcode=transcode,
+        batch_size=batch_size,
+        groups=groups,
+    )
 
 
 if __name__ == "__main__":
-    generate_images()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="meta.json のプロンプトから画像を生成")
+    parser.add_argument("--meta", default=None, help="meta.json（または master.json）のパス（省略時は config.META_FILE）")
+    parser.add_argument("--no-cache", action="store_true", help="画像キャッシュを使わない")
+    parser.add_argument("--refresh", action="store_true", help="キャッシュを無視して再生成し、キャッシュを更新")
+    parser.add_argument("--no-proxy", action="store_true", help="編集用プロキシ（proxy/*.jpg）を作らない")
+    parser.add_argument("--transcode", choices=["webp", "jpeg"], help="配布用に WebP / JPEG へ変換した版も作る")
+    parser.add_argument("--batch", type=int, default=1, help="1 回の predict にまとめるプロンプト数（拒否されたら自動で縮める）")
+    parser.add_argument("--resume", metavar="RUN_ID", help="中断したランを再開（完了済みのシーンは描かない。--meta は不要）")
+    cli_args = parser.parse_args()
+    options = dict(
+        use_cache=not cli_args.no_cache,
+        refresh=cli_args.refresh,
+        proxies=not cli_args.no_proxy,
+        transcode=cli_args.transcode,
+        batch_size=cli_args.batch,
+    )
+    if cli_args.resume:
+        try:
+            resume_images(cli_args.resume, **options)
+        except JournalError as exc:
+            print(f"❌ {exc}")
+            exit(1)
+    else:
+        generate_images(cli_args.meta, **options)
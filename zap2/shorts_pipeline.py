@@ -3,24 +3,30 @@
 from __future__ import annotations
 
 import argparse
+import importlib.util
+import itertools
 import json
 import os
 import re
+import sys
 import textwrap
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
-
-
+from typing import Any, Dict, Iterator, List, Optional, Sequence
 
+# Add project root to Python path to allow importing from makeshorts
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from makeshorts.credentials import generative_model, init_vertexai
+from makeshorts.imagen import ImageJob
+from makeshorts.json_stream import ArrayItemStream
+from makeshorts.llm_cache import ResponseCache, cache_key, cached_generate
+from makeshorts.run_journal import write_atomic, write_json_atomic
+from makeshorts.transport import classify_exception, get_endpoint, retry_call
 
 try:
-    import vertexai
-    from google.oauth2 import service_account
-    from vertexai.generative_models import GenerativeModel
     from config.config import settings
 except ImportError:
-    vertexai = None
+    settings = None
 
 PROMPT_TEMPLATE = textwrap.dedent(
     """
@@ -34,6 +40,7 @@ PROMPT_TEMPLATE = textwrap.dedent(
       "thumbnail_prompts": [
         {{
           "id": 1,
+          "chapter": "title of the script section this frame belongs to (same string as script.sections[].title)",
           "scene_focus": "brief Japanese description of what the frame captures",
           "prompt": "full English prompt meeting the art-direction rules"
         }},
@@ -100,6 +107,20 @@ PROMPT_TEMPLATE = textwrap.dedent(
     """
 )
 
+# 章立てを呼び出し側（zap1 の台本）に合わせるときに PROMPT_TEMPLATE の末尾へ足す
+SECTIONS_TEMPLATE = textwrap.dedent(
+    """
+    Section override (takes precedence over the section count, timings and thumbnail total above):
+      * script.sections must be exactly these {count} sections, in this order, with exactly these titles: {titles}.
+      * Provide three thumbnail prompts per section ({total} in total); each "chapter" must be one of these titles.
+    """
+)
+
+
+def section_prompts(data: Dict[str, Any], title: str) -> List[Dict[str, Any]]:
+    """thumbnail_prompts のうち、章（script.sections[].title）が title のもの"""
+    return [entry for entry in data.get("thumbnail_prompts", []) if entry.get("chapter") == title and entry.get("prompt")]
+
 
 @dataclass
 class GenerationResult:
@@ -121,25 +142,70 @@ class TextModelClient:
         *,
         model: Optional[str] = None,
         temperature: float = 0.2,
+        use_cache: bool = True,
     ) -> None:
-        if vertexai is None:
+        # SDK の import は数秒かかるので、実際に使う makeshorts.credentials まで遅らせる（ここでは有無だけ確認）
+        if settings is None or importlib.util.find_spec("vertexai") is None:
             raise RuntimeError("google-cloud-aiplatform パッケージがインストールされていません。requirements.txt を確認してください。")
 
-        credentials = service_account.Credentials.from_service_account_file(settings.SERVICE_ACCOUNT_FILE)
-        vertexai.init(project=settings.PROJECT_ID, location=settings.LOCATION, credentials=credentials)
+        init_vertexai(settings.PROJECT_ID, settings.LOCATION, settings.SERVICE_ACCOUNT_FILE)
 
         self.model = model or "gemini-pro"
         self.temperature = temperature
+        self.cache = ResponseCache.from_env() if use_cache else None
+        self.endpoint = get_endpoint(f"gemini:{settings.PROJECT_ID}:{settings.LOCATION}")
+
+    def _model(self):
+        # (プロジェクト, リージョン, モデル) ごとに 1 つのハンドルを使い回す
+        return generative_model(settings.PROJECT_ID, settings.LOCATION, self.model, settings.SERVICE_ACCOUNT_FILE)
 
     def generate_package(self, prompt: str) -> str:
-        model = GenerativeModel(self.model)
-        response = model.generate_content(
-            prompt,
-            generation_config={
-                "temperature": self.temperature,
-            }
-        )
-        return response.text
+        generation_config = {
+            "temperature": self.temperature,
+        }
+
+        def call() -> str:
+            model = self._model()
+            return retry_call(self.endpoint, lambda: model.generate_content(prompt, generation_config=generation_config).text)
+
+        return cached_generate(self.cache, self.model, prompt, generation_config, call)
+
+    def generate_package_stream(self, prompt: str) -> Iterator[str]:
+        """generate_content(stream=True) のチャンクを順に返す（キャッシュヒット時は全文を 1 チャンクで）"""
+        generation_config = {
+            "temperature": self.temperature,
+        }
+        key = cache_key(self.model, prompt, generation_config)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            yield cached
+            return
+
+        model = self._model()
+
+        def open_stream():
+            # 最初のチャンクが届くまでは再試行できる（それ以降の失敗は途中までの応答を捨てて送出）
+            chunks = iter(model.generate_content(prompt, generation_config=generation_config, stream=True))
+            return next(chunks, None), chunks
+
+        first, chunks = retry_call(self.endpoint, open_stream)
+        parts: List[str] = []
+        try:
+            for chunk in itertools.chain([first] if first is not None else [], chunks):
+                try:
+                    text = chunk.text
+                except ValueError:  # 本文を持たない終端チャンク
+                    continue
+                parts.append(text)
+                yield text
+        except Exception as exc:
+            error = classify_exception(exc, self.endpoint.name)
+            if error is None or error is exc:
+                raise
+            raise error from exc
+
+        if self.cache is not None:
+            self.cache.put(key, self.model, "".join(parts))
 
 
 class ShortsPackageGenerator:
@@ -155,25 +221,54 @@ class ShortsPackageGenerator:
         self.output_root = output_root
         self.output_root.mkdir(exist_ok=True)
 
-    def build_prompt(self, person_name: str) -> str:
-        return PROMPT_TEMPLATE.format(person_name=person_name)
+    def build_prompt(self, person_name: str, sections: Optional[Sequence[str]] = None) -> str:
+        prompt = PROMPT_TEMPLATE.format(person_name=person_name)
+        if sections:
+            titles = ", ".join(json.dumps(title, ensure_ascii=False) for title in sections)
+            prompt += SECTIONS_TEMPLATE.format(count=len(sections), titles=titles, total=3 * len(sections))
+        return prompt
 
-    def generate(self, person_name: str, *, auto_images: bool = False) -> GenerationResult:
-        prompt = self.build_prompt(person_name)
-        raw = self.llm_client.generate_package(prompt)
-        data = self._parse_json(raw)
+    def generate(
+        self,
+        person_name: str,
+        *,
+        auto_images: bool = False,
+        use_cache: bool = True,
+        refresh: bool = False,
+        stream: bool = False,
+        sections: Optional[Sequence[str]] = None,
+    ) -> GenerationResult:
+        prompt = self.build_prompt(person_name, sections)
+        streamed_images = None
+        if stream:
+            raw, streamed_images = self._generate_streaming(
+                prompt,
+                person_name,
+                auto_images=auto_images,
+                use_cache=use_cache,
+                refresh=refresh,
+            )
+        else:
+            raw = self.llm_client.generate_package(prompt)
+        try:
+            data = self._parse_json(raw)
 
-        package_dir = self._prepare_directory(person_name)
-        response_path = package_dir / "raw_response.txt"
-        response_path.write_text(raw, encoding="utf-8")
+            package_dir = self._prepare_directory(person_name)
+            response_path = package_dir / "raw_response.txt"
+            write_atomic(str(response_path), raw)
 
-        json_path = package_dir / "shorts_package.json"
-        json_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            json_path = package_dir / "shorts_package.json"
+            write_json_atomic(str(json_path), data)
 
-        meta_path = self._write_meta(package_dir, person_name, data)
+            meta_path = self._write_meta(package_dir, person_name, data)
 
-        if auto_images:
-            self._generate_images(data, meta_path)
+            if streamed_images is not None:
+                self._finish_streamed_images(data, *streamed_images)
+            elif auto_images:
+                self._generate_images(data, meta_path, use_cache=use_cache, refresh=refresh)
+        finally:
+            if streamed_images is not None:
+                streamed_images[1].close()  # 応答が壊れていてもプロキシの作成とジャーナルを閉じる
 
         return GenerationResult(
             person_name=person_name,
@@ -184,6 +279,59 @@ class ShortsPackageGenerator:
             response_path=response_path,
         )
 
+    def _generate_streaming(
+        self,
+        prompt: str,
+        person_name: str,
+        *,
+        auto_images: bool,
+        use_cache: bool,
+        refresh: bool,
+    ):
+        """LLM の出力を逐次読みながら、閉じた thumbnail_prompts 要素から順に画像生成へ回す
+
+        SEO タイトルは応答の末尾にしか無いので、画像はいったん仮の名前で保存し、
+        _finish_streamed_images で通常モードと同じファイル名に付け替える。
+        描画結果は通常モードと同じ ImageRun.on_result でジャーナルに記録し、プロキシは付け替えたあとで作る
+        （失敗したシーンは generate.py --resume <ラン ID> で描き直せる）。
+        戻り値は (生レスポンス, 画像生成の途中経過 or None)。
+        """
+        scanner = ArrayItemStream("thumbnail_prompts")
+        if not auto_images:
+            for chunk in self.llm_client.generate_package_stream(prompt):
+                scanner.feed(chunk)
+            return scanner.text, None
+
+        image_module, output_dir = load_image_module()
+        provisional = f".{self._slugify(person_name)}.streaming"
+        futures = []
+        engine = image_module.open_image_engine(use_cache=use_cache, refresh=refresh)
+        run = image_module.open_streaming_run(output_dir)
+        try:
+            for chunk in self.llm_client.generate_package_stream(prompt):
+                for entry in scanner.feed(chunk):
+                    if not entry.get("prompt"):
+                        continue
+                    index = len(futures) + 1
+                    job = ImageJob(index, entry["prompt"], os.path.join(output_dir, f"{index:02d}_{provisional}.png"),
+                                   group=entry.get("chapter"))
+                    image_module.add_scene(run.journal, job)
+                    run.start(job)
+                    futures.append(engine.submit(job, on_result=run.on_result))
+        except BaseException:
+            engine.close()
+            run.close()
+            raise
+        engine.close()  # 投入済みの描画がすべて終わるまで待つ
+
+        results = [future.result() for future in futures]
+        return scanner.text, (image_module, run, results)
+
+    @staticmethod
+    def _finish_streamed_images(data: Dict[str, Any], image_module, run, results: List[Any]) -> None:
+        title = data.get("seo", {}).get("titles", ["short"])[0] or "short"
+        image_module.finish_streamed_run(run, results, title)
+
     def _parse_json(self, raw: str) -> Dict[str, Any]:
         raw = raw.strip()
         try:
@@ -218,36 +366,55 @@ class ShortsPackageGenerator:
         return value or "short"
 
     def _write_meta(self, package_dir: Path, person_name: str, data: Dict[str, Any]) -> Path:
-        prompts = [entry.get("prompt", "") for entry in data.get("thumbnail_prompts", [])]
-        prompts = [p for p in prompts if p]
+        entries = [entry for entry in data.get("thumbnail_prompts", []) if entry.get("prompt")]
 
         meta = {
             "title": f"{person_name} Documentary Thumbnails",
-            "image_prompts": prompts,
+            "image_prompts": [entry["prompt"] for entry in entries],
+            "image_groups": [entry.get("chapter") for entry in entries],  # 章ごとにまとめて predict する
             "descriptions": [entry.get("scene_focus", "") for entry in data.get("thumbnail_prompts", [])],
         }
 
         meta_path = package_dir / "meta.json"
-        meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        write_json_atomic(str(meta_path), meta)
         return meta_path
 
-    def _generate_images(self, data: Dict[str, Any], meta_path: Path) -> None:
-        prompts = [entry.get("prompt", "") for entry in data.get("thumbnail_prompts", []) if entry.get("prompt")]
-        if not prompts:
+    def _generate_images(
+        self,
+        data: Dict[str, Any],
+        meta_path: Path,
+        *,
+        use_cache: bool = True,
+        refresh: bool = False,
+    ) -> None:
+        entries = [entry for entry in data.get("thumbnail_prompts", []) if entry.get("prompt")]
+        if not entries:
             return
 
-        try:
-            from config import OUTPUT_DIR as CONFIG_OUTPUT_DIR  # type: ignore
-            from generate import generate_images_from_prompts
-        except Exception as exc:  # pragma: no cover - runtime guard
-            raise RuntimeError("画像生成モジュールを読み込めませんでした。config.py の設定を確認してください。") from exc
-
-        output_dir = os.getenv("VERTICAL_IMAGE_OUTPUT", CONFIG_OUTPUT_DIR)
+        image_module, output_dir = load_image_module()
         title = data.get("seo", {}).get("titles", ["short"])[0]
-        generate_images_from_prompts(prompts, title or "short", output_dir=output_dir)
+        image_module.generate_images_from_prompts(
+            [entry["prompt"] for entry in entries],
+            title or "short",
+            groups=[entry.get("chapter") for entry in entries],
+            output_dir=output_dir,
+            use_cache=use_cache,
+            refresh=refresh,
+        )
+
 
+def load_image_module():
+    """画像生成モジュール（generate.py）と既定の保存先"""
+    try:
+        from config import OUTPUT_DIR as CONFIG_OUTPUT_DIR  # type: ignore
+        import generate as image_module
+    except Exception as exc:  # pragma: no cover - runtime guard
+        raise RuntimeError("画像生成モジュールを読み込めませんでした。config.py の設定を確認してください。") from exc
 
-def run_cli() -> None:
+    return image_module, os.getenv("VERTICAL_IMAGE_OUTPUT", CONFIG_OUTPUT_DIR)
+
+
+def run_cli(argv=None) -> None:
     parser = argparse.ArgumentParser(description="Generate a complete documentary shorts package.")
     parser.add_argument("person", help="著名人の名前")
     parser.add_argument(
@@ -266,12 +433,33 @@ def run_cli() -> None:
         default=0.2,
         help="テキスト生成のtemperature",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="画像・LLM応答キャッシュを使わずに毎回生成",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="画像キャッシュを無視して再描画し、キャッシュを更新",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="LLM の応答をストリーミングで受け取り、プロンプトが揃った画像から描画を開始",
+    )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    client = TextModelClient(model=args.model, temperature=args.temperature)
+    client = TextModelClient(model=args.model, temperature=args.temperature, use_cache=not args.no_cache)
     generator = ShortsPackageGenerator(client)
-    result = generator.generate(args.person, auto_images=args.auto_images)
+    result = generator.generate(
+        args.person,
+        auto_images=args.auto_images,
+        use_cache=not args.no_cache,
+        refresh=args.refresh,
+        stream=args.stream,
+    )
 
     print("\n=== 生成結果 ===")
     print(f"人物名: {result.person_name}")